@@ -6,6 +6,8 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_talisman import Talisman
 import logging
 from backend.routes import register_blueprints
+from backend.commands import register_commands
+from backend.db_pool import dispose_pools_after_fork
 import os
 from logging.handlers import RotatingFileHandler
 
@@ -44,6 +46,7 @@ def create_app(test_mode=False, dev_mode=False):
     load_static_data(app)
 
     db.init_app(app)
+    dispose_pools_after_fork(app, db)
     bcrypt.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
@@ -52,6 +55,7 @@ def create_app(test_mode=False, dev_mode=False):
 
 
     register_blueprints(app)
+    register_commands(app)
 
     with app.app_context():
         import backend.notifications.receivers
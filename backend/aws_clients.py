@@ -0,0 +1,79 @@
+from backend.constants import Constants
+from botocore.config import Config as BotoConfig
+from flask import current_app
+import boto3
+import threading
+import os
+
+_lock = threading.Lock()
+_clients = {}
+
+'''
+Input: service: <str> ("s3" or "rekognition"), permission: <str> ("read"/"upload" for s3)
+Action: Collects the client arguments from the app config: R2 keys of the given permission and the R2 endpoint for "s3", the AWS keys and region for "rekognition"
+Output: <dict:client_kwargs>
+'''
+def _client_kwargs(service, permission):
+    if service == "rekognition":
+        return {
+            "aws_access_key_id": current_app.config["AWS_ACCESS_KEY_ID"],
+            "aws_secret_access_key": current_app.config["AWS_SECRET_ACCESS_KEY"],
+            "region_name": current_app.config["AWS_REGION"]
+        }
+
+    if permission == "upload":
+        access_key = current_app.config["CF_R2_ACCESS_KEY_ID_UPLOAD"]
+        secret_key = current_app.config["CF_R2_SECRET_ACCESS_KEY_UPLOAD"]
+    else:
+        access_key = current_app.config["CF_R2_ACCESS_KEY_ID_READ"]
+        secret_key = current_app.config["CF_R2_SECRET_ACCESS_KEY_READ"]
+    return {
+        "aws_access_key_id": access_key,
+        "aws_secret_access_key": secret_key,
+        "endpoint_url": current_app.config["CF_R2_ENDPOINT_URL"],
+        "region_name": "auto"
+    }
+
+'''
+Input: service: <str>, permission: <str>
+Action: Returns the process-wide boto3 client for (service, permission), creating it on first use. Building a client loads the botocore service model, so it is done once per process
+        instead of once per call, and the client keeps its keep-alive connection pool (AWS_MAX_POOL_CONNECTIONS) between requests. boto3 clients are thread-safe, creation is guarded by a lock
+        (each client gets its own boto3 Session, the default one is not thread-safe)
+Output: boto3.client object
+'''
+def get_client(service, permission="read"):
+    key = (service, permission)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = boto3.session.Session().client(
+                service,
+                config=BotoConfig(
+                    max_pool_connections=Constants.AWS_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                    connect_timeout=Constants.AWS_CONNECT_TIMEOUT,
+                    read_timeout=Constants.AWS_READ_TIMEOUT,
+                    retries={"max_attempts": 3, "mode": "standard"}
+                ),
+                **_client_kwargs(service, permission)
+            )
+            _clients[key] = client
+    return client
+
+'''
+Input: None
+Action: Forgets every cached client (and replaces the lock, it may have been held by another thread at fork time). Used in forked children, ex. Celery prefork and gunicorn --preload workers,
+        which must not share the parent's sockets
+Output: None
+'''
+def reset_clients():
+    global _lock, _clients
+    _lock = threading.Lock()
+    _clients = {}
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_clients)
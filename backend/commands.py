@@ -0,0 +1,109 @@
+from backend.db_maintenance import convert_to_partitioned, is_partitioned
+from backend.models.tokenblocklist import TokenBlocklist
+from backend.models.event import Event, SEARCH_DDL
+from backend.models.notification import Notification
+from backend.extensions import db
+from backend.outbox import replay_outbox
+from backend.constants import Constants
+from sqlalchemy.schema import CreateIndex
+from datetime import timezone
+import click
+
+'''
+Input: app: <Flask_Application_Object>
+Action: Registers the maintenance CLI commands (run with "flask <command>")
+Output: None
+'''
+def register_commands(app):
+
+    '''
+    Input: None
+    Action: One-off migration that converts Token_blocklist into a table partitioned monthly by expires. After it, purge_expired_tokens_task drops whole expired partitions instead of deleting rows.
+            jti stops being UNIQUE: a unique index on a partitioned table must contain the partition key, so it is recreated as a plain index (jti values are random UUIDs, lookups still use the index).
+            Locks the table for the duration of the copy - run it in a maintenance window
+    Output: None
+    '''
+    @app.cli.command("partition-tokens")
+    def partition_tokens():
+        partitions = convert_to_partitioned(
+            TokenBlocklist.__tablename__,
+            "expires",
+            ["token_id", "expires"],
+            Constants.PARTITION_MONTHS_AHEAD
+        )
+        click.echo(f"{TokenBlocklist.__tablename__} is partitioned ({len(partitions)} monthly partitions)")
+
+    '''
+    Input: None
+    Action: One-off migration that converts Notifications into a table partitioned monthly by created_at (primary key becomes (notification_id, created_at)).
+            After it, purge_notifications_task drops or archives whole expired partitions. Locks the table for the duration of the copy - run it in a maintenance window
+    Output: None
+    '''
+    @app.cli.command("partition-notifications")
+    def partition_notifications():
+        partitions = convert_to_partitioned(
+            Notification.__tablename__,
+            "created_at",
+            ["notification_id", "created_at"],
+            Constants.PARTITION_MONTHS_AHEAD
+        )
+        click.echo(f"{Notification.__tablename__} is partitioned ({len(partitions)} monthly partitions)")
+
+    '''
+    Input: None
+    Action: Adds event full-text search to an existing database (new databases get it from db.create_all): creates the unaccent/pg_trgm extensions, the search configuration,
+            the generated Event.search_vector column and its GIN indexes. Safe to run more than once
+    Output: None
+    '''
+    @app.cli.command("install-search")
+    def install_search():
+        connection = db.session.connection()
+        for statement in SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+        computed = Event.__table__.c.search_vector.computed
+        connection.exec_driver_sql(
+            f'ALTER TABLE "{Event.__tablename__}" ADD COLUMN IF NOT EXISTS search_vector tsvector '
+            f"GENERATED ALWAYS AS ({computed.sqltext}) STORED"
+        )
+        db.session.commit()
+
+        for index in Event.__table__.indexes:
+            if index.name in ("ix_Event_search_vector", "ix_Event_event_name_trgm"):
+                index.create(db.engine, checkfirst=True)
+        click.echo("Event search installed")
+
+    '''
+    Input: None
+    Action: Brings the Notifications table of an existing database up to date (new databases get it from db.create_all): adds the group_key column used by coalescing
+            and creates the inbox indexes (keyset, unread, tag, trigram search on the message) concurrently, so the table stays writable. Postgres cannot build an index concurrently
+            on a partitioned table (see partition-notifications), there the indexes are built normally and block writes until they are done. Safe to run more than once
+    Output: None
+    '''
+    @app.cli.command("install-notification-indexes")
+    def install_notification_indexes():
+        partitioned = is_partitioned(Notification.__tablename__)
+        db.session.close() # an open transaction of this session would keep CREATE INDEX CONCURRENTLY waiting
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            connection.exec_driver_sql(f'ALTER TABLE "{Notification.__tablename__}" ADD COLUMN IF NOT EXISTS group_key varchar(100)')
+            for index in Notification.__table__.indexes:
+                statement = str(CreateIndex(index, if_not_exists=True).compile(dialect=connection.dialect))
+                if not partitioned:
+                    statement = statement.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+                connection.exec_driver_sql(statement)
+        click.echo("Notification indexes installed")
+
+    '''
+    Input: --since <ISO datetime>, --until <ISO datetime> (optional), --task <task name> (optional)
+    Action: Marks already published Outbox messages from the given window as pending again, the relay publishes them on its next run
+    Output: None
+    '''
+    @app.cli.command("outbox-replay")
+    @click.option("--since", "since", type=click.DateTime(formats=["%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"]), required=True)
+    @click.option("--until", "until", type=click.DateTime(formats=["%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"]), default=None)
+    @click.option("--task", "task_name", default=None)
+    def outbox_replay(since, until, task_name):
+        since = since.replace(tzinfo=timezone.utc)
+        until = until.replace(tzinfo=timezone.utc) if until else None
+        replayed = replay_outbox(since, until, task_name)
+        click.echo(f"{replayed} outbox messages will be published again")
@@ -17,9 +17,44 @@ class Constants:
     CHANGE_EMAIL_EXPIRES = 15
     PAGINATION_DEFAULT_LIMIT = 20
     MAX_PAGINATION_LIMIT = 50
+    COMMENT_REPLY_DEPTH_DEFAULT = 2
+    MAX_COMMENT_REPLY_DEPTH = 10
+    COMMENT_REPLY_LIMIT_DEFAULT = 3
     PRIMARY_ACADEMY = "AGH"
     CACHE_TTL = 3600 # 1 hour
+    USER_SNAPSHOT_TTL = 300 # 5 minutes
+    USER_SNAPSHOT_LOCAL_TTL = 5 # seconds, per process
+    USER_SNAPSHOT_LOCAL_MAX_SIZE = 10000 # snapshots kept per process, the least recently used are evicted
+    METRICS_FLUSH_INTERVAL = 1 # seconds
+    PURGE_BATCH_SIZE = 5000
+    PURGE_MAX_BATCHES = 200
+    PARTITION_MONTHS_AHEAD = 3
+    NOTIFICATION_BULK_CHUNK_SIZE = 1000
+    MAX_BULK_NOTIFICATION_IDS = 500
+    NOTIFICATION_COALESCE_MAX_ACTORS = 10 # actors kept in the payload of a merged notification
+    OUTBOX_BATCH_SIZE = 500
+    OUTBOX_MAX_BATCHES = 20
+    OUTBOX_RETENTION_DAYS = 7
+    UNREAD_COUNT_TTL = 86400 # 1 day
+    UNREAD_RECONCILE_BATCH = 500
+    SSE_HEARTBEAT_INTERVAL = 20 # seconds, keeps proxies from closing an idle stream
+    SSE_MAX_DURATION = 300 # seconds, the client reconnects (with a fresh access token)
+    SSE_RETRY_MS = 3000
+    SSE_QUEUE_SIZE = 100
     MAX_PROFILE_PIC_SIZE = 5 * 1024 * 1024 
     MAX_EVENT_PIC_SIZE = 10 * 1024 * 1024
+    STAGING_KEY_PREFIX = "staging/"
+    MAX_IMAGE_PIXELS = 64 * 1000 * 1000 # checked before decoding (decompression bombs)
+    IMAGE_VARIANT_WIDTHS = {"event": (256, 640, 1280), "profile": (96, 256)}
+    IMAGE_VARIANT_FORMATS = ("webp", "jpg")
+    IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable" # R2 keys are never reused
+    IMAGE_OBJECT_GRACE_SECONDS = 24 * 60 * 60 # an uploaded object nobody references yet is kept this long (the client still has to attach it)
+    IMAGE_OBJECT_PURGE_BATCH = 500
+    IMAGE_SPOOL_TTL = 10 * 60 # seconds, processed bytes waiting in Redis for the moderation task
+    IMAGE_SPOOL_MAX_BYTES = 2 * 1024 * 1024 # larger images are read back from R2
+    IMAGE_REDUCING_GAP = 3.0 # reduce() by an integer factor until the image is at most 3x the target, then LANCZOS
     ALLOWED_EXTENSIONS = {"image/jpeg", "image/png", "image/webp"}
-    MIN_CONFIDENCE_REKOGITION = 75
\ No newline at end of file
+    MIN_CONFIDENCE_REKOGITION = 75
+    AWS_MAX_POOL_CONNECTIONS = 20 # per client, each client is shared by all threads of the process
+    AWS_CONNECT_TIMEOUT = 5 # seconds
+    AWS_READ_TIMEOUT = 30 # seconds
\ No newline at end of file
@@ -0,0 +1,233 @@
+from backend.extensions import db
+from sqlalchemy import text, select, delete
+from datetime import datetime, timezone
+from flask import current_app
+import re
+
+PARTITION_NAME_PATTERN = re.compile(r"_p(\d{4})_(\d{2})$")
+
+'''
+Input: dt: <datetime>
+Action: Truncates a datetime to the first moment (UTC) of its month
+Output: <datetime>
+'''
+def month_start(dt):
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    dt = dt.astimezone(timezone.utc)
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+'''
+Input: dt: <datetime> (first day of a month), months: <int>
+Action: Moves a month start by the given number of months (can be negative)
+Output: <datetime>
+'''
+def add_months(dt, months):
+    month_index = dt.year * 12 + (dt.month - 1) + months
+    return dt.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+'''
+Input: table_name: <str>, start: <datetime>
+Action: Generates the name of a monthly partition using the format "<table_name>_pYYYY_MM"
+Output: <str:partition_name>
+'''
+def partition_name(table_name, start):
+    return f"{table_name}_p{start:%Y_%m}"
+
+'''
+Input: table_name: <str>
+Action: Checks in pg_class whether the table is a partitioned (relkind = 'p') table in the current schema
+Output: bool
+'''
+def is_partitioned(table_name):
+    result = db.session.execute(text(
+        "SELECT c.relkind = 'p' FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = :table_name AND n.nspname = current_schema()"
+    ), {"table_name": table_name}).scalar()
+    return bool(result)
+
+'''
+Input: table_name: <str>
+Action: Lists the monthly partitions attached to a partitioned table. Partitions that do not follow the "<table_name>_pYYYY_MM" convention (ex. the default partition) are skipped
+Output: list of tuples (<str:partition_name>, <datetime:range_start>, <datetime:range_end>) sorted by range_start
+'''
+def list_monthly_partitions(table_name):
+    rows = db.session.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "JOIN pg_namespace n ON n.oid = parent.relnamespace "
+        "WHERE parent.relname = :table_name AND n.nspname = current_schema()"
+    ), {"table_name": table_name}).scalars().all()
+
+    partitions = []
+    for name in rows:
+        match = PARTITION_NAME_PATTERN.search(name)
+        if not match:
+            continue
+        start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+        partitions.append((name, start, add_months(start, 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+'''
+Input: table_name: <str>
+Action: Returns the on-disk size of the table with its indexes and TOAST data, summed over all partitions when the table is partitioned
+Output: <int:bytes>
+'''
+def table_size(table_name):
+    return int(db.session.execute(text(
+        "SELECT coalesce(sum(pg_total_relation_size(relid)), 0) FROM pg_partition_tree(CAST(:table_name AS regclass))"
+    ), {"table_name": f'"{table_name}"'}).scalar())
+
+'''
+Input: table_name: <str>, first_month: <datetime>, last_month: <datetime>
+Action: Creates (if missing) one range partition per month between first_month and last_month (both inclusive). Does not commit
+Output: list of <str:partition_name> that were requested
+'''
+def create_monthly_partitions(table_name, first_month, last_month):
+    names = []
+    current = month_start(first_month)
+    last = month_start(last_month)
+    while current <= last:
+        name = partition_name(table_name, current)
+        db.session.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table_name}" '
+            f"FOR VALUES FROM ('{current.isoformat()}') TO ('{add_months(current, 1).isoformat()}')"
+        ))
+        names.append(name)
+        current = add_months(current, 1)
+    return names
+
+'''
+Input: table_name: <str>, months_ahead: <int>
+Action: Makes sure partitions exist for the current month and the next months_ahead months, so inserts never land in the default partition. Commits the transaction
+Output: list of <str:partition_name>
+'''
+def ensure_monthly_partitions(table_name, months_ahead=3):
+    now = month_start(datetime.now(timezone.utc))
+    names = create_monthly_partitions(table_name, now, add_months(now, months_ahead))
+    db.session.commit()
+    return names
+
+'''
+Input: table_name: <str>, cutoff: <datetime>, archive_schema: <str> (optional)
+Action: Detaches every monthly partition whose whole range ends before the cutoff. Detached partitions are dropped, or moved to archive_schema if it is given. This removes old data without any row-level DELETE. Commits after each partition, so locks are held only briefly
+Output: tuple (list of <str:partition_name>, <int:removed_rows>)
+'''
+def drop_partitions_before(table_name, cutoff, archive_schema=None):
+    removed_partitions = []
+    removed_rows = 0
+
+    if archive_schema:
+        db.session.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+        db.session.commit()
+
+    for name, _, range_end in list_monthly_partitions(table_name):
+        if range_end > cutoff:
+            continue
+        try:
+            rows = db.session.execute(text(f'SELECT count(*) FROM "{name}"')).scalar()
+            db.session.execute(text(f'ALTER TABLE "{table_name}" DETACH PARTITION "{name}"'))
+            if archive_schema:
+                db.session.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"'))
+            else:
+                db.session.execute(text(f'DROP TABLE "{name}"'))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"ERROR: drop_partitions_before, failed to remove partition {name}: {e}")
+            continue
+        removed_partitions.append(name)
+        removed_rows += rows
+
+    return removed_partitions, removed_rows
+
+'''
+Input: model: <db.Model>, condition: <SQLAlchemy_Expression>, batch_size: <int>, max_batches: <int>
+Action: Deletes rows matching the condition in bounded batches. Each batch picks at most batch_size primary keys with FOR UPDATE SKIP LOCKED (rows locked by live requests are left for the next run) and commits, so no long locks or huge transactions are created
+Output: int (number of deleted rows)
+'''
+def delete_in_batches(model, condition, batch_size, max_batches):
+    table = model.__table__
+    pk_column = list(table.primary_key.columns)[0]
+    removed_rows = 0
+
+    for _ in range(max_batches):
+        batch_ids = select(pk_column).where(condition).limit(batch_size).with_for_update(skip_locked=True).scalar_subquery()
+        try:
+            result = db.session.execute(delete(table).where(pk_column.in_(batch_ids)))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"ERROR: delete_in_batches, batch delete on {table.name} failed: {e}")
+            break
+
+        removed_rows += result.rowcount
+        if result.rowcount < batch_size:
+            break
+
+    return removed_rows
+
+'''
+Input: table_name: <str>, column: <str> (partition key), primary_key: <list of str> (must contain the partition key), months_ahead: <int>
+Action: Converts an existing regular table into a table partitioned monthly by RANGE(column), in a single transaction:
+        the old table is renamed, an empty partitioned copy is created (defaults, NOT NULL and CHECK constraints are kept), monthly partitions covering the existing data are created together with a default partition,
+        rows are copied, the old table is dropped and its indexes and foreign keys are recreated on the new table. Unique indexes that do not contain the partition key cannot exist on a partitioned table, so they are recreated as plain indexes.
+        The table is locked for the whole operation - run it in a maintenance window
+Output: list of <str:partition_name>
+'''
+def convert_to_partitioned(table_name, column, primary_key, months_ahead=3):
+    if is_partitioned(table_name):
+        return [name for name, _, _ in list_monthly_partitions(table_name)]
+
+    legacy_name = f"{table_name}_legacy"
+    try:
+        db.session.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "{legacy_name}"'))
+
+        index_defs = db.session.execute(text(
+            "SELECT pg_get_indexdef(indexrelid), indisprimary, indisunique, "
+            "ARRAY(SELECT a.attname::text FROM pg_attribute a WHERE a.attrelid = indrelid AND a.attnum = ANY(indkey)) "
+            "FROM pg_index WHERE indrelid = CAST(:legacy AS regclass)"
+        ), {"legacy": f'"{legacy_name}"'}).all()
+        foreign_keys = db.session.execute(text(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = CAST(:legacy AS regclass) AND contype = 'f'"
+        ), {"legacy": f'"{legacy_name}"'}).all()
+
+        db.session.execute(text(
+            f'CREATE TABLE "{table_name}" (LIKE "{legacy_name}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ("{column}")'
+        ))
+
+        oldest = db.session.execute(text(f'SELECT min("{column}") FROM "{legacy_name}"')).scalar()
+        now = month_start(datetime.now(timezone.utc))
+        first_month = month_start(oldest) if oldest is not None and month_start(oldest) < now else now
+        names = create_monthly_partitions(table_name, first_month, add_months(now, months_ahead))
+        db.session.execute(text(f'CREATE TABLE IF NOT EXISTS "{table_name}_pdefault" PARTITION OF "{table_name}" DEFAULT'))
+
+        db.session.execute(text(f'INSERT INTO "{table_name}" SELECT * FROM "{legacy_name}"'))
+        db.session.execute(text(f'DROP TABLE "{legacy_name}"'))
+
+        pk_columns = ", ".join(f'"{c}"' for c in primary_key)
+        db.session.execute(text(f'ALTER TABLE "{table_name}" ADD PRIMARY KEY ({pk_columns})'))
+
+        for index_def, is_primary, is_unique, index_columns in index_defs:
+            if is_primary:
+                continue
+            if is_unique and column not in index_columns:
+                if list(index_columns) == primary_key[:len(index_columns)]:
+                    continue # already covered by the new primary key
+                index_def = index_def.replace("CREATE UNIQUE INDEX", "CREATE INDEX", 1)
+            index_def = re.sub(rf'"?{re.escape(legacy_name)}"?', f'"{table_name}"', index_def)
+            db.session.execute(text(index_def))
+
+        for constraint_name, constraint_def in foreign_keys:
+            db.session.execute(text(f'ALTER TABLE "{table_name}" ADD CONSTRAINT "{constraint_name}" {constraint_def}'))
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return names
@@ -0,0 +1,77 @@
+from sqlalchemy.pool import NullPool, QueuePool
+from backend import metrics
+import time
+import os
+
+POOL_MODES = ("null", "queue", "pgbouncer")
+
+'''
+QueuePool that reports how long a request waited for a connection ("db_pool_checkout_wait", seconds) and how full the pool is
+("db_pool_saturation" = checked out connections / (pool_size + max_overflow), 1.0 means requests start queueing on pool_timeout)
+'''
+class InstrumentedQueuePool(QueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("db_pool_checkout_wait", time.perf_counter() - started)
+            capacity = self.size() + max(self._max_overflow, 0)
+            metrics.set_gauge("db_pool_checked_out", self.checkedout())
+            metrics.set_gauge("db_pool_saturation", self.checkedout() / capacity if capacity else 0)
+
+'''
+NullPool that reports the cost of opening a fresh connection (TCP + TLS handshake) as "db_pool_checkout_wait", so both modes can be compared on the same metric
+'''
+class InstrumentedNullPool(NullPool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("db_pool_checkout_wait", time.perf_counter() - started)
+
+'''
+Input: mode: <str> ("null", "queue" or "pgbouncer"), pool_size: <int>, max_overflow: <int>, pool_recycle: <int> (seconds), pool_timeout: <int> (seconds)
+Action: Builds SQLALCHEMY_ENGINE_OPTIONS for the selected connection mode:
+        - null: a new connection for every checkout (the old behaviour)
+        - queue: per-worker pool of persistent connections, checked with pre-ping and recycled after pool_recycle seconds
+        - pgbouncer: the queue pool made safe for PgBouncer transaction pooling - connections are always rolled back on return and no session state (SET, prepared statements, advisory locks) is relied on,
+          idle connections are recycled well before PgBouncer's server_idle_timeout
+Output: <dict>
+'''
+def build_engine_options(mode, pool_size=5, max_overflow=10, pool_recycle=1800, pool_timeout=10):
+    if mode not in POOL_MODES:
+        raise ValueError(f"Unknown DB_POOL_MODE {mode!r}, expected one of {POOL_MODES}")
+
+    if mode == "null":
+        return {"poolclass": InstrumentedNullPool}
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_recycle": pool_recycle,
+        "pool_timeout": pool_timeout,
+        "pool_pre_ping": True,
+        "pool_use_lifo": True, # idle connections at the bottom of the stack can be closed by the server/recycle
+    }
+    if mode == "pgbouncer":
+        options["pool_reset_on_return"] = "rollback"
+        options["pool_recycle"] = min(pool_recycle, 300)
+        options["connect_args"] = {"application_name": "apka_miasteczkowa"}
+    return options
+
+'''
+Input: app: <Flask_Application_Object>, db: <SQLAlchemy_Extension>
+Action: Registers an after-fork hook that drops (without closing) the pooled connections inherited from the parent process. Gunicorn with preload and Celery prefork workers would otherwise share the same sockets
+Output: None
+'''
+def dispose_pools_after_fork(app, db):
+    def _dispose():
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_dispose)
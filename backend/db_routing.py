@@ -0,0 +1,166 @@
+from flask_sqlalchemy.session import Session
+from flask import current_app, has_request_context
+from sqlalchemy import event, text
+from contextlib import contextmanager
+from functools import wraps
+import time
+
+READONLY_BIND_KEY = "readonly"
+
+# Replay lag of the replica in seconds, 0 when it has replayed everything it received (or when the bind is not a standby at all, ex. a second connection to the primary in tests)
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+_replica_state = {"checked_at": 0.0, "healthy": False}
+
+'''
+Session that sends plain SELECTs to the "readonly" bind while the session is in replica mode (see use_replica / read_only_route). Everything else goes to the primary:
+flushes, INSERT/UPDATE/DELETE statements, SELECT ... FOR UPDATE and raw text() statements. After the first write the session stays on the primary (read-your-writes),
+and after the commit the current user is pinned to the primary for REPLICA_PIN_SECONDS, so the next requests do not read from a replica that has not caught up yet (only when the readonly bind is configured)
+'''
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        bind_key = kwargs.pop("bind_key", None)
+        if bind is None and self._use_replica_for(clause, bind_key):
+            return self._db.engines[READONLY_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica_for(self, clause, bind_key):
+        if self._flushing or getattr(clause, "is_dml", False):
+            self.info["has_writes"] = True
+            return False
+        if bind_key not in (None, READONLY_BIND_KEY):
+            return False
+        if not self.info.get("use_replica") or self.info.get("has_writes"):
+            return False
+        if clause is None or not getattr(clause, "is_select", False):
+            return False
+        if getattr(clause, "_for_update_arg", None) is not None:
+            return False
+        return READONLY_BIND_KEY in self._db.engines
+
+@event.listens_for(RoutingSession, "after_commit")
+def _pin_after_write(session):
+    if READONLY_BIND_KEY not in session._db.engines:
+        return
+    if session.info.get("has_writes") and not session.info.get("pinned"):
+        session.info["pinned"] = True
+        user_id = _current_identity()
+        if user_id:
+            pin_to_primary(user_id)
+
+'''
+Input: None
+Action: Returns the identity (sub) of the JWT verified for the current request
+Output: <str> or None (outside of a request or when the endpoint has no JWT)
+'''
+def _current_identity():
+    if not has_request_context():
+        return None
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+'''
+Input: user_id: <uuid/str>
+Action: Generates a standardized string key for Redis storage using the format "db_pin:v1:<user_id>".
+Output: <str:cache_key>
+'''
+def get_primary_pin_key(user_id):
+    return f"db_pin:v1:{user_id}"
+
+'''
+Input: user_id: <uuid/str>
+Action: Marks the user as "recently wrote" in Redis for REPLICA_PIN_SECONDS. While the mark exists, read-only endpoints of this user are served by the primary
+Output: None (Logs error if Redis fails).
+'''
+def pin_to_primary(user_id):
+    from backend.extensions import redis_client
+    try:
+        redis_client.setex(get_primary_pin_key(user_id), current_app.config["REPLICA_PIN_SECONDS"], 1)
+    except Exception as e:
+        current_app.logger.error(f"Redis Pin Set Error: {e}")
+
+'''
+Input: user_id: <uuid/str>
+Action: Checks if the user is pinned to the primary. Redis errors are treated as pinned (the primary is always correct)
+Output: bool
+'''
+def is_pinned_to_primary(user_id):
+    from backend.extensions import redis_client
+    try:
+        return bool(redis_client.exists(get_primary_pin_key(user_id)))
+    except Exception as e:
+        current_app.logger.error(f"Redis Pin Get Error: {e}")
+        return True
+
+'''
+Input: None
+Action: Checks whether the replica can serve reads: the readonly bind must be configured and its replay lag must not exceed REPLICA_MAX_LAG. The result is cached in process for REPLICA_LAG_CHECK_INTERVAL seconds,
+        a failing replica is treated as unhealthy. The measured lag is reported as the "db_replica_lag" gauge
+Output: bool
+'''
+def replica_available():
+    from backend import metrics
+    db = current_app.extensions["sqlalchemy"]
+    if READONLY_BIND_KEY not in db.engines:
+        return False
+
+    now = time.monotonic()
+    if now - _replica_state["checked_at"] < current_app.config["REPLICA_LAG_CHECK_INTERVAL"]:
+        return _replica_state["healthy"]
+
+    try:
+        with db.engines[READONLY_BIND_KEY].connect() as connection:
+            lag = float(connection.execute(REPLICA_LAG_QUERY).scalar() or 0)
+        healthy = lag <= current_app.config["REPLICA_MAX_LAG"]
+        metrics.set_gauge("db_replica_lag", lag)
+        if not healthy:
+            current_app.logger.warning(f"WARNING: replica is {lag:.1f}s behind, reads fall back to the primary")
+    except Exception as e:
+        current_app.logger.error(f"ERROR: replica lag check failed, reads fall back to the primary: {e}")
+        healthy = False
+
+    _replica_state["checked_at"] = now
+    _replica_state["healthy"] = healthy
+    return healthy
+
+'''
+Input: None
+Action: Context manager that puts the current session in replica mode for the duration of the block, unless the replica is unavailable/lagging or the current user is pinned to the primary after a recent write.
+        Writes inside the block still go to the primary
+Output: bool (True if reads will go to the replica)
+'''
+@contextmanager
+def use_replica():
+    from backend import metrics
+    session = current_app.extensions["sqlalchemy"].session()
+    user_id = _current_identity()
+
+    enabled = replica_available() and not (user_id and is_pinned_to_primary(user_id))
+    metrics.incr("db_replica_reads" if enabled else "db_primary_fallback_reads")
+
+    previous = session.info.get("use_replica", False)
+    session.info["use_replica"] = enabled
+    try:
+        yield enabled
+    finally:
+        session.info["use_replica"] = previous
+
+'''
+Input: f: <view_function>
+Action: Decorator for read-only endpoints, runs the view inside use_replica(). Place it below @jwt_required() so the user's primary pin can be checked
+Output: <wrapped_view_function>
+'''
+def read_only_route(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return f(*args, **kwargs)
+    return wrapper
@@ -10,8 +10,9 @@ from flask import Flask
 import os
 import json
 import redis
+from backend.db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 bcrypt = Bcrypt()
 jwt = JWTManager()
 mail = Mail()
@@ -23,6 +24,7 @@ limiter = Limiter(
     storage_uri="redis://localhost:6379"     
 )
 redis_client = redis.from_url("redis://localhost:6379", decode_responses=True)
+redis_blob_client = redis.from_url("redis://localhost:6379") # raw bytes (image spool), redis_client decodes every reply to str
 
 '''
 Input: app: <Flask_Application_Object>
@@ -1,22 +1,29 @@
 from datetime import datetime, timezone
 from backend.extensions import db
-from flask_jwt_extended import decode_token
-from backend.models import TokenBlocklist
+from flask_jwt_extended import decode_token, create_access_token, create_refresh_token
+from backend.models import TokenBlocklist, User, Notification
 from backend.models.event import Event_visibility
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy import update, func
+from sqlalchemy.sql.expression import Executable, ClauseElement
+from sqlalchemy.ext.compiler import compiles
 import uuid
 import bleach
 from backend.extensions import redis_client
 import json
+import time
+import threading
+import os
+from collections import OrderedDict
 from backend.constants import Constants
 from flask import current_app
 
 '''
-Input: encoded_token: <jwt_str>
-Action: Decodes the provided JWT string to extract the jti (unique ID), sub (user ID), and exp (expiration). It then creates a new entry in the TokenBlocklist database table to track the token's validity
+Input: encoded_token: <jwt_str>, commit: <bool> (optional, False lets the caller batch several writes into one transaction)
+Action: Decodes the provided JWT string to extract the jti (unique ID), sub (user ID), and exp (expiration). It then creates a new entry in the TokenBlocklist database table to track the token's validity and writes it through to the Redis revocation store as "active"
 Output: None (or raises an Exception on database error)
 '''
-def add_token_to_db(encoded_token):
+def add_token_to_db(encoded_token, commit=True):
     decoded_token = decode_token(encoded_token)
     token_expires = datetime.fromtimestamp(decoded_token["exp"], tz=timezone.utc)
     token = TokenBlocklist(
@@ -28,72 +35,324 @@ def add_token_to_db(encoded_token):
 
     try:
         db.session.add(token)
-        db.session.commit()
+        if commit:
+            db.session.commit()
     except Exception as e:
         db.session.rollback()
         print(f"Error adding token to blocklist: {e}")
         raise
 
+    cache_token_state(token.jti, token.user_id, token.expires, revoked=False)
+
 
 '''
-Input: token_jti: <str>, user_id: <uuid>
-Action: Searches the TokenBlocklist for a specific token associated with the given user. If found, it sets the revoked_at timestamp to the current time, blacklisting the token
+Input: token_jti: <str>, user_id: <uuid>, commit: <bool> (optional, False lets the caller batch several writes into one transaction)
+Action: Searches the TokenBlocklist for a specific token associated with the given user. If found, it sets the revoked_at timestamp to the current time, blacklisting the token, and writes the "revoked" state through to Redis
 Output: bool (True if successfully revoked, False if token not found or on error).
 '''
-def revoke_token(token_jti, user_id):
+def revoke_token(token_jti, user_id, commit=True):
     try:
         token = TokenBlocklist.query.filter_by(jti=token_jti, user_id=user_id).one()
         if token:
             token.revoked_at = datetime.now(timezone.utc)
-            db.session.commit()
+            if commit:
+                db.session.commit()
+            cache_token_state(token.jti, token.user_id, token.expires, revoked=True)
             return True
     except NoResultFound:
         print(f"Token with jti {token_jti} for user {user_id} not found")
-        db.session.rollback()
+        if commit:
+            db.session.rollback()
         return False
     except Exception as e:
         print(f"Error revoking token: {e}")
         return False
     return False
 
+'''
+Input: jwt_payload: <dict> (decoded token with jti, sub and exp claims)
+Action: Revokes a token that was never persisted in TokenBlocklist (access tokens issued in token epoch mode). The "revoked" state is written straight to Redis until the token expires, independently of REVOCATION_STORE_ENABLED.
+        The marker is the only record of the revocation, on False the token is still valid and the caller has to report the failure
+Output: bool (True if the revocation was stored, False on Redis error)
+'''
+def revoke_unpersisted_token(jwt_payload):
+    expires = datetime.fromtimestamp(jwt_payload["exp"], tz=timezone.utc)
+    ttl = _token_cache_ttl(expires)
+    if ttl == 0:
+        return True
+    try:
+        redis_client.setex(
+            get_token_cache_key(jwt_payload["jti"]),
+            ttl,
+            json.dumps({"user_id": str(jwt_payload["sub"]), "revoked": True})
+        )
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Redis Token Set Error: {e}")
+        return False
+
 '''
 Input: jwt_payload: <dict> (containing jti and sub claims).
-Action: Queries the database to check if the specific token (via its JTI) has been marked as revoked. If the token record is missing or the revoked_at column is populated, the token is considered invalid.
+Action: Tokens carrying an "epoch" claim are checked against the user's current token epoch (and a possible single-token revocation in Redis) without touching TokenBlocklist.
+        For other tokens it checks the Redis revocation store first. On a cache miss it queries the database to check if the specific token (via its JTI) has been marked as revoked and caches the result until the token expires. If the token record is missing or the revoked_at column is populated, the token is considered invalid.
 Output: bool (True if the token is revoked/invalid, False if it is active).
 '''
 def is_token_revoked(jwt_payload):
     jti = jwt_payload["jti"]
     user_id = jwt_payload["sub"]
+
+    if "epoch" in jwt_payload:
+        revoked_state = _read_token_state(jti)
+        if revoked_state is not None and revoked_state["revoked"]:
+            return True
+        current_epoch = get_token_epoch(user_id)
+        return current_epoch is None or jwt_payload["epoch"] != current_epoch
+
+    cached_state = get_cached_token_state(jti)
+    if cached_state is not None and cached_state["user_id"] == str(user_id):
+        return cached_state["revoked"]
+
     try:
         token = TokenBlocklist.query.filter_by(jti=jti, user_id=user_id).one_or_none()
         if token is None:
             return True
-        return token.revoked_at is not None
+        revoked = token.revoked_at is not None
     except Exception as e:
         print(f"Database error in is_token_revoked: {e}")
         return True
 
+    cache_token_state(token.jti, token.user_id, token.expires, revoked=revoked)
+    return revoked
+
 '''
 Input: user_id: <uuid>, token_type: <str> (optional filter like "access", "refresh", or "email_verification").
-Action: Locates all active (non-revoked) tokens in the database for a specific user and marks them all as revoked simultaneously
+Action: Marks all active (non-revoked) tokens of a specific user as revoked with a single set-based UPDATE. When access tokens are included it also bumps the user's token epoch, which invalidates every unpersisted access token at once. The revoked state and the new epoch are then written to Redis
 Output: bool (or raises an Exception on database error)
 '''
 def revoke_all_user_tokens(user_id, token_type=None):
+    new_epoch = None
     try:
-        query = TokenBlocklist.query.filter_by(user_id=user_id, revoked_at=None)
+        stmt = update(TokenBlocklist).where(
+            TokenBlocklist.user_id == user_id,
+            TokenBlocklist.revoked_at.is_(None)
+        )
         if token_type:
-            query = query.filter_by(token_type=token_type)
+            stmt = stmt.where(TokenBlocklist.token_type == token_type)
+        stmt = stmt.values(revoked_at=datetime.now(timezone.utc)).returning(
+            TokenBlocklist.jti, TokenBlocklist.user_id, TokenBlocklist.expires
+        ).execution_options(synchronize_session=False)
 
-        tokens = query.all()
-        for token in tokens:
-            token.revoked_at = datetime.now(timezone.utc)
+        revoked_tokens = db.session.execute(stmt).all()
+        if token_type in (None, "access"):
+            new_epoch = bump_token_epoch(user_id)
         db.session.commit()
-        return True
     except Exception as e:
         db.session.rollback()
         print(f"Error revoking all tokens from user: {user_id}: {e}")
         raise
 
+    cache_tokens_revoked([tuple(row) for row in revoked_tokens])
+    if new_epoch is not None:
+        cache_token_epoch(user_id, new_epoch)
+        invalidate_user_cache(user_id)
+    return True
+
+'''
+Input: user_id: <uuid>
+Action: Increments the token epoch of the user in the current transaction (the caller commits)
+Output: int (the new epoch) or None if the user does not exist
+'''
+def bump_token_epoch(user_id):
+    return db.session.execute(
+        update(User)
+        .where(User.user_id == user_id)
+        .values(token_epoch=User.token_epoch + 1)
+        .returning(User.token_epoch)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+
+'''
+Input: user_id: <uuid/str>
+Action: Generates a standardized string key for Redis storage of the user's token epoch using the format "token_epoch:v1:<user_id>".
+Output: <str:cache_key>
+'''
+def get_token_epoch_cache_key(user_id):
+    return f"token_epoch:v1:{user_id}"
+
+'''
+Input: user_id: <uuid/str>, epoch: <int>, fill: <bool> (optional, True for a cache fill after a database read)
+Action: Saves the current token epoch of the user in Redis. A fill is only written when no entry exists (SET NX), so an epoch read before a concurrent bump cannot replace the bumped one.
+        If the write fails the key is deleted, so an old epoch can never be served after a bump
+Output: None (Logs error if Redis fails).
+'''
+def cache_token_epoch(user_id, epoch, fill=False):
+    try:
+        redis_client.set(get_token_epoch_cache_key(user_id), epoch, ex=Constants.CACHE_TTL, nx=fill)
+    except Exception as e:
+        current_app.logger.error(f"Redis Epoch Set Error: {e}")
+        try:
+            redis_client.delete(get_token_epoch_cache_key(user_id))
+        except Exception:
+            pass
+
+'''
+Input: user_id: <uuid/str>
+Action: Returns the current token epoch of the user. Reads Redis first and falls back to the User table on a cache miss (the value is cached afterwards)
+Output: int or None (if the user does not exist or the database is unavailable)
+'''
+def get_token_epoch(user_id):
+    try:
+        cached = redis_client.get(get_token_epoch_cache_key(user_id))
+        if cached is not None:
+            return int(cached)
+    except Exception as e:
+        current_app.logger.error(f"Redis Epoch Get Error: {e}")
+
+    try:
+        epoch = db.session.execute(
+            db.select(User.token_epoch).where(User.user_id == user_id)
+        ).scalar_one_or_none()
+    except Exception as e:
+        print(f"Database error in get_token_epoch: {e}")
+        return None
+
+    if epoch is not None:
+        cache_token_epoch(user_id, epoch, fill=True)
+    return epoch
+
+'''
+Input: user_id: <uuid>, epoch: <int> (optional, current token epoch of the user if the caller already has it), revoked_refresh_jti: <str> (optional)
+Action: Issues a new Access + Refresh token pair. In token epoch mode the access token carries the "epoch" claim and is not persisted, otherwise both tokens are stored in TokenBlocklist.
+        The used refresh token (if given) is revoked in the same transaction, so a login or refresh costs exactly one commit
+Output: tuple (<jwt_str:access_token>, <jwt_str:refresh_token>) (or raises an Exception on database error)
+'''
+def create_token_pair(user_id, epoch=None, revoked_refresh_jti=None):
+    epoch_mode = current_app.config.get("TOKEN_EPOCH_MODE")
+
+    if epoch_mode:
+        if epoch is None:
+            epoch = get_token_epoch(user_id)
+        access_token = create_access_token(identity=user_id, additional_claims={"epoch": epoch})
+    else:
+        access_token = create_access_token(identity=user_id)
+    refresh_token = create_refresh_token(identity=user_id)
+
+    try:
+        if revoked_refresh_jti:
+            revoke_token(revoked_refresh_jti, user_id, commit=False)
+        if not epoch_mode:
+            add_token_to_db(access_token, commit=False)
+        add_token_to_db(refresh_token, commit=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error creating token pair: {e}")
+        raise
+
+    return access_token, refresh_token
+
+'''
+Input: jti: <str>
+Action: Generates a standardized string key for Redis storage of the token state using the format "token:v1:<jti>".
+Output: <str:cache_key>
+'''
+def get_token_cache_key(jti):
+    return f"token:v1:{jti}"
+
+'''
+Input: expires: <datetime>
+Action: Calculates how many seconds are left until the token expires, so the Redis entry never outlives the token itself
+Output: int (seconds, 0 if the token is already expired)
+'''
+def _token_cache_ttl(expires):
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return max(int((expires - datetime.now(timezone.utc)).total_seconds()), 0)
+
+'''
+Input: jti: <str>, user_id: <uuid>, expires: <datetime>, revoked: <bool>
+Action: Writes the active/revoked state of a token to the Redis revocation store with a TTL matching the token expiration. If the store is disabled in config it does nothing.
+        "revoked" always overwrites the entry, "active" is only written when no entry exists (SET NX), so a cache fill that read the row before a concurrent revocation cannot replace the "revoked" state.
+        If a "revoked" write fails the old entry is deleted, so a stale "active" state can never outlive a revocation
+Output: None (Logs error if Redis fails).
+'''
+def cache_token_state(jti, user_id, expires, revoked):
+    if not current_app.config.get("REVOCATION_STORE_ENABLED"):
+        return
+    ttl = _token_cache_ttl(expires)
+    if ttl == 0:
+        return
+    try:
+        redis_client.set(
+            get_token_cache_key(jti),
+            json.dumps({"user_id": str(user_id), "revoked": revoked}),
+            ex=ttl,
+            nx=not revoked
+        )
+    except Exception as e:
+        current_app.logger.error(f"Redis Token Set Error: {e}")
+        if revoked:
+            invalidate_token_state(jti)
+
+'''
+Input: tokens: <list of tuples (jti, user_id, expires)>
+Action: Marks many tokens as revoked in the Redis revocation store using a single pipeline (one round trip)
+Output: None (Logs error if Redis fails).
+'''
+def cache_tokens_revoked(tokens):
+    if not current_app.config.get("REVOCATION_STORE_ENABLED") or not tokens:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for jti, user_id, expires in tokens:
+            ttl = _token_cache_ttl(expires)
+            if ttl == 0:
+                continue
+            pipe.setex(
+                get_token_cache_key(jti),
+                ttl,
+                json.dumps({"user_id": str(user_id), "revoked": True})
+            )
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.error(f"Redis Token Pipeline Error: {e}")
+        for jti, _, _ in tokens:
+            invalidate_token_state(jti)
+
+'''
+Input: jti: <str>
+Action: Attempts to read the cached state of a token from the Redis revocation store.
+Output: <dict: {"user_id": <str>, "revoked": <bool>}> or None (if cache miss, store disabled or Redis error)
+'''
+def get_cached_token_state(jti):
+    if not current_app.config.get("REVOCATION_STORE_ENABLED"):
+        return None
+    return _read_token_state(jti)
+
+'''
+Input: jti: <str>
+Action: Reads the token state from Redis regardless of REVOCATION_STORE_ENABLED (used for unpersisted epoch tokens)
+Output: <dict: {"user_id": <str>, "revoked": <bool>}> or None (if cache miss or Redis error)
+'''
+def _read_token_state(jti):
+    try:
+        cached = redis_client.get(get_token_cache_key(jti))
+        return json.loads(cached) if cached else None
+    except Exception as e:
+        current_app.logger.error(f"Redis Token Get Error: {e}")
+        return None
+
+'''
+Input: jti: <str>
+Action: Deletes the cached state of a token from Redis, forcing the next check to go to the database
+Output: None (Logs error if Redis fails).
+'''
+def invalidate_token_state(jti):
+    try:
+        redis_client.delete(get_token_cache_key(jti))
+    except Exception as e:
+        current_app.logger.error(f"Redis Token Delete Error: {e}")
+
 '''
 Input: <any> (usually str or uuid.UUID object)
 Action: Attempts to convert a value into a valid UUID object
@@ -151,18 +410,42 @@ Output: None (Logs error if Redis fails).
 '''
 def cache_event_data(event_id, data):
     try:
-        cache_ready_data = data.copy()
-        cache_ready_data.pop("is_participating", None)
-        cache_ready_data.pop("is_joined", None)
-        cache_ready_data.pop("participation_count", None)
         redis_client.setex(
             get_event_cache_key(event_id),
             Constants.CACHE_TTL,
-            json.dumps(cache_ready_data)
+            _prepare_event_cache_data(data)
         )
     except Exception as e:
         current_app.logger.error(f"Redis Set Error: {e}")
 
+'''
+Input: data: <dict>
+Action: Strips the user-specific flags (is_participating, is_joined, participation_count) from an event payload and serializes it to JSON
+Output: <str:json>
+'''
+def _prepare_event_cache_data(data):
+    cache_ready_data = data.copy()
+    cache_ready_data.pop("is_participating", None)
+    cache_ready_data.pop("is_joined", None)
+    cache_ready_data.pop("participation_count", None)
+    return json.dumps(cache_ready_data)
+
+'''
+Input: events_data: <dict: {<str:event_id>: <dict:event_data>}>
+Action: Same as cache_event_data for many events at once, using a single Redis pipeline (one round trip)
+Output: None (Logs error if Redis fails).
+'''
+def cache_events_data(events_data):
+    if not events_data:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for event_id, data in events_data.items():
+            pipe.setex(get_event_cache_key(event_id), Constants.CACHE_TTL, _prepare_event_cache_data(data))
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.error(f"Redis Pipeline Set Error: {e}")
+
 '''
 Input: event_id: <uuid/str>
 Action: Immediately deletes the cached data for a specific event from Redis. This is used when an event is updated, deleted, or joined to ensure data consistency
@@ -187,3 +470,312 @@ def get_cached_event(event_id):
     except Exception as e:
         current_app.logger.error(f"Redis Get Error: {e}")
         return None
+
+'''
+Input: event_ids: <list of str>
+Action: Fetches the cached data of many events with a single MGET
+Output: <dict: {<str:event_id>: <dict:event_data>}> (only cache hits, empty on Redis error)
+'''
+def get_cached_events(event_ids):
+    if not event_ids:
+        return {}
+    try:
+        values = redis_client.mget([get_event_cache_key(event_id) for event_id in event_ids])
+    except Exception as e:
+        current_app.logger.error(f"Redis MGET Error: {e}")
+        return {}
+    return {event_id: json.loads(value) for event_id, value in zip(event_ids, values) if value}
+
+USER_SNAPSHOT_FIELDS = (
+    "user_id", "username", "email", "created_at", "is_confirmed", "password_changed_at", "token_epoch", "confirmed_at",
+    "description", "academy", "faculty", "course", "year", "academic_clubs", "deleted", "pending_email", "profile_picture", "profile_picture_variants", "image_status"
+)
+USER_SNAPSHOT_DATETIME_FIELDS = ("created_at", "password_changed_at", "confirmed_at")
+
+_local_user_snapshots = OrderedDict() # user_id -> (expires_at, snapshot), least recently used first
+_local_user_snapshots_lock = threading.Lock()
+
+# Stores the snapshot (KEYS[1]) only when it is missing and the invalidation generation of the user (KEYS[2]) is still the one read before the database query (ARGV[1]),
+# so a snapshot read before a concurrent invalidate_user_cache is never cached
+_FILL_USER_SNAPSHOT_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+if redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3], 'NX') then
+    return 1
+end
+return 0
+"""
+_fill_user_snapshot_script = redis_client.register_script(_FILL_USER_SNAPSHOT_SCRIPT)
+
+'''
+Input: None
+Action: Empties the in-process snapshot cache and replaces its lock (it may have been held by another thread at fork time). Used in forked children
+Output: None
+'''
+def reset_local_user_snapshots():
+    global _local_user_snapshots, _local_user_snapshots_lock
+    _local_user_snapshots_lock = threading.Lock()
+    _local_user_snapshots = OrderedDict()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_local_user_snapshots)
+
+'''
+Input: user_id: <uuid/str>
+Action: Generates a standardized string key for Redis storage using the format "user:v1:<user_id>".
+Output: <str:cache_key>
+'''
+def get_user_cache_key(user_id):
+    return f"user:v1:{user_id}"
+
+'''
+Input: user_id: <uuid/str>
+Action: Generates the Redis key of the user's snapshot invalidation counter using the format "user_gen:v1:<user_id>".
+Output: <str:cache_key>
+'''
+def get_user_generation_key(user_id):
+    return f"user_gen:v1:{user_id}"
+
+'''
+Input: user_key: <str>
+Action: Returns the snapshot from the in-process cache when it has not expired (USER_SNAPSHOT_LOCAL_TTL) and marks it as recently used
+Output: <dict> or None
+'''
+def _get_local_user_snapshot(user_key):
+    with _local_user_snapshots_lock:
+        local = _local_user_snapshots.get(user_key)
+        if local is None:
+            return None
+        if local[0] <= time.monotonic():
+            del _local_user_snapshots[user_key]
+            return None
+        _local_user_snapshots.move_to_end(user_key)
+        return local[1]
+
+'''
+Input: user_key: <str>, snapshot: <dict>
+Action: Saves the snapshot in the in-process cache, evicting the least recently used entries above USER_SNAPSHOT_LOCAL_MAX_SIZE
+Output: None
+'''
+def _store_local_user_snapshot(user_key, snapshot):
+    with _local_user_snapshots_lock:
+        _local_user_snapshots[user_key] = (time.monotonic() + Constants.USER_SNAPSHOT_LOCAL_TTL, snapshot)
+        _local_user_snapshots.move_to_end(user_key)
+        while len(_local_user_snapshots) > Constants.USER_SNAPSHOT_LOCAL_MAX_SIZE:
+            _local_user_snapshots.popitem(last=False)
+
+'''
+Input: user: <User_Model_Object>
+Action: Builds a compact, JSON-serializable snapshot of the user row (USER_SNAPSHOT_FIELDS only, the password hash is never included)
+Output: <dict>
+'''
+def build_user_snapshot(user):
+    snapshot = {}
+    for field in USER_SNAPSHOT_FIELDS:
+        value = getattr(user, field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, uuid.UUID):
+            value = str(value)
+        snapshot[field] = value
+    return snapshot
+
+'''
+Input: snapshot: <dict> (as returned by build_user_snapshot)
+Action: Converts the serialized values back to the types the User model uses (UUID, datetime)
+Output: <dict>
+'''
+def _restore_user_snapshot(snapshot):
+    restored = dict(snapshot)
+    restored["user_id"] = uuid.UUID(restored["user_id"])
+    for field in USER_SNAPSHOT_DATETIME_FIELDS:
+        if restored.get(field):
+            restored[field] = datetime.fromisoformat(restored[field])
+    return restored
+
+'''
+Input: user: <User_Model_Object>, generation: <str> (invalidation generation read before the user was loaded, None when Redis could not be read)
+Action: Saves the user snapshot in Redis (USER_SNAPSHOT_TTL) and in the in-process cache (USER_SNAPSHOT_LOCAL_TTL). The Redis write is a fill: it is skipped when another process
+        already stored a snapshot or the user was invalidated since the generation was read, then the snapshot is only returned (not cached in process either)
+Output: <dict> (the restored snapshot)
+'''
+def cache_user_snapshot(user, generation):
+    snapshot = build_user_snapshot(user)
+    restored = _restore_user_snapshot(snapshot)
+    if generation is None:
+        return restored
+    try:
+        stored = _fill_user_snapshot_script(
+            keys=[get_user_cache_key(user.user_id), get_user_generation_key(user.user_id)],
+            args=[generation, json.dumps(snapshot), Constants.USER_SNAPSHOT_TTL]
+        )
+    except Exception as e:
+        current_app.logger.error(f"Redis User Set Error: {e}")
+        return restored
+
+    if stored:
+        _store_local_user_snapshot(str(user.user_id), restored)
+    return restored
+
+'''
+Input: user_id: <uuid/str>
+Action: Returns the user snapshot, checking the in-process cache first, then Redis, and only on a miss the database (the result is written back to both caches, see cache_user_snapshot).
+        The snapshot and the invalidation generation are read with one MGET
+Output: <dict> or None (if the user does not exist)
+'''
+def get_user_snapshot(user_id):
+    user_key = str(user_id)
+    local = _get_local_user_snapshot(user_key)
+    if local is not None:
+        return local
+
+    try:
+        cached, generation = redis_client.mget([get_user_cache_key(user_key), get_user_generation_key(user_key)])
+        generation = generation or "0"
+    except Exception as e:
+        current_app.logger.error(f"Redis User Get Error: {e}")
+        cached, generation = None, None
+
+    if cached:
+        restored = _restore_user_snapshot(json.loads(cached))
+        _store_local_user_snapshot(user_key, restored)
+        return restored
+
+    user = db.session.get(User, validate_uuid(user_key))
+    if user is None:
+        return None
+    return cache_user_snapshot(user, generation)
+
+'''
+Input: user_id: <uuid/str>
+Action: Deletes the cached user snapshot from Redis and from the in-process cache, and increments the user's invalidation generation so fills that loaded the user before this call are refused.
+        Must be called after every commit that changes a cached field (profile, academic details, password, email, deletion, picture moderation status).
+        Other processes can still serve their local copy for at most USER_SNAPSHOT_LOCAL_TTL seconds
+Output: None (Logs error if Redis fails).
+'''
+def invalidate_user_cache(user_id):
+    with _local_user_snapshots_lock:
+        _local_user_snapshots.pop(str(user_id), None)
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.incr(get_user_generation_key(user_id))
+        pipe.expire(get_user_generation_key(user_id), Constants.USER_SNAPSHOT_TTL)
+        pipe.delete(get_user_cache_key(user_id))
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.error(f"Redis User Delete Error: {e}")
+
+# Adds ARGV[1] to every existing counter in KEYS, never going below 0. Missing counters are left missing (the next read loads the real value from the database)
+_ADJUST_UNREAD_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        if redis.call('INCRBY', key, ARGV[1]) < 0 then
+            redis.call('SET', key, 0, 'KEEPTTL')
+        end
+    end
+end
+return 1
+"""
+_adjust_unread_script = redis_client.register_script(_ADJUST_UNREAD_SCRIPT)
+
+'''
+Input: user_id: <uuid/str>
+Action: Generates a standardized string key for Redis storage using the format "notif_unread:v1:<user_id>".
+Output: <str:cache_key>
+'''
+def get_unread_count_key(user_id):
+    return f"notif_unread:v1:{user_id}"
+
+'''
+Input: user_ids: <list of uuid/str>, amount: <int> (negative to decrement)
+Action: Atomically adjusts the cached unread notification counters of the given users in one round trip (Lua script). Call it after the commit that created/read/deleted the notifications
+Output: None (Logs error if Redis fails, reconcile_unread_counts_task fixes the drift).
+'''
+def adjust_unread_counts(user_ids, amount):
+    keys = [get_unread_count_key(user_id) for user_id in dict.fromkeys(str(u) for u in user_ids)]
+    if not keys or not amount:
+        return
+    try:
+        _adjust_unread_script(keys=keys, args=[amount])
+    except Exception as e:
+        current_app.logger.error(f"Redis Unread Count Adjust Error: {e}")
+
+'''
+Input: user_id: <uuid/str>
+Action: Returns the number of unread notifications of the user from Redis. On a miss it is counted in the database and cached for UNREAD_COUNT_TTL
+Output: <int>
+'''
+def get_unread_count(user_id):
+    key = get_unread_count_key(user_id)
+    try:
+        cached = redis_client.get(key)
+        if cached is not None:
+            return int(cached)
+    except Exception as e:
+        current_app.logger.error(f"Redis Unread Count Get Error: {e}")
+
+    count = Notification.query.filter_by(user_id=user_id, is_read=False).count()
+    try:
+        redis_client.set(key, count, ex=Constants.UNREAD_COUNT_TTL, nx=True)
+    except Exception as e:
+        current_app.logger.error(f"Redis Unread Count Set Error: {e}")
+    return count
+
+'''
+Input: user_ids: <list of str>
+Action: Overwrites the cached counters of the given users with the real values from the database (one GROUP BY query, one pipeline). Users that have no counter cached are skipped by the caller
+Output: <int:number of counters that were off>
+'''
+def reconcile_unread_counts(user_ids):
+    if not user_ids:
+        return 0
+    counts = dict(db.session.query(Notification.user_id, func.count()).filter(
+        Notification.user_id.in_([u for u in map(validate_uuid, user_ids) if u]),
+        Notification.is_read == False
+    ).group_by(Notification.user_id).all())
+    counts = {str(user_id): count for user_id, count in counts.items()}
+
+    keys = [get_unread_count_key(user_id) for user_id in user_ids]
+    cached = redis_client.mget(keys)
+    pipe = redis_client.pipeline(transaction=False)
+    fixed = 0
+    for user_id, key, value in zip(user_ids, keys, cached):
+        real = counts.get(str(user_id), 0)
+        if value is not None and int(value) != real: # expired counters are not recreated
+            fixed += 1
+            pipe.set(key, real, ex=Constants.UNREAD_COUNT_TTL)
+    pipe.execute()
+    return fixed
+
+'''
+EXPLAIN (FORMAT JSON) wrapper around a SELECT, executed through the session so bind parameters are processed as usual.
+Marked as a select, because it never writes (read-only endpoints can run it on the replica)
+'''
+class ExplainStatement(Executable, ClauseElement):
+    inherit_cache = False
+    is_select = True
+
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(ExplainStatement, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}"
+
+'''
+Input: query: <SQLAlchemy_Query> or <Select>
+Action: Returns the planner's row estimate for the query instead of running COUNT(*). The value comes from table statistics, so it is approximate (good enough for "about N results")
+Output: int or None (if the plan could not be obtained)
+'''
+def estimate_row_count(query):
+    statement = getattr(query, "statement", query)
+    try:
+        plan = db.session.execute(ExplainStatement(statement)).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"WARNING: estimate_row_count failed: {e}")
+        return None
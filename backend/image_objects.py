@@ -0,0 +1,150 @@
+from backend.extensions import db
+from backend.models.image_object import ImageObject
+from backend.constants import Constants
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+import hashlib
+
+'''
+Input: data: <BytesIO> (processed image)
+Action: Hashes the processed bytes with SHA-256. Processing is deterministic, so every upload of the same file gives the same hash
+Output: <str:content_hash> (hex)
+'''
+def get_content_hash(data):
+    return hashlib.sha256(data.getbuffer()).hexdigest()
+
+'''
+Input: image_type: <str>, content_hash: <str>
+Action: Looks up the object already stored for this content and marks it as just used (the unreferenced objects are kept for IMAGE_OBJECT_GRACE_SECONDS after that, the client still has to attach it)
+Output: <str:cloud_id> or None
+'''
+def find_image_object(image_type, content_hash):
+    cloud_id = db.session.execute(
+        update(ImageObject)
+        .where(ImageObject.image_type == image_type, ImageObject.content_hash == content_hash)
+        .values(last_used_at=datetime.now(timezone.utc))
+        .returning(ImageObject.cloud_id)
+    ).scalar()
+    db.session.commit()
+    return cloud_id
+
+'''
+Input: cloud_id: <str>, image_type: <str>, content_hash: <str>, perceptual_hash: <str> or None
+Action: Registers a freshly uploaded object. When the same content was registered in the meantime (two uploads at once) the existing object wins
+Output: <str:cloud_id> (the registered object, different from cloud_id if another upload won)
+'''
+def register_image_object(cloud_id, image_type, content_hash, perceptual_hash):
+    inserted = db.session.execute(
+        insert(ImageObject)
+        .values(cloud_id=cloud_id, image_type=image_type, content_hash=content_hash, perceptual_hash=perceptual_hash)
+        .on_conflict_do_nothing(constraint="uq_Image_objects_image_type_content_hash")
+        .returning(ImageObject.cloud_id)
+    ).scalar()
+    db.session.commit()
+    return inserted or find_image_object(image_type, content_hash)
+
+'''
+Input: cloud_ids: <list[str]> (keys put on new Pictures / User rows, repeated keys count once per row)
+Action: Adds the references in the caller's transaction, so they are committed together with the rows. Keys without an ImageObject (uploaded before deduplication) are skipped
+Output: None
+'''
+def acquire_image_refs(cloud_ids):
+    for cloud_id, count in Counter(cloud_ids).items():
+        db.session.execute(
+            update(ImageObject)
+            .where(ImageObject.cloud_id == cloud_id)
+            .values(ref_count=ImageObject.ref_count + count)
+        )
+
+'''
+Input: cloud_id: <str>
+Action: Drops one reference of the object. When nobody references it anymore and it was not handed out by upload_to_r2 in the last IMAGE_OBJECT_GRACE_SECONDS, the ImageObject row is removed.
+        Rejected objects keep their row (their moderation verdict is reused), their files are already gone
+Output: <bool:tracked>, <bool:removable> - tracked is False for keys without an ImageObject, removable tells the caller to delete the files from R2
+'''
+def release_image_ref(cloud_id):
+    ref_count = db.session.execute(
+        update(ImageObject)
+        .where(ImageObject.cloud_id == cloud_id)
+        .values(ref_count=func.greatest(ImageObject.ref_count - 1, 0))
+        .returning(ImageObject.ref_count)
+    ).scalar()
+    if ref_count is None:
+        db.session.commit()
+        return False, False
+
+    removed = None
+    if ref_count == 0:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=Constants.IMAGE_OBJECT_GRACE_SECONDS)
+        removed = db.session.execute(
+            delete(ImageObject)
+            .where(
+                ImageObject.cloud_id == cloud_id,
+                ImageObject.ref_count == 0,
+                ImageObject.last_used_at < cutoff,
+                ImageObject.moderation_status != "rejected"
+            )
+            .returning(ImageObject.cloud_id)
+        ).scalar()
+    db.session.commit()
+    return True, removed is not None
+
+'''
+Input: limit: <int>
+Action: Removes up to limit ImageObject rows nobody referenced for IMAGE_OBJECT_GRACE_SECONDS (uploads never attached to an event or profile, objects left after the last release).
+        Rows are claimed with FOR UPDATE SKIP LOCKED, the caller deletes their files from R2
+Output: list of tuples (<str:cloud_id>, <str:image_type>)
+'''
+def claim_unreferenced_images(limit):
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=Constants.IMAGE_OBJECT_GRACE_SECONDS)
+    candidates = (
+        select(ImageObject.cloud_id)
+        .where(ImageObject.ref_count == 0, ImageObject.last_used_at < cutoff, ImageObject.moderation_status != "rejected")
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.session.execute(
+        delete(ImageObject).where(ImageObject.cloud_id.in_(candidates)).returning(ImageObject.cloud_id, ImageObject.image_type)
+    ).all()
+    db.session.commit()
+    return [tuple(row) for row in rows]
+
+'''
+Input: cloud_id: <str>
+Action: Returns the moderation verdict already saved on the object (an identical upload was moderated before). Verdicts are never shared through the perceptual hash, different pictures (flat posters, plain backgrounds) can have the same one
+Output: <str:status> ("approved"/"rejected") or None
+'''
+def get_moderation_verdict(cloud_id):
+    image_object = db.session.get(ImageObject, cloud_id)
+    if image_object is None or image_object.moderation_status not in ("approved", "rejected"):
+        return None
+    return image_object.moderation_status
+
+'''
+Input: cloud_id: <str>
+Action: Looks for a rejected object with the same perceptual hash (possibly a re-encoded or resized copy of a rejected picture). Only used for reporting, the picture is still checked by the moderation backend
+Output: <str:cloud_id> of the rejected object or None
+'''
+def find_rejected_lookalike(cloud_id):
+    perceptual_hash = db.session.execute(
+        select(ImageObject.perceptual_hash).where(ImageObject.cloud_id == cloud_id)
+    ).scalar()
+    if not perceptual_hash:
+        return None
+    return db.session.execute(
+        select(ImageObject.cloud_id)
+        .where(ImageObject.perceptual_hash == perceptual_hash, ImageObject.moderation_status == "rejected", ImageObject.cloud_id != cloud_id)
+        .limit(1)
+    ).scalar()
+
+'''
+Input: cloud_id: <str>, status: <str> ("approved"/"rejected")
+Action: Saves the moderation verdict on the object (in the caller's transaction), later uploads of the same content reuse it
+Output: <datetime:created_at> (upload time of the object) or None for keys without an ImageObject
+'''
+def record_moderation_verdict(cloud_id, status):
+    return db.session.execute(
+        update(ImageObject).where(ImageObject.cloud_id == cloud_id).values(moderation_status=status).returning(ImageObject.created_at)
+    ).scalar()
@@ -0,0 +1,96 @@
+from backend.extensions import redis_client
+from backend.constants import Constants
+import threading
+import logging
+import time
+import os
+
+METRICS_KEY = "metrics:v1:counters"
+GAUGES_KEY = "metrics:v1:gauges"
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending_counters = {}
+_pending_gauges = {}
+_next_flush = time.monotonic() + Constants.METRICS_FLUSH_INTERVAL
+
+'''
+Input: name: <str>, amount: <int/float> (optional)
+Action: Increments a counter. Values are buffered in process and pushed to Redis at most every METRICS_FLUSH_INTERVAL seconds, so calling it on hot paths costs no round trip
+Output: None
+'''
+def incr(name, amount=1):
+    with _lock:
+        _pending_counters[name] = _pending_counters.get(name, 0) + amount
+    _maybe_flush()
+
+'''
+Input: name: <str>, value: <float> (ex. duration in seconds)
+Action: Records one observation: increments "<name>:count" and adds the value to "<name>:sum" (average = sum / count). The highest value seen by this process since the last flush is kept as the "<name>:max" gauge
+Output: None
+'''
+def observe(name, value):
+    with _lock:
+        _pending_counters[f"{name}:count"] = _pending_counters.get(f"{name}:count", 0) + 1
+        _pending_counters[f"{name}:sum"] = _pending_counters.get(f"{name}:sum", 0) + value
+        _pending_gauges[f"{name}:max"] = max(_pending_gauges.get(f"{name}:max", 0), value)
+    _maybe_flush()
+
+'''
+Input: name: <str>, value: <int/float>
+Action: Sets a gauge for the current process. Gauges are stored per process id ("<name>:<pid>"), because every worker has its own pool/state
+Output: None
+'''
+def set_gauge(name, value):
+    with _lock:
+        _pending_gauges[name] = value
+    _maybe_flush()
+
+def _maybe_flush():
+    if time.monotonic() >= _next_flush:
+        flush()
+
+'''
+Input: None
+Action: Pushes the buffered counters (HINCRBYFLOAT) and gauges (HSET) to Redis in one pipeline. On a Redis error the buffered values are dropped, metrics must never break a request
+Output: None
+'''
+def flush():
+    global _next_flush
+    with _lock:
+        counters = dict(_pending_counters)
+        gauges = dict(_pending_gauges)
+        _pending_counters.clear()
+        _pending_gauges.clear()
+        _next_flush = time.monotonic() + Constants.METRICS_FLUSH_INTERVAL
+
+    if not counters and not gauges:
+        return
+
+    pid = os.getpid()
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for name, value in counters.items():
+            pipe.hincrbyfloat(METRICS_KEY, name, value)
+        for name, value in gauges.items():
+            pipe.hset(GAUGES_KEY, f"{name}:{pid}", value)
+        if gauges:
+            pipe.expire(GAUGES_KEY, Constants.CACHE_TTL) # gauges of stopped workers disappear with the hash
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Redis Metrics Flush Error: {e}")
+
+'''
+Input: None
+Action: Reads all counters and gauges collected by every process
+Output: <dict: {"counters": {<str>: <float>}, "gauges": {<str>: <float>}}>
+'''
+def get_metrics():
+    flush()
+    counters = redis_client.hgetall(METRICS_KEY)
+    gauges = redis_client.hgetall(GAUGES_KEY)
+    return {
+        "counters": {name: float(value) for name, value in sorted(counters.items())},
+        "gauges": {name: float(value) for name, value in sorted(gauges.items())}
+    }
@@ -4,6 +4,8 @@ from .friend import Friendship, FriendRequest
 from .comment import Comment
 from .tokenblocklist import TokenBlocklist
 from .notification import Notification
+from .outbox import OutboxMessage
+from .image_object import ImageObject
 
 __all__ = [
     "User",
@@ -12,5 +14,7 @@ __all__ = [
     "FriendRequest",
     "Comment",
     "TokenBlocklist",
-    "Notification"
+    "Notification",
+    "OutboxMessage",
+    "ImageObject"
 ]
\ No newline at end of file
@@ -10,11 +10,17 @@ class Comment(db.Model):
     parent_comment_id = db.Column(UUID(as_uuid=True), db.ForeignKey("Comments.comment_id", ondelete='SET NULL'), default=None, nullable=True)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey("User.user_id", ondelete='CASCADE'), nullable=False)
     event_id = db.Column(UUID(as_uuid=True), db.ForeignKey("Event.event_id", ondelete='CASCADE'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     content = db.Column(db.String(1000), nullable=False)
     edited = db.Column(db.Boolean, default=False)
     deleted = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        # thread pages: top-level comments of an event and replies of a comment, both walked in (created_at, comment_id) order
+        db.Index("ix_Comments_event_id_created_at_comment_id", "event_id", "created_at", "comment_id"),
+        db.Index("ix_Comments_parent_comment_id_created_at_comment_id", "parent_comment_id", "created_at", "comment_id"),
+    )
+
     parent_comment = db.relationship('Comment', remote_side=[comment_id], backref='replies') #comment.replies - list of child comments
     user = db.relationship('User', foreign_keys=[user_id])
     event = db.relationship('Event', foreign_keys=[event_id])
@@ -30,7 +36,8 @@ class Comment(db.Model):
         self.content = ""
         self.edited = True
 
-    def to_dict(self):
+    # replies are not loaded here (the lazy backref costs one SELECT per comment), the tree builder passes them in
+    def to_dict(self, replies=None):
         return {
             "comment_id": str(self.comment_id),
             "user_id": str(self.user_id) if not self.deleted else None,
@@ -38,5 +45,5 @@ class Comment(db.Model):
             "deleted": self.deleted,
             "created_at": self.created_at.isoformat(),
             "parent_comment_id": (str(self.parent_comment_id) if self.parent_comment_id else None),
-            "replies": [reply.to_dict() for reply in self.replies]
+            "replies": replies if replies is not None else []
         }
\ No newline at end of file
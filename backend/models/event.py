@@ -1,10 +1,26 @@
 from backend.extensions import db
-from sqlalchemy import CheckConstraint, UniqueConstraint
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import CheckConstraint, UniqueConstraint, DDL, event, text
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR, JSONB
 import uuid
 from datetime import datetime, timezone
 import enum
-from sqlalchemy.orm import validates
+from sqlalchemy.orm import validates, deferred
+
+SEARCH_CONFIG = "simple_unaccent"
+
+# Text search setup used by Event.search_vector and the trigram index: 'simple' dictionary (no stemming, works for Polish) with accents removed,
+# plus an IMMUTABLE unaccent wrapper (the built-in one is only STABLE, so it cannot be used in an index)
+SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+    f"DO $$ BEGIN "
+    f"IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{SEARCH_CONFIG}') THEN "
+    f"CREATE TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} (COPY = simple); "
+    f"ALTER TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple; "
+    f"END IF; END $$",
+]
 
 
 
@@ -27,10 +43,23 @@ class Event(db.Model):
     comment_count = db.Column(db.Integer, default=0, nullable = False)
     participant_count = db.Column(db.Integer, default=0, nullable = False)
     is_private = db.Column(db.Boolean, default = False, nullable = False)
+    # maintained by Postgres, name weighted above description; deferred so it is never loaded with the event
+    search_vector = deferred(db.Column(TSVECTOR, db.Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(event_name, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+        persisted=True
+    )))
 
     __table_args__ = (
         CheckConstraint('comment_count >= 0', name='check_comment_count_positive'),
         CheckConstraint('participant_count >= 0', name='check_participant_count_positive'),
+        # keyset pagination of the feed: (sort column, event_id)
+        db.Index("ix_Event_date_and_time_event_id", "date_and_time", "event_id"),
+        db.Index("ix_Event_participant_count_event_id", "participant_count", "event_id"),
+        db.Index("ix_Event_comment_count_event_id", "comment_count", "event_id"),
+        # full-text search (prefix tsquery) and typo tolerant trigram fallback on the name
+        db.Index("ix_Event_search_vector", "search_vector", postgresql_using="gin"),
+        db.Index("ix_Event_event_name_trgm", text("immutable_unaccent(lower(event_name)) gin_trgm_ops"), postgresql_using="gin"),
     )
 
     creator = db.relationship("User", foreign_keys=[creator_id])
@@ -47,6 +76,9 @@ class Event(db.Model):
             
         return date_and_time
 
+for statement in SEARCH_DDL:
+    event.listen(Event.__table__, "before_create", DDL(statement).execute_if(dialect="postgresql"))
+
 class Event_participants(db.Model):
     __tablename__ = "Event_participants"
 
@@ -101,9 +133,10 @@ class Pictures(db.Model):
     __tablename__ = "Event_Pictures"
 
     event_picture_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
-    cloud_id = db.Column(db.String(255), nullable=False, unique=True)
+    cloud_id = db.Column(db.String(255), nullable=False, index=True) # not unique, identical uploads share one R2 object (ImageObject)
+    variants = db.Column(JSONB, nullable=True) #{"<width>": {"webp": <key>, "jpg": <key>}}, None for pictures uploaded without variants
     event_id = db.Column(UUID(as_uuid=True), db.ForeignKey("Event.event_id", ondelete='CASCADE'), nullable=False, index=True)
-    image_status = db.Column(db.String(20), default="pending") 
+    image_status = db.Column(db.String(20), default="pending") # processing (staged upload), pending (moderation), approved, rejected, failed
 
     event = db.relationship("Event", back_populates="pictures")
 
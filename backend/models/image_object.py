@@ -0,0 +1,22 @@
+from backend.extensions import db
+from datetime import datetime, timezone
+
+class ImageObject(db.Model):
+    __tablename__ = "Image_objects"
+
+    # key of the main image in R2 ("<upload_id>/orig.jpg"), the variants are next to it
+    cloud_id = db.Column(db.String(255), primary_key=True)
+    image_type = db.Column(db.String(10), nullable=False) # event / profile (bucket)
+    content_hash = db.Column(db.String(64), nullable=False) # sha256 of the processed JPEG
+    perceptual_hash = db.Column(db.String(16), nullable=True, index=True) # dHash of the picture, survives re-encoding and resizing
+    moderation_status = db.Column(db.String(20), default="pending", nullable=False) # pending, approved, rejected (objects already removed from R2)
+    ref_count = db.Column(db.Integer, default=0, nullable=False) # Pictures / User rows using the object
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    last_used_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False) # last time upload_to_r2 returned the key
+
+    __table_args__ = (
+        # one object per content and bucket, upload_to_r2 looks it up before every upload
+        db.UniqueConstraint("image_type", "content_hash", name="uq_Image_objects_image_type_content_hash"),
+        # purge_unreferenced_images_task only scans objects nobody uses
+        db.Index("ix_Image_objects_unreferenced", "last_used_at", postgresql_where=db.text("ref_count = 0")),
+    )
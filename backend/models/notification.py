@@ -1,4 +1,5 @@
 from backend.extensions import db
+from sqlalchemy import DDL, event, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
 from datetime import datetime, timezone
@@ -25,13 +26,26 @@ class NotificationTag(enum.Enum):
 
 class Notification(db.Model):
     __tablename__ = 'Notifications'
+    __table_args__ = (
+        # inbox pages walk (created_at, notification_id) of one user, unread and tag filters have their own narrower indexes
+        db.Index("ix_Notifications_user_id_created_at_notification_id", "user_id", text("created_at DESC"), text("notification_id DESC")),
+        db.Index("ix_Notifications_user_id_created_at_unread", "user_id", "created_at", "notification_id", postgresql_where=text("is_read = false")),
+        db.Index("ix_Notifications_user_id_tag_created_at", "user_id", "tag", "created_at", "notification_id"),
+        # q filter: payload->>'message' ILIKE '%q%'
+        db.Index("ix_Notifications_message_trgm", text("(payload ->> 'message') gin_trgm_ops"), postgresql_using="gin"),
+        # coalescing: the unread row of a recipient's group ("<tag>:<event_id>") is looked up on every mergeable notification
+        db.Index("ix_Notifications_user_id_group_key_unread", "user_id", "group_key", "created_at", postgresql_where=text("is_read = false AND group_key IS NOT NULL")),
+    )
 
     notification_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
-    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey("User.user_id", ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey("User.user_id", ondelete='CASCADE'), nullable=False)
     
     tag = db.Column(db.Enum(NotificationTag), nullable=False, default=NotificationTag.other)
     is_read = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     payload = db.Column(JSONB, nullable=False, default={})
+    group_key = db.Column(db.String(100), nullable=True) # set for notifications merged by backend.notifications.coalesce
 
-    user = db.relationship("User", foreign_keys=[user_id])
\ No newline at end of file
+    user = db.relationship("User", foreign_keys=[user_id])
+
+event.listen(Notification.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
@@ -0,0 +1,20 @@
+from backend.extensions import db
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime, timezone
+
+class OutboxMessage(db.Model):
+    __tablename__ = "Outbox"
+
+    # sequential id, the relay publishes in insertion order
+    outbox_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    task_name = db.Column(db.String(255), nullable=False)
+    kwargs = db.Column(JSONB, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    published_at = db.Column(db.DateTime(timezone=True), nullable=True, index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.String(500), nullable=True)
+
+    __table_args__ = (
+        # the relay only scans messages that are not published yet
+        db.Index("ix_Outbox_pending", "outbox_id", postgresql_where=db.text("published_at IS NULL")),
+    )
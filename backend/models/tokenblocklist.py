@@ -10,6 +10,6 @@ class TokenBlocklist(db.Model):
     token_type = db.Column(db.String(18), nullable=False)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey("User.user_id", ondelete='CASCADE'), nullable=False, index=True)
     revoked_at = db.Column(db.DateTime(timezone=True))
-    expires = db.Column(db.DateTime(timezone=True), nullable=False)
+    expires = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
 
     user = db.relationship("User")
\ No newline at end of file
@@ -1,6 +1,6 @@
 from backend.extensions import db, bcrypt
 from sqlalchemy import CheckConstraint
-from sqlalchemy.dialects.postgresql import UUID, ARRAY
+from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB
 import uuid
 from datetime import datetime, timezone
 
@@ -15,6 +15,7 @@ class User(db.Model):
     
     is_confirmed = db.Column(db.Boolean, default=False)
     password_changed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    token_epoch = db.Column(db.Integer, default=0, server_default="0", nullable=False) # bumped on logout_all/password change, invalidates epoch access tokens
     confirmed_at = db.Column(db.DateTime(timezone=True), nullable=True)
     
     description = db.Column(db.String(320))
@@ -28,7 +29,8 @@ class User(db.Model):
     pending_email = db.Column(db.String(320), nullable=True)
 
     profile_picture = db.Column(db.String(255), nullable=True, default=None)
-    image_status = db.Column(db.String(20), default="pending") 
+    profile_picture_variants = db.Column(JSONB, nullable=True, default=None) #{"<width>": {"webp": <key>, "jpg": <key>}}
+    image_status = db.Column(db.String(20), default="pending") # processing (staged upload), pending (moderation), approved, rejected, failed
     
     blocks_initiated = db.relationship(
         "BlockList",
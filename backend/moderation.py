@@ -0,0 +1,49 @@
+from backend.picture_helpers import get_rekognition_client
+from backend.constants import Constants
+from flask import current_app
+import threading
+
+'''
+Moderation backend calling AWS Rekognition (detect_moderation_labels with MIN_CONFIDENCE_REKOGITION)
+'''
+class RekognitionModeration:
+    def detect_labels(self, image_bytes):
+        response = get_rekognition_client().detect_moderation_labels(
+            Image={'Bytes': image_bytes},
+            MinConfidence=Constants.MIN_CONFIDENCE_REKOGITION
+        )
+        return response['ModerationLabels']
+
+'''
+Local moderation backend for tests and development without AWS. Approves every image, unless labels are set (then every image gets them).
+The size of every checked image is kept in calls
+'''
+class StubModeration:
+    def __init__(self):
+        self.labels = []
+        self.calls = []
+
+    def detect_labels(self, image_bytes):
+        self.calls.append(len(image_bytes))
+        return list(self.labels)
+
+MODERATION_BACKENDS = {
+    "rekognition": RekognitionModeration,
+    "stub": StubModeration,
+}
+
+_lock = threading.Lock()
+_backends = {}
+
+'''
+Input: None
+Action: Returns the process-wide instance of the moderation backend chosen with MODERATION_BACKEND. Every backend has detect_labels(image_bytes) -> list of labels (empty list = approved)
+Output: <RekognitionModeration/StubModeration>
+'''
+def get_moderation_backend():
+    name = current_app.config["MODERATION_BACKEND"]
+    backend = _backends.get(name)
+    if backend is None:
+        with _lock:
+            backend = _backends.setdefault(name, MODERATION_BACKENDS[name]())
+    return backend
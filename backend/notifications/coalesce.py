@@ -0,0 +1,138 @@
+from backend.extensions import db
+from backend.models.notification import Notification, NotificationTag
+from backend.constants import Constants
+from backend import metrics
+from flask import current_app
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import insert, select, func
+import uuid
+
+def _others(count):
+    return "1 other" if count == 1 else f"{count} others"
+
+'''
+Tags whose notifications about the same event are merged into one row ("Ania and 12 others joined your event").
+For each tag: payload fields holding the actor (None when the notification has no actor) and the message of a merged row
+'''
+COALESCE_RULES = {
+    NotificationTag.event_new_participant: {
+        "actor_id": "participant_id",
+        "actor_name": "participant_name",
+        "message": lambda p: f"{p['actors'][0]['name']} and {_others(p['actor_count'] - 1)} joined your event {p['event_name']}."
+    },
+    NotificationTag.event_new_comment: {
+        "actor_id": "commenter_id",
+        "actor_name": "commenter_name",
+        "message": lambda p: (
+            f"{p['actors'][0]['name']} commented {p['count']} times on your event {p['event_name']}."
+            if p["actor_count"] == 1 else
+            f"{p['actors'][0]['name']} and {_others(p['actor_count'] - 1)} commented on your event {p['event_name']}."
+        )
+    },
+    NotificationTag.joined_event_updated: {
+        "actor_id": None,
+        "actor_name": None,
+        "message": lambda p: f"An event you are attending ({p['event_name']}) has been updated {p['count']} times."
+    },
+}
+
+'''
+Input: notification_tag: <NotificationTag>, payload: <dict>
+Action: Builds the key of the row the notification can be merged into: "<tag>:<event_id>" for the tags in COALESCE_RULES
+Output: <str:group_key> or None if the notification is never merged
+'''
+def get_group_key(notification_tag, payload):
+    if notification_tag not in COALESCE_RULES or not payload.get("event_id"):
+        return None
+    return f"{notification_tag.value}:{payload['event_id']}"
+
+'''
+Input: notification_tag: <NotificationTag>, payload: <dict>
+Action: Adds the merge counters to the payload of a new mergeable row: count (notifications merged), actors (newest first, at most NOTIFICATION_COALESCE_MAX_ACTORS) and actor_count
+Output: <dict:payload>
+'''
+def initial_payload(notification_tag, payload):
+    rule = COALESCE_RULES[notification_tag]
+    payload = dict(payload, count=1, actors=[], actor_count=0)
+    if rule["actor_id"]:
+        payload["actors"] = [{"id": payload.get(rule["actor_id"]), "name": payload.get(rule["actor_name"])}]
+        payload["actor_count"] = 1
+    return payload
+
+'''
+Input: notification_tag: <NotificationTag>, existing: <dict> (payload of the unread row), payload: <dict> (the new notification)
+Action: Merges a new notification into an unread row: the newest payload fields win, count goes up, a new actor is put first on the actor list and the message is rebuilt.
+        Only the last NOTIFICATION_COALESCE_MAX_ACTORS actors are kept, so actor_count can over-count an actor that fell off the list and came back
+Output: <dict:payload> (new dict, the JSONB column is reassigned)
+'''
+def merge_payload(notification_tag, existing, payload):
+    rule = COALESCE_RULES[notification_tag]
+    merged = dict(existing, **payload)
+    merged["count"] = existing["count"] + 1
+
+    if rule["actor_id"]:
+        actor = {"id": payload.get(rule["actor_id"]), "name": payload.get(rule["actor_name"])}
+        known = [a for a in existing["actors"] if a["id"] != actor["id"]]
+        if len(known) == len(existing["actors"]):
+            merged["actor_count"] += 1
+        merged["actors"] = ([actor] + known)[:Constants.NOTIFICATION_COALESCE_MAX_ACTORS]
+
+    merged["message"] = rule["message"](merged)
+    return merged
+
+'''
+Input: user_ids: <list[str]> (distinct), notification_tag: <NotificationTag>, payload: <dict>
+Action: Writes one notification for every recipient in one transaction. For a mergeable tag (COALESCE_RULES) the recipients that already have an unread row of the same group
+        created in the last NOTIFICATION_COALESCE_WINDOW seconds get that row updated (payload merged, created_at moved to now so it is shown on top) instead of a new row.
+        Writers of the same group are serialized with a transaction-level advisory lock, so two workers never create two rows for one group.
+        Reports "notifications_created" and "notifications_coalesced" (rows avoided)
+Output: tuple (<list[Notification]:created>, <list[Notification]:coalesced>) - transient copies of the committed rows (no reload after the commit)
+'''
+def write_notifications(user_ids, notification_tag, payload):
+    now = datetime.now(timezone.utc)
+    group_key = get_group_key(notification_tag, payload)
+    coalesced = {}
+
+    if group_key:
+        db.session.execute(select(func.pg_advisory_xact_lock(func.hashtext(group_key))))
+        cutoff = now - timedelta(seconds=current_app.config["NOTIFICATION_COALESCE_WINDOW"])
+        existing = Notification.query.filter(
+            Notification.user_id.in_(user_ids),
+            Notification.group_key == group_key,
+            Notification.is_read == False,
+            Notification.created_at >= cutoff
+        ).order_by(Notification.created_at.asc()).with_for_update().all()
+
+        for notification in existing: #the newest unread row of the recipient wins
+            coalesced[str(notification.user_id)] = notification
+        for user_id, notification in coalesced.items():
+            notification.payload = merge_payload(notification_tag, notification.payload, payload)
+            notification.created_at = now
+            coalesced[user_id] = Notification(
+                notification_id=notification.notification_id,
+                user_id=notification.user_id,
+                tag=notification_tag,
+                is_read=False,
+                created_at=now,
+                group_key=group_key,
+                payload=notification.payload
+            )
+        payload = initial_payload(notification_tag, payload)
+
+    rows = [{
+        "notification_id": uuid.uuid4(),
+        "user_id": user_id,
+        "tag": notification_tag,
+        "is_read": False,
+        "created_at": now,
+        "group_key": group_key,
+        "payload": payload
+    } for user_id in user_ids if str(user_id) not in coalesced]
+    if rows:
+        db.session.execute(insert(Notification).values(rows))
+    db.session.commit()
+
+    metrics.incr("notifications_created", len(rows))
+    if coalesced:
+        metrics.incr("notifications_coalesced", len(coalesced))
+    return [Notification(**row) for row in rows], list(coalesced.values())
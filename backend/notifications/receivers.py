@@ -1,6 +1,7 @@
 from .signals import *
 from backend.models.notification import NotificationTag
-from backend.tasks import create_notification_task
+from backend.tasks import create_notification_task, create_notifications_bulk_task
+from backend.outbox import enqueue_task
 
 """Events"""
 @event_new_participant.connect
@@ -19,7 +20,8 @@ def handle_event_new_participant(sender, **kwargs):
         "message": f"{participant_username} joined your event {event_name}."
     }
 
-    create_notification_task.delay(
+    enqueue_task(
+        create_notification_task,
         user_id=str(creator_id),
         notification_tag_value=NotificationTag.event_new_participant.value,
         payload=payload
@@ -44,7 +46,8 @@ def handle_event_new_comment(sender, **kwargs):
         "message": f"{commenter_name} commented on your event {event_name}."
     }
 
-    create_notification_task.delay(
+    enqueue_task(
+        create_notification_task,
         user_id=str(creator_id),
         notification_tag_value=NotificationTag.event_new_comment.value,
         payload=payload
@@ -69,7 +72,8 @@ def handle_invite_created_notification(sender, **kwargs):
         "message": f"{from_user_username} invited you to an event {event_name}."
     }
 
-    create_notification_task.delay(
+    enqueue_task(
+        create_notification_task,
         user_id = str(to_user_id),
         notification_tag_value = NotificationTag.invite_created.value,
         payload = payload
@@ -95,7 +99,8 @@ def handle_invite_status_update(sender, **kwargs):
         "message": f"{invitee_username} {status} your invitation to {event_name}."
     }
 
-    create_notification_task.delay(
+    enqueue_task(
+        create_notification_task,
         user_id=str(inviter_id),
         notification_tag_value=NotificationTag.invite_status_update.value,
         payload=payload
@@ -114,10 +119,11 @@ def handle_joined_event_updated(sender, **kwargs):
         "message": f"An event you are attending ({event_name}) has been updated."
     }
 
-    #loop through all participants and queue a notification for each
-    for user_id in participant_ids:
-        create_notification_task.delay(
-            user_id=str(user_id),
+    #one task for all recipients, it writes the rows in bulk
+    if participant_ids:
+        enqueue_task(
+            create_notifications_bulk_task,
+            user_ids=[str(user_id) for user_id in participant_ids],
             notification_tag_value=NotificationTag.joined_event_updated.value,
             payload=payload
         )
@@ -134,10 +140,11 @@ def handle_joined_event_deleted(sender, **kwargs):
         "message": f"The event '{event_name}' hosted by {creator_username} has been canceled."
     }
 
-    #loop through all participants and queue a notification for each
-    for user_id in participant_ids:
-        create_notification_task.delay(
-            user_id=str(user_id),
+    #one task for all recipients, it writes the rows in bulk
+    if participant_ids:
+        enqueue_task(
+            create_notifications_bulk_task,
+            user_ids=[str(user_id) for user_id in participant_ids],
             notification_tag_value=NotificationTag.joined_event_deleted.value,
             payload=payload
         )
@@ -157,7 +164,8 @@ def handle_friend_request_notification(sender, **kwargs):
         "message": f"{from_user_username} sent you a friend request."
     }
 
-    create_notification_task.delay(
+    enqueue_task(
+        create_notification_task,
         user_id = str(to_user_id),
         notification_tag_value = NotificationTag.friend_request_created.value, 
         payload = payload
@@ -175,7 +183,8 @@ def handle_friend_request_accepted(sender, **kwargs):
         "message": f"{accepter_name} accepted your friend request!"
     }
 
-    create_notification_task.delay(
+    enqueue_task(
+        create_notification_task,
         user_id=str(original_sender_id),
         notification_tag_value=NotificationTag.friend_request_accepted.value,
         payload=payload
@@ -197,9 +206,11 @@ def handle_friend_new_public_event(sender, **kwargs):
         "message": f"Your friend {creator_name} created a new public event: {event_name}."
     }
 
-    for f_id in friend_ids:
-        create_notification_task.delay(
-            user_id=str(f_id),
+    #one task for all recipients, it writes the rows in bulk
+    if friend_ids:
+        enqueue_task(
+            create_notifications_bulk_task,
+            user_ids=[str(f_id) for f_id in friend_ids],
             notification_tag_value=NotificationTag.friend_new_public_event.value,
             payload=payload
         )
@@ -220,9 +231,11 @@ def handle_friend_new_private_event(sender, **kwargs):
         "message": f"Your friend {creator_name} shared a private event: {event_name} with you."
     }
 
-    for f_id in shared_with_ids:
-        create_notification_task.delay(
-            user_id=str(f_id),
+    #one task for all recipients, it writes the rows in bulk
+    if shared_with_ids:
+        enqueue_task(
+            create_notifications_bulk_task,
+            user_ids=[str(f_id) for f_id in shared_with_ids],
             notification_tag_value=NotificationTag.friend_new_private_event.value,
             payload=payload
         )
@@ -247,7 +260,8 @@ def handle_comment_reply_created(sender, **kwargs):
         "message": f"{replier_name} replied to your comment in {event_name}."
     }
 
-    create_notification_task.delay(
+    enqueue_task(
+        create_notification_task,
         user_id=str(parent_author_id),
         notification_tag_value=NotificationTag.comment_reply_created.value,
         payload=payload
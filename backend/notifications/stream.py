@@ -0,0 +1,111 @@
+from backend.extensions import redis_client
+from backend.constants import Constants
+from flask import current_app
+from zoneinfo import ZoneInfo
+import threading
+import logging
+import queue
+import json
+import time
+
+local_tz = ZoneInfo("Europe/Warsaw")
+
+logger = logging.getLogger(__name__)
+
+'''
+Input: user_id: <uuid/str>
+Action: Generates the name of the user's Redis pub/sub channel using the format "notifications:v1:<user_id>".
+Output: <str:channel>
+'''
+def get_notification_channel(user_id):
+    return f"notifications:v1:{user_id}"
+
+'''
+Input: notification: <Notification_Object>
+Action: Serializes a notification the way the notification endpoints send it, with the date and time converted to the "Europe/Warsaw" timezone
+Output: <dict>
+'''
+def serialize_notification(notification):
+    return {
+        "notification_id": str(notification.notification_id),
+        "tag": notification.tag.value,
+        "is_read": notification.is_read,
+        "date": notification.created_at.astimezone(local_tz).strftime("%d.%m.%Y"),
+        "time": notification.created_at.astimezone(local_tz).strftime("%H:%M"),
+        "payload": notification.payload
+    }
+
+'''
+Input: notifications: <list of Notification_Object> (already committed)
+Action: Publishes every notification on its recipient's channel in one pipeline, so the open /api/notifications/stream connections of that user get it immediately
+Output: None (Logs error if Redis fails, the notification is still visible in the list).
+'''
+def publish_notifications(notifications):
+    if not notifications:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for notification in notifications:
+            pipe.publish(get_notification_channel(notification.user_id), json.dumps(serialize_notification(notification)))
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.error(f"Redis Notification Publish Error: {e}")
+
+'''
+Fans the notification channels out to the streams open in this process. It holds ONE Redis pub/sub connection (pattern subscription to every user's channel),
+read by a daemon listener thread that puts each message on the queues of that user's local subscribers. An idle stream costs one queue and no Redis connection or DB session.
+A slow client whose queue is full loses messages (it still finds them in the list). The listener is restarted lazily, ex. in a worker forked after it was started
+'''
+class NotificationHub:
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._thread = None
+
+    def subscribe(self, user_id):
+        subscriber = queue.Queue(maxsize=Constants.SSE_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(str(user_id), set()).add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name="notification-hub", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(str(user_id))
+            if subscribers is None:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[str(user_id)]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def dispatch(self, user_id, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(user_id), ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(data)
+            except queue.Full:
+                pass
+
+    def _listen(self):
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(get_notification_channel("*"))
+                for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self.dispatch(message["channel"].rsplit(":", 1)[1], message["data"])
+            except Exception as e:
+                logger.error(f"Notification hub listener error, reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+notification_hub = NotificationHub(redis_client)
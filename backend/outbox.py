@@ -0,0 +1,116 @@
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from backend.extensions import db
+from backend.models.outbox import OutboxMessage
+from backend import metrics
+from datetime import datetime, timezone
+from sqlalchemy import event, func, update
+
+'''
+Input: task: <Celery_Task>, **kwargs: JSON serializable task arguments
+Action: Queues a background task from request code. With OUTBOX_ENABLED the task is only written to the Outbox table in the current session, so it is committed
+        (or rolled back) together with the change that caused it and the request makes no broker round trip - relay_outbox publishes it afterwards.
+        Without the outbox the task is kept on the session and sent to the broker (.delay) right after the commit, a rollback (or closing the session without a commit) drops it. Call it before db.session.commit()
+Output: None
+'''
+def enqueue_task(task, **kwargs):
+    if not current_app.config["OUTBOX_ENABLED"]:
+        if not db.session.in_transaction():
+            db.session.begin()
+        db.session.info.setdefault("pending_tasks", []).append((task, kwargs))
+        return
+    db.session.add(OutboxMessage(task_name=task.name, kwargs=kwargs))
+
+@event.listens_for(Session, "after_commit")
+def _send_pending_tasks(session):
+    for task, kwargs in session.info.pop("pending_tasks", []):
+        try:
+            task.delay(**kwargs)
+        except Exception as e:
+            current_app.logger.error(f"ERROR: enqueue_task, sending {task.name} after commit failed: {e}")
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_pending_tasks(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("pending_tasks", None)
+
+'''
+Input: batch_size: <int>, max_batches: <int>
+Action: Publishes pending Outbox messages to Celery in insertion order, batch_size rows per transaction. Rows are claimed with FOR UPDATE SKIP LOCKED, so several relays can run at once.
+        A message is marked published after the broker accepted it (at-least-once delivery: a crash in between publishes it again). On a broker error the message keeps its place,
+        its attempts/last_error are updated and the run stops. Reports "outbox_published", "outbox_publish_errors", the "outbox_relay_lag" observation (commit -> publish) and the backlog gauges
+Output: <int:published_count>
+'''
+def relay_outbox(batch_size, max_batches):
+    celery_app = current_app.extensions["celery"]
+    published = 0
+
+    for _ in range(max_batches):
+        messages = OutboxMessage.query.filter(
+            OutboxMessage.published_at.is_(None)
+        ).order_by(OutboxMessage.outbox_id).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not messages:
+            break
+
+        failed = False
+        batch_published = 0
+        for message in messages:
+            try:
+                celery_app.send_task(message.task_name, kwargs=message.kwargs)
+            except Exception as e:
+                message.attempts += 1
+                message.last_error = str(e)[:500]
+                metrics.incr("outbox_publish_errors")
+                current_app.logger.error(f"ERROR: relay_outbox, publishing message {message.outbox_id} ({message.task_name}) failed: {e}")
+                failed = True
+                break
+
+            now = datetime.now(timezone.utc)
+            message.published_at = now
+            metrics.observe("outbox_relay_lag", (now - message.created_at).total_seconds())
+            batch_published += 1
+
+        db.session.commit()
+        metrics.incr("outbox_published", batch_published)
+        published += batch_published
+
+        if failed or len(messages) < batch_size:
+            break
+
+    report_outbox_backlog()
+    return published
+
+'''
+Input: None
+Action: Sets the "outbox_pending" (messages waiting) and "outbox_oldest_pending_age" (seconds) gauges
+Output: tuple (<int:pending>, <float:oldest_pending_age>)
+'''
+def report_outbox_backlog():
+    pending, oldest = db.session.query(
+        func.count(OutboxMessage.outbox_id), func.min(OutboxMessage.created_at)
+    ).filter(OutboxMessage.published_at.is_(None)).one()
+    db.session.commit()
+
+    age = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest else 0.0
+    metrics.set_gauge("outbox_pending", pending)
+    metrics.set_gauge("outbox_oldest_pending_age", age)
+    return pending, age
+
+'''
+Input: since: <datetime>, until: <datetime> (optional), task_name: <str> (optional)
+Action: Marks already published messages created in [since, until) as pending again, so the relay publishes them once more (ex. after the broker lost its queue)
+Output: <int:replayed_count>
+'''
+def replay_outbox(since, until=None, task_name=None):
+    statement = update(OutboxMessage).where(
+        OutboxMessage.published_at.is_not(None),
+        OutboxMessage.created_at >= since
+    ).values(published_at=None, attempts=0, last_error=None)
+    if until is not None:
+        statement = statement.where(OutboxMessage.created_at < until)
+    if task_name:
+        statement = statement.where(OutboxMessage.task_name == task_name)
+
+    result = db.session.execute(statement)
+    db.session.commit()
+    return result.rowcount
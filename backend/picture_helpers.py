@@ -1,37 +1,224 @@
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import uuid
+import re
 import io
-from PIL import Image
+import os
+import time
+import resource
+from PIL import Image, ImageOps, ExifTags
 from flask import current_app
 import magic
 from backend.constants import Constants
+from backend.aws_clients import get_client
+from backend.extensions import redis_blob_client
+from backend.image_objects import get_content_hash, find_image_object, register_image_object
+from backend import metrics
 
 '''
 Input: permission: <str> ("read" or "upload")
-Action: Initializes boto3 client with defined keys based on required permissions
+Action: Returns the process-wide R2 (S3 API) client with the keys of the required permission (see aws_clients.get_client)
 Output: boto3.client object
 '''
 def get_r2_client(permission="read"):
-    if permission == "upload":
-        access_key = current_app.config["CF_R2_ACCESS_KEY_ID_UPLOAD"]
-        secret_key = current_app.config["CF_R2_SECRET_ACCESS_KEY_UPLOAD"]
-    else:
-        access_key = current_app.config["CF_R2_ACCESS_KEY_ID_READ"]
-        secret_key = current_app.config["CF_R2_SECRET_ACCESS_KEY_READ"]
-
-    return boto3.client(
-        "s3",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        endpoint_url=current_app.config["CF_R2_ENDPOINT_URL"],
-        region_name="auto"
-    )
+    return get_client("s3", permission)
+
+'''
+Input: None
+Action: Returns the process-wide AWS Rekognition client used for image moderation (see aws_clients.get_client)
+Output: boto3.client object
+'''
+def get_rekognition_client():
+    return get_client("rekognition")
+
+_pool_lock = threading.Lock()
+_image_pools = {}
+
+'''
+Input: kind: <str> ("cpu" or "io")
+Action: Returns the process-wide thread pool for image work, created on first use: "cpu" (IMAGE_CPU_WORKERS threads) decodes, resizes and encodes - Pillow releases the GIL there,
+        and the pool size caps how many images are decoded at once in the whole process (the encoded outputs stay in memory until they are uploaded); "io" (IMAGE_IO_WORKERS threads) uploads to R2
+Output: <ThreadPoolExecutor>
+'''
+def get_image_pool(kind):
+    pool = _image_pools.get(kind)
+    if pool is not None:
+        return pool
+
+    with _pool_lock:
+        pool = _image_pools.get(kind)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=current_app.config[f"IMAGE_{kind.upper()}_WORKERS"], thread_name_prefix=f"image-{kind}")
+            _image_pools[kind] = pool
+    return pool
+
+'''
+Input: None
+Action: Forgets the image pools in a forked child (their threads exist only in the parent), new ones are created on first use
+Output: None
+'''
+def reset_image_pools():
+    global _pool_lock, _image_pools
+    _pool_lock = threading.Lock()
+    _image_pools = {}
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_image_pools)
+
+'''
+Input: app: <Flask_Application_Object>, func: <callable>, *args
+Action: Runs func inside an app context, used for work submitted to the image pools (the helpers log and read the config through current_app)
+Output: result of func
+'''
+def run_in_app_context(app, func, *args):
+    with app.app_context():
+        return func(*args)
+
+'''
+Input: user_id: <uuid/str>
+Action: Generates a unique key in the staging bucket, owned by the user: "staging/<user_id>/<upload_id>"
+Output: <str:staging_key>
+'''
+def get_staging_key(user_id):
+    return f"{Constants.STAGING_KEY_PREFIX}{user_id}/{uuid.uuid4().hex}"
+
+'''
+Input: cloud_id: <str>
+Action: Checks if the picture key points to the staging bucket (the original file uploaded by the client, not processed yet)
+Output: <bool>
+'''
+def is_staging_key(cloud_id):
+    return isinstance(cloud_id, str) and cloud_id.startswith(Constants.STAGING_KEY_PREFIX)
+
+'''
+Input: cloud_id: <str>, user_id: <uuid/str>
+Action: Checks if the staging key was issued to the user by get_staging_key, so nobody can attach (and get processed) another user's upload
+Output: <bool>
+'''
+def is_own_staging_key(cloud_id, user_id):
+    return isinstance(cloud_id, str) and re.fullmatch(rf"{re.escape(Constants.STAGING_KEY_PREFIX)}{re.escape(str(user_id))}/[0-9a-f]{{32}}", cloud_id) is not None
+
+'''
+Input: user_id: <uuid/str>, count: <int>
+Action: Issues presigned PUT URLs into the staging bucket (signed locally, no request to R2). Each URL is valid for STAGING_UPLOAD_EXPIRES seconds and can write only its own key
+Output: list of dicts {"staging_key": <str>, "upload_url": <str>, "expires_in": <int>}
+'''
+def create_staging_uploads(user_id, count):
+    s3 = get_r2_client(permission="upload")
+    expires = current_app.config["STAGING_UPLOAD_EXPIRES"]
+    uploads = []
+    for _ in range(count):
+        staging_key = get_staging_key(user_id)
+        upload_url = s3.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": current_app.config["BUCKET_STAGING"], "Key": staging_key},
+            ExpiresIn=expires
+        )
+        uploads.append({"staging_key": staging_key, "upload_url": upload_url, "expires_in": expires})
+    return uploads
+
+'''
+Input: cloud_id: <str> (key of the main image), width: <int>, image_format: <str> ("webp" or "jpg")
+Action: Generates the key of a variant stored next to the main image: "<upload_id>/orig.jpg" -> "<upload_id>/w<width>.<format>"
+Output: <str:variant_key>
+'''
+def get_variant_key(cloud_id, width, image_format):
+    return f"{cloud_id.rsplit('/', 1)[0]}/w{width}.{image_format}"
+
+'''
+Input: cloud_id: <str>, image_type: <str> ("profile" or "event")
+Action: Builds the variant keys of an uploaded image, stored in Pictures.variants / User.profile_picture_variants. Images uploaded before variants existed ("<upload_id>.jpg") and staged uploads have none
+Output: <dict> {"<width>": {"webp": <str:key>, "jpg": <str:key>}} or None
+'''
+def get_variant_map(cloud_id, image_type="event"):
+    if not cloud_id or "/" not in cloud_id or is_staging_key(cloud_id):
+        return None
+    return {
+        str(width): {image_format: get_variant_key(cloud_id, width, image_format) for image_format in Constants.IMAGE_VARIANT_FORMATS}
+        for width in Constants.IMAGE_VARIANT_WIDTHS["profile" if image_type == "profile" else "event"]
+    }
+
+'''
+Input: variants: <dict> (as returned by get_variant_map) or None, r2_base_url: <str>
+Action: Converts the variant keys into the compact payload sent to the clients: one srcset string per format, the client picks the smallest image that fits
+Output: <dict> {"webp": "<url> 256w, <url> 640w, ...", "jpg": "..."} or None
+'''
+def get_variant_srcset(variants, r2_base_url):
+    if not variants:
+        return None
+    widths = sorted(variants, key=int)
+    return {
+        image_format: ", ".join(f"{r2_base_url}/{variants[width][image_format]} {width}w" for width in widths)
+        for image_format in Constants.IMAGE_VARIANT_FORMATS
+    }
+
+'''
+Input: img: <PIL.Image> (decoded)
+Action: Computes the difference hash (dHash) of the picture: 64 bits comparing neighbouring pixels of a 9x8 grayscale thumbnail. Re-encoded and resized copies get the same hash
+Output: <str:perceptual_hash> (16 hex digits)
+'''
+def get_perceptual_hash(img):
+    pixels = list(img.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+'''
+Input: img: <PIL.Image> (processed main image, RGB or L), image_type: <str>, quality: <int>
+Action: Renders the IMAGE_VARIANT_WIDTHS of the image type in every IMAGE_VARIANT_FORMATS format, from the largest width down (each one resized from the previous one).
+        Widths above the image width reuse the image as it is, so every variant key always exists
+Output: list of tuples (<int:width>, <str:format>, <BytesIO>)
+'''
+def render_variants(img, image_type, quality):
+    variants = []
+    source = img
+    for width in sorted(Constants.IMAGE_VARIANT_WIDTHS["profile" if image_type == "profile" else "event"], reverse=True):
+        if width < source.width:
+            source = source.resize((width, max(1, round(source.height * width / source.width))), Image.Resampling.LANCZOS)
+        for image_format in Constants.IMAGE_VARIANT_FORMATS:
+            output = io.BytesIO()
+            if image_format == "webp":
+                source.save(output, format="WEBP", quality=quality, method=4)
+            else:
+                source.save(output, format="JPEG", quality=quality, optimize=True)
+            output.seek(0)
+            variants.append((width, image_format, output))
+    return variants
+
+'''
+Input: img: <PIL.Image> (opened, not decoded)
+Action: Reads the EXIF orientation tag from the already parsed header
+Output: <int:orientation> (1 = upright when missing or unreadable)
+'''
+def get_exif_orientation(img):
+    try:
+        return img.getexif().get(ExifTags.Base.Orientation, 1)
+    except Exception:
+        return 1
+
+'''
+Input: seconds: <float>, decoded_bytes: <int>, working_bytes: <int>
+Action: Reports the processing of one image: "image_process_seconds", "image_decoded_bytes" and "image_working_bytes" observations. Both sizes are computed from the bitmaps of this image,
+        so they stay correct when the pool processes several images at once (Pillow allocates bitmaps outside the Python allocator, tracemalloc would not see them).
+        "process_peak_rss_bytes" is only a gauge of the whole process (ru_maxrss is shared by every pool thread)
+Output: None
+'''
+def record_image_metrics(seconds, decoded_bytes, working_bytes):
+    metrics.observe("image_process_seconds", seconds)
+    metrics.observe("image_decoded_bytes", decoded_bytes)
+    metrics.observe("image_working_bytes", working_bytes)
+    metrics.set_gauge("process_peak_rss_bytes", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024) # ru_maxrss is in KB on Linux
 
 '''
 Input: file: <FileStorage>, image_type: <str> ("profile" or "event")
 Action: Uses python-magic to verify the actual file signature (MIME type). Checks if the file size is within limits. 
-        Converts the image to RGB, applies resizing (thumbnail) and compression (JPEG) using Pillow.
-Output: tuple (<BytesIO:processed_data> or None, <str:error_message> or None)
+        Rejects images above MAX_IMAGE_PIXELS from the header alone (decompression bombs are never decoded). The image is decoded only as large as the target needs:
+        JPEG with draft() (DCT scaling by 1/2, 1/4 or 1/8), other formats are reduced by an integer factor before the LANCZOS resample (reducing_gap).
+        The EXIF orientation is applied to the small image, then it is converted to RGB and compressed (JPEG) using Pillow, together with the smaller variants (render_variants).
+        Time, decoded bitmap size and working memory (decoded + resized bitmap + encoded outputs) are reported per image
+Output: tuple (<dict:processed_data> {"image": <BytesIO>, "variants": [(<int:width>, <str:format>, <BytesIO>)], "perceptual_hash": <str>} or None, <str:error_message> or None)
 '''
 def validate_and_process_image(file, image_type="event"):
     
@@ -55,51 +242,141 @@ def validate_and_process_image(file, image_type="event"):
     if size > max_size:
         current_app.logger.warning(f"WARNING: validate_and_process_image, someone tried to upload a file that is too big: {size}")
         return None, f"File too big ({max_size // (1024 * 1024)}MB), max size is {max_size // (1024*1024)}MB."
-    
+
+    # Rozmiary zależne od typu
+    if image_type == "profile":
+        target_size = (400, 400)
+        quality = 75
+    else:
+        target_size = (1920, 1080)
+        quality = 85
+
+    started = time.perf_counter()
     try:
-        img = Image.open(file)
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
+        img = Image.open(file) # parses the header only
+        width, height = img.size
+        if width * height > Constants.MAX_IMAGE_PIXELS:
+            current_app.logger.warning(f"WARNING: validate_and_process_image, someone tried to upload an image with too many pixels: {width}x{height}")
+            return None, f"Image too large ({width}x{height}), max {Constants.MAX_IMAGE_PIXELS // 1000000} megapixels."
 
-        # Rozmiary zależne od typu
-        if image_type == "profile":
-            target_size = (400, 400)
-            quality = 75
-        else:
-            target_size = (1920, 1080)
-            quality = 85
+        # the box is given in stored orientation, rotated images (EXIF 5-8) are transposed at the end
+        box = target_size[::-1] if get_exif_orientation(img) in (5, 6, 7, 8) else target_size
+        if img.format == "JPEG":
+            img.draft("RGB", box)
+        elif img.mode == "P":
+            img = img.convert("RGBA") # palette images would be resampled with NEAREST
+        decoded_bytes = img.size[0] * img.size[1] * len(img.getbands())
 
-        img.thumbnail(target_size, Image.Resampling.LANCZOS)
+        img.thumbnail(box, Image.Resampling.LANCZOS, reducing_gap=Constants.IMAGE_REDUCING_GAP)
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
         
         output = io.BytesIO()
         img.save(output, format="JPEG", quality=quality, optimize=True)
         output.seek(0)
-        return output, None
+        variants = render_variants(img, image_type, quality)
+        perceptual_hash = get_perceptual_hash(img)
     except Exception as e:
         return None, str(e)
 
+    elapsed = time.perf_counter() - started
+    encoded_bytes = output.getbuffer().nbytes + sum(variant.getbuffer().nbytes for _, _, variant in variants)
+    working_bytes = decoded_bytes + img.size[0] * img.size[1] * len(img.getbands()) + encoded_bytes
+    record_image_metrics(elapsed, decoded_bytes, working_bytes)
+    current_app.logger.info(
+        f"INFO: validate_and_process_image, {width}x{height} {mime} -> {img.size[0]}x{img.size[1]} in {elapsed:.3f}s, "
+        f"decoded {decoded_bytes / 1048576:.1f} MB, working set {working_bytes / 1048576:.1f} MB"
+    )
+    return {"image": output, "variants": variants, "perceptual_hash": perceptual_hash}, None
+
+'''
+Input: cloud_id: <str>
+Action: Generates the Redis key of the spooled image using the format "image-spool:v1:<cloud_id>".
+Output: <str:spool_key>
+'''
+def get_image_spool_key(cloud_id):
+    return f"image-spool:v1:{cloud_id}"
+
 '''
-Input: file_data: <BytesIO>, folder: <str>
-Action: Connects to R2 Cloudflare using boto3, generates a unique filename with UUID, and uploads the binary stream.
-Output: <str:s3_key> (the unique path to the file) or None on failure.
+Input: cloud_id: <str>, data: <BytesIO> (processed image)
+Action: Keeps the bytes just uploaded in Redis for IMAGE_SPOOL_TTL seconds, so the moderation task gets them without downloading the object back from R2.
+        Images above IMAGE_SPOOL_MAX_BYTES are not spooled
+Output: None (Logs error if Redis fails, the moderation task falls back to R2).
+'''
+def spool_image(cloud_id, data):
+    if data.getbuffer().nbytes > Constants.IMAGE_SPOOL_MAX_BYTES:
+        return
+    try:
+        redis_blob_client.setex(get_image_spool_key(cloud_id), Constants.IMAGE_SPOOL_TTL, data.getvalue())
+    except Exception as e:
+        current_app.logger.error(f"Redis Image Spool Set Error: {e}")
+
+'''
+Input: cloud_id: <str>
+Action: Takes the spooled bytes of the image out of Redis (GET and DEL in one transaction, the bytes are moderated once)
+Output: <bytes> or None (not spooled, expired or Redis unavailable)
+'''
+def pop_spooled_image(cloud_id):
+    try:
+        pipe = redis_blob_client.pipeline(transaction=True)
+        pipe.get(get_image_spool_key(cloud_id))
+        pipe.delete(get_image_spool_key(cloud_id))
+        return pipe.execute()[0]
+    except Exception as e:
+        current_app.logger.error(f"Redis Image Spool Get Error: {e}")
+        return None
+
+'''
+Input: file_data: <dict> (processed_data from validate_and_process_image), image_type: <str> ("profile" or "event")
+Action: Looks up the content hash of the processed image first: an identical upload (same file sent again, same poster from another organiser) reuses the stored object and nothing is uploaded.
+        Otherwise connects to R2 Cloudflare using boto3, generates a unique upload ID with UUID, uploads the main image ("<upload_id>/orig.jpg") and its variants ("<upload_id>/w<width>.<format>")
+        and registers the object (ImageObject). Keys are never reused, so every object is sent with a long-lived immutable Cache-Control. If one of the uploads fails, the objects already uploaded are removed.
+        The processed bytes of a new object are spooled for the moderation task (spool_image)
+Output: <str:s3_key> (the unique path to the main image) or None on failure.
 '''
 def upload_to_r2(file_data, image_type="event"):
+    content_hash = get_content_hash(file_data["image"])
+    existing = find_image_object(image_type, content_hash)
+    if existing:
+        metrics.incr("image_dedup_hits")
+        return existing
+
     s3 = get_r2_client(permission="upload")
 
     bucket_name = (
         current_app.config["BUCKET_PROFILES"] if image_type == "profile" else current_app.config["BUCKET_EVENTS"]
     )
     
-    filename = f"{uuid.uuid4().hex}.jpg"
-    
+    filename = f"{uuid.uuid4().hex}/orig.jpg"
+    objects = [(filename, "image/jpeg", file_data["image"])] + [
+        (get_variant_key(filename, width, image_format), "image/webp" if image_format == "webp" else "image/jpeg", data)
+        for width, image_format, data in file_data["variants"]
+    ]
+
+    uploaded = []
     try:
-        s3.upload_fileobj(
-            file_data,
-            bucket_name,
-            filename,
-            ExtraArgs={"ContentType": "image/jpeg"}
-        )
-        return filename 
+        for key, content_type, data in objects:
+            s3.upload_fileobj(
+                data,
+                bucket_name,
+                key,
+                ExtraArgs={"ContentType": content_type, "CacheControl": Constants.IMAGE_CACHE_CONTROL}
+            )
+            uploaded.append(key)
+
+        registered = register_image_object(filename, image_type, content_hash, file_data.get("perceptual_hash"))
+        if registered != filename: #the same content was uploaded at the same time, the other copy is kept
+            s3.delete_objects(Bucket=bucket_name, Delete={"Objects": [{"Key": key} for key in uploaded], "Quiet": True})
+            metrics.incr("image_dedup_hits")
+        else:
+            spool_image(filename, file_data["image"])
+        return registered
     except Exception as e:
         current_app.logger.error(f"R2 Upload Error: {e}")
+        if uploaded:
+            try:
+                s3.delete_objects(Bucket=bucket_name, Delete={"Objects": [{"Key": key} for key in uploaded], "Quiet": True})
+            except Exception as cleanup_error:
+                current_app.logger.error(f"R2 Upload Cleanup Error: {cleanup_error}")
         return None
@@ -9,6 +9,7 @@ from .comment_routes import comments_bp
 from .email_routes import email_bp
 from .picture_routes import pictures_bp
 from .notification_routes import notifications_bp
+from .metrics_routes import metrics_bp
 from . import tokens
 
 __all__ = [
@@ -23,7 +24,8 @@ __all__ = [
     "comments_bp",
     "email_bp",
     "pictures_bp",
-    "notifications_bp"
+    "notifications_bp",
+    "metrics_bp"
 ]
 
 def register_blueprints(app):
@@ -37,4 +39,5 @@ def register_blueprints(app):
     app.register_blueprint(comments_bp)
     app.register_blueprint(email_bp)
     app.register_blueprint(pictures_bp)
-    app.register_blueprint(notifications_bp)
\ No newline at end of file
+    app.register_blueprint(notifications_bp)
+    app.register_blueprint(metrics_bp)
\ No newline at end of file
@@ -5,7 +5,7 @@ from backend.extensions import db, mail, limiter
 from backend.constants import Constants
 from backend.responses import ResponseTypes, make_api_response
 from flask_jwt_extended import jwt_required, create_access_token, create_refresh_token, get_jwt, get_jwt_identity, decode_token
-from backend.helpers import add_token_to_db, revoke_token, sanitize_input
+from backend.helpers import add_token_to_db, revoke_token, revoke_unpersisted_token, create_token_pair, sanitize_input
 from backend.tasks import send_email_async
 import re
 from flask_mail import Message
@@ -87,7 +87,7 @@ def register_user():
 
 '''
 Input: JSON { "username": <str>, "password": <str> }
-Action: Verifies credentials and account confirmation status. Generates JWT Access and Refresh tokens and stores them in the blocklist database as "active"
+Action: Verifies credentials and account confirmation status. Generates JWT Access and Refresh tokens and stores them in the blocklist database as "active" in one transaction (in token epoch mode only the Refresh token is stored)
 Data sent to the frontend: {"user": {"username": <str>}, "access_token": <jwt>, "refresh_token": <jwt>, "message": "Login successful"}
 Output: 200 OK (or 400/401/403 on error)
 '''
@@ -121,11 +121,7 @@ def login_user():
     
     limiter.reset()
 
-    access_token = create_access_token(identity=user.user_id)
-    refresh_token = create_refresh_token(identity=user.user_id)
-    
-    add_token_to_db(access_token)
-    add_token_to_db(refresh_token)
+    access_token, refresh_token = create_token_pair(user.user_id, epoch=user.token_epoch)
 
     current_app.logger.info(f"INFO: /login, login correct for user_id: {user.user_id}")
     return make_api_response(ResponseTypes.LOGIN_SUCCESS, data={
@@ -136,7 +132,7 @@ def login_user():
 
 '''
 Input: Header { "Authorization": "Bearer <Refresh_Token>" }
-Action: Revokes the used Refresh Token and generates new pair of tokens (Access + Refresh)
+Action: Revokes the used Refresh Token and generates new pair of tokens (Access + Refresh) in a single transaction
 Data sent to the frontend: {"access_token": <jwt>, "refresh_token": <jwt>, "message": "Operation successful"}
 Output: 200 OK
 '''
@@ -146,13 +142,7 @@ def refresh():
     identity = get_jwt_identity()
     jti = get_jwt()["jti"]
 
-    revoke_token(jti, identity)
-
-    new_access_token = create_access_token(identity=identity)
-    new_refresh_token = create_refresh_token(identity=identity)
-
-    add_token_to_db(new_access_token)
-    add_token_to_db(new_refresh_token)
+    new_access_token, new_refresh_token = create_token_pair(identity, revoked_refresh_jti=jti)
     
     current_app.logger.info(f"INFO: /refresh, token refreshed for user_id: {identity}")
     return make_api_response(ResponseTypes.SUCCESS, data={
@@ -162,9 +152,9 @@ def refresh():
 
 '''
 Input: Header { "Authorization": "Bearer <Refresh_Token>" }, JSON { "access_token": <jwt> } (optional)
-Action: Revokes the refresh token and the provided access token to terminate the session.
-Data sent to the frontend: {"message": "Logged out successfully"}
-Output: 200 OK
+Action: Revokes the refresh token and the provided access token to terminate the session. An epoch access token is revoked only by its Redis marker, if the marker cannot be stored the client is told the access token is still valid
+Data sent to the frontend: {"message": "Logged out successfully"} or {"message": "Could not revoke access token"}
+Output: 200 OK or 500 Internal Server Error
 '''
 @auth_bp.route("/logout", methods=["DELETE"])
 @jwt_required(refresh=True)
@@ -176,33 +166,45 @@ def logout():
     data = request.get_json(silent=True)
     access_token = data.get("access_token") if data else None
 
+    access_revoked = True
     if access_token:
         try:
             access_payload = decode_token(access_token, allow_expired=True)
             if access_payload["sub"] == user_id:
-                access_jti = access_payload["jti"]
-                revoke_token(access_jti, user_id)
+                if "epoch" in access_payload:
+                    access_revoked = revoke_unpersisted_token(access_payload)
+                else:
+                    revoke_token(access_payload["jti"], user_id)
         except Exception as e:
             current_app.logger.warning(f"ERROR: /logout, Exception occured:")
             current_app.logger.exception(e, stack_info=True)
             pass
+    if not access_revoked:
+        current_app.logger.error(f"ERROR: /logout, could not store the access token revocation for user_id: {user_id}")
+        return make_api_response(ResponseTypes.SERVER_ERROR, message="Could not revoke access token")
     current_app.logger.info(f"INFO: /logout, success in logging out user_id: {user_id}")
     return make_api_response(ResponseTypes.LOGOUT_SUCCESS)
 
 '''
 Input: Header { "Authorization": "Bearer <Access_Token>" }
 Action: Extracts the JTI (unique JWT ID) from the currently used Access Token and updates its status in the TokenBlocklist database table to "revoked". This immediately invalidates the token for any further requests.
-Data sent to the frontend: {"message": "Access token revoked"}
-Output: 200 OK
+        Epoch access tokens are revoked by a Redis marker instead, if it cannot be stored the token stays valid and an error is returned
+Data sent to the frontend: {"message": "Access token revoked"} or {"message": "Could not revoke access token"}
+Output: 200 OK or 500 Internal Server Error
 '''
 @auth_bp.route("/revoke_access", methods=["DELETE"])
 @jwt_required()
 def revoke_access_token():
-    jti = get_jwt()["jti"]
+    jwt_payload = get_jwt()
     user_id = get_jwt_identity()
-    revoked = revoke_token(jti, user_id)
-    if not revoked:
-        pass
+    if "epoch" in jwt_payload:
+        if not revoke_unpersisted_token(jwt_payload):
+            current_app.logger.error(f"ERROR: /revoke_access, could not store the access token revocation for user_id: {user_id}")
+            return make_api_response(ResponseTypes.SERVER_ERROR, message="Could not revoke access token")
+    else:
+        revoked = revoke_token(jwt_payload["jti"], user_id)
+        if not revoked:
+            pass
     current_app.logger.info(f"INFO: /revoke_access, access token revoked for user_id: {user_id}")
     return make_api_response(ResponseTypes.TOKEN_REVOKED, message="Access token revoked")
 
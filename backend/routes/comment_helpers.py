@@ -0,0 +1,162 @@
+from backend.extensions import db
+from backend.helpers import validate_uuid
+from backend.constants import Constants
+from backend.models import Comment
+from sqlalchemy import select, exists, func, literal, cast, true, tuple_
+from sqlalchemy.orm import aliased, joinedload
+from datetime import datetime
+import json
+import base64
+import binascii
+
+'''
+Input: created_at: <datetime>, comment_id: <uuid>
+Action: Builds the opaque cursor pointing after the given thread: urlsafe base64 of {"k": created_at, "id": comment_id}
+Output: <str:cursor>
+'''
+def encode_comment_cursor(created_at, comment_id):
+    raw = json.dumps({"k": created_at.isoformat(), "id": str(comment_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+'''
+Input: cursor: <str>
+Action: Decodes and validates a cursor made by encode_comment_cursor
+Output: tuple (<datetime:created_at>, <uuid:comment_id>) or None if the cursor is invalid
+'''
+def decode_comment_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        comment_id = validate_uuid(data["id"])
+        if comment_id is None:
+            return None
+        return datetime.fromisoformat(data["k"]), comment_id
+    except (ValueError, TypeError, KeyError, UnicodeError, binascii.Error):
+        return None
+
+'''
+Input: args: <request.args>
+Action: Reads and clamps the thread page parameters: limit (threads per page), reply_depth (levels of replies, 0 = threads only) and reply_limit (replies shown per comment, at least 1), and decodes the cursor
+Output: tuple (<tuple:cursor> or None, <int:limit>, <int:reply_depth>, <int:reply_limit>) or None if the cursor is invalid
+'''
+def get_thread_page_args(args):
+    limit = args.get("limit", default=Constants.PAGINATION_DEFAULT_LIMIT, type=int)
+    reply_depth = args.get("reply_depth", default=Constants.COMMENT_REPLY_DEPTH_DEFAULT, type=int)
+    reply_limit = args.get("reply_limit", default=Constants.COMMENT_REPLY_LIMIT_DEFAULT, type=int)
+
+    if limit < 1:
+        limit = Constants.PAGINATION_DEFAULT_LIMIT
+    limit = min(limit, Constants.MAX_PAGINATION_LIMIT)
+    reply_depth = min(max(reply_depth, 0), Constants.MAX_COMMENT_REPLY_DEPTH)
+    reply_limit = min(max(reply_limit, 1), Constants.MAX_PAGINATION_LIMIT)
+
+    cursor = args.get("cursor", default="", type=str)
+    decoded_cursor = None
+    if cursor:
+        decoded_cursor = decode_comment_cursor(cursor)
+        if decoded_cursor is None:
+            return None
+    return decoded_cursor, limit, reply_depth, reply_limit
+
+'''
+Input: comment: <Comment_Object> (with user loaded), replies: <list[dict]>, has_more_replies: <bool>
+Action: Serializes one node of the comment tree, the author name comes from the already loaded user (display_name handles deleted users)
+Output: <dict>
+'''
+def serialize_comment_node(comment, replies, has_more_replies):
+    data = comment.to_dict(replies=replies)
+    data["username"] = comment.user.display_name if comment.user else "[deleted]"
+    data["has_more_replies"] = has_more_replies
+    return data
+
+'''
+Input: event_id: <uuid>
+Action: Loads the whole discussion of an event in one query (authors joined in the same query) and assembles the tree in memory from a parent_comment_id -> children index.
+        A reply whose parent is not part of the event is shown as a top-level comment
+Output: <list[dict]> (top-level comments, oldest first, replies nested)
+'''
+def build_full_comment_tree(event_id):
+    comments = Comment.query.options(
+        joinedload(Comment.user)
+    ).filter(Comment.event_id == event_id).order_by(Comment.created_at.asc(), Comment.comment_id.asc()).all()
+
+    loaded_ids = {c.comment_id for c in comments}
+    children = {}
+    roots = []
+    for comment in comments:
+        if comment.parent_comment_id is None or comment.parent_comment_id not in loaded_ids:
+            roots.append(comment)
+        else:
+            children.setdefault(comment.parent_comment_id, []).append(comment)
+
+    def build(comment):
+        return serialize_comment_node(comment, [build(r) for r in children.get(comment.comment_id, [])], False)
+
+    return [build(c) for c in roots]
+
+'''
+Input: root_filter: <SQLAlchemy_Condition> (which comments are the threads: top-level comments of an event or replies of one comment), cursor: <tuple> or None (decoded),
+       limit: <int>, reply_depth: <int>, reply_limit: <int>
+Action: Returns one page of threads with a bounded part of their replies, in two queries:
+        1. keyset page of thread roots ordered by (created_at, comment_id), limit + 1 rows to know if there is a next page
+        2. recursive CTE walking down from those roots at most reply_depth levels, taking at most reply_limit + 1 oldest replies per comment (LATERAL ... LIMIT),
+           joined back to Comment with the authors and an EXISTS flag telling if the comment has any replies
+        The tree is assembled in memory. has_more_replies is set when replies were cut by reply_limit or reply_depth - the client loads them with /api/comments/replies/<comment_id>
+Output: tuple (<list[dict]:threads>, <bool:has_next>, <str:next_cursor> or None)
+'''
+def build_comment_threads_page(root_filter, cursor, limit, reply_depth, reply_limit):
+    query = Comment.query.with_entities(Comment.comment_id, Comment.created_at).filter(root_filter)
+    if cursor:
+        cursor_created_at, cursor_id = cursor
+        query = query.filter(tuple_(Comment.created_at, Comment.comment_id) > tuple_(
+            literal(cursor_created_at, Comment.created_at.type), literal(cursor_id, Comment.comment_id.type)
+        ))
+    roots = query.order_by(Comment.created_at.asc(), Comment.comment_id.asc()).limit(limit + 1).all()
+    has_next = len(roots) > limit
+    roots = roots[:limit]
+    next_cursor = encode_comment_cursor(roots[-1].created_at, roots[-1].comment_id) if has_next else None
+    if not roots:
+        return [], has_next, next_cursor
+
+    root_ids = [r.comment_id for r in roots]
+
+    tree = select(
+        Comment.comment_id,
+        literal(0).label("depth"),
+        cast(literal(1), db.BigInteger).label("position") # same type as row_number() in the recursive part
+    ).where(Comment.comment_id.in_(root_ids)).cte("comment_tree", recursive=True)
+
+    child = aliased(Comment)
+    replies = select(
+        child.comment_id,
+        func.row_number().over(order_by=(child.created_at, child.comment_id)).label("position")
+    ).where(child.parent_comment_id == tree.c.comment_id).order_by(
+        child.created_at, child.comment_id
+    ).limit(reply_limit + 1).lateral("replies")
+
+    tree = tree.union_all(
+        select(replies.c.comment_id, tree.c.depth + 1, replies.c.position)
+        .select_from(tree.join(replies, true()))
+        # the extra (reply_limit + 1) reply only marks has_more_replies, its own replies are not walked
+        .where(tree.c.depth < reply_depth, tree.c.position <= reply_limit)
+    )
+
+    reply = aliased(Comment)
+    has_replies = exists().where(reply.parent_comment_id == Comment.comment_id).label("has_replies")
+    rows = db.session.query(Comment, tree.c.depth, has_replies).join(
+        tree, tree.c.comment_id == Comment.comment_id
+    ).options(joinedload(Comment.user)).all()
+
+    by_id = {}
+    children = {}
+    for comment, depth, comment_has_replies in rows:
+        by_id[comment.comment_id] = (comment, depth, comment_has_replies)
+        if depth > 0:
+            children.setdefault(comment.parent_comment_id, []).append(comment)
+
+    def build(comment_id):
+        comment, depth, comment_has_replies = by_id[comment_id]
+        node_replies = sorted(children.get(comment_id, []), key=lambda c: (c.created_at, c.comment_id))
+        has_more = len(node_replies) > reply_limit or (depth == reply_depth and comment_has_replies)
+        return serialize_comment_node(comment, [build(r.comment_id) for r in node_replies[:reply_limit]], has_more)
+
+    return [build(root_id) for root_id in root_ids if root_id in by_id], has_next, next_cursor
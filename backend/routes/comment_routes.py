@@ -6,8 +6,9 @@ from backend.responses import ResponseTypes, make_api_response
 from flask_jwt_extended import jwt_required, get_current_user
 from backend.helpers import validate_uuid, sanitize_input, has_event_access,  get_event_cache_key, invalidate_event_cache, get_cached_event, cache_event_data
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import joinedload
 from backend.notifications.signals import event_new_comment, comment_reply_created
+from backend.db_routing import read_only_route
+from .comment_helpers import build_full_comment_tree, build_comment_threads_page, get_thread_page_args
 
 comments_bp = Blueprint("comments", __name__, url_prefix="/api/comments")
 
@@ -49,8 +50,6 @@ def create_comment(event_id):
         new_comment = Comment(user_id=user.user_id, event_id=event_id, content=comment_data["content"])
 
         db.session.add(new_comment)
-        db.session.commit()
-        invalidate_event_cache(str(event_id))
 
         event_new_comment.send(
             current_app._get_current_object(),
@@ -60,6 +59,9 @@ def create_comment(event_id):
             event_id=event.event_id,
             event_name=event.event_name
         )
+
+        db.session.commit()
+        invalidate_event_cache(str(event_id))
     except SQLAlchemyError as e:
         db.session.rollback()
         current_app.logger.error(f"ERROR: /create_comment, DB exception occured:")
@@ -118,8 +120,6 @@ def reply_to_comment(parent_comment_id):
             )
 
         db.session.add(new_comment)
-        db.session.commit()
-        invalidate_event_cache(str(parent_comment.event_id))
 
         comment_reply_created.send(
             current_app._get_current_object(),
@@ -129,6 +129,9 @@ def reply_to_comment(parent_comment_id):
             event_id=event.event_id,
             event_name=event.event_name
         )
+
+        db.session.commit()
+        invalidate_event_cache(str(parent_comment.event_id))
     except SQLAlchemyError as e:
         db.session.rollback()
         current_app.logger.error(f"ERROR: /reply_to_comment, DB exception occured:")
@@ -228,8 +231,12 @@ def edit_comment(comment_id):
     return make_api_response(ResponseTypes.SUCCESS, message="Comment edited successfully")
 
 '''
-Input: URL Parameter <uuid:event_id>, Header { "Authorization": "Bearer <Access_Token>" }
-Action: Verifies event existence and checks if the user has permission to view the event (for private events). Fetches all comments, maps user IDs to usernames (using display_name to handle deleted users), and builds a tree structure where replies are nested within their parent comments
+/api/comments/event/<event_id> (whole discussion)
+/api/comments/event/<event_id>?cursor=&limit=20&reply_depth=2&reply_limit=3 (thread pages - pass the returned next_cursor to get the next one)
+Input: URL Parameter <uuid:event_id>, Header { "Authorization": "Bearer <Access_Token>" }, Query Params (thread pages) { cursor=<str> & limit=<int> & reply_depth=<int> & reply_limit=<int> }
+Action: Verifies event existence and checks if the user has permission to view the event (for private events). Without the cursor parameter returns the whole comment tree,
+        built in memory from a single query (authors joined in, display_name handles deleted users). With it returns a page of top-level threads in (created_at, comment_id) order,
+        each with at most reply_limit replies per comment and reply_depth levels - has_more_replies marks comments whose remaining replies are loaded with /api/comments/replies/<comment_id>
 Data sent to the frontend: {
 "comments": [{
     "comment_id": <str>, 
@@ -239,12 +246,15 @@ Data sent to the frontend: {
     "deleted": <bool>, 
     "created_at": <iso_date>, 
     "parent_comment_id": <str>, 
+    "has_more_replies": <bool>,
     "replies": [...] }], 
+"pagination": {"limit": <int>, "has_next": <bool>, "next_cursor": <str> or null} (thread pages only),
 "message": "Comments list"}
 Output: 200 OK (or 400/403/404/500 on error)
 '''
 @comments_bp.route("/event/<event_id>", methods=["GET"])
 @jwt_required()
+@read_only_route
 def get_comments_list(event_id):
     user = get_current_user()
     e_uuid = validate_uuid(event_id)
@@ -261,29 +271,77 @@ def get_comments_list(event_id):
         return make_api_response(ResponseTypes.FORBIDDEN, message="You do not have access to this event")
 
     try:
-        comments = Comment.query.options(
-            joinedload(Comment.user)
-        ).filter_by(event_id=event_id).order_by(Comment.created_at.asc()).all()
+        if "cursor" not in request.args:
+            comments_tree = build_full_comment_tree(e_uuid)
+            if not comments_tree:
+                current_app.logger.info(f"INFO: /get_comment, no comments available in event {event_id}")
+                return make_api_response(ResponseTypes.SUCCESS, message="Empty comments list", data={"comments": []})
+
+            current_app.logger.info(f"INFO: /get_comment, comments in event {event_id} sent to frontend")
+            return make_api_response(ResponseTypes.SUCCESS, message="Comments list", data={"comments": comments_tree})
+
+        page_args = get_thread_page_args(request.args)
+        if page_args is None:
+            return make_api_response(ResponseTypes.BAD_REQUEST, message="Invalid cursor")
+        cursor, limit, reply_depth, reply_limit = page_args
+
+        threads, has_next, next_cursor = build_comment_threads_page(
+            (Comment.event_id == e_uuid) & (Comment.parent_comment_id.is_(None)),
+            cursor, limit, reply_depth, reply_limit
+        )
 
-        if not comments:
-            current_app.logger.info(f"INFO: /get_comment, no comments available in event {event_id}")
-            return make_api_response(ResponseTypes.SUCCESS, message="Empty comments list", data={"comments": []})
+        current_app.logger.info(f"INFO: /get_comment, page of {len(threads)} threads in event {event_id} sent to frontend")
+        return make_api_response(ResponseTypes.SUCCESS, message="Comments list" if threads else "Empty comments list", data={
+            "comments": threads,
+            "pagination": {"limit": limit, "has_next": has_next, "next_cursor": next_cursor}
+        })
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"ERROR: /get_comment, DB exception occured:")
+        current_app.logger.exception(e, stack_info=True)
+        return make_api_response(ResponseTypes.SERVER_ERROR)
 
-        top_level_comments = [c for c in comments if c.parent_comment_id is None]
+'''
+/api/comments/replies/<comment_id>?cursor=&limit=20&reply_depth=2&reply_limit=3
+Input: URL Parameter <uuid:comment_id>, Header { "Authorization": "Bearer <Access_Token>" }, Query Params { cursor=<str> & limit=<int> & reply_depth=<int> & reply_limit=<int> }
+Action: Loads more replies of a comment (has_more_replies in /api/comments/event/<event_id>): a page of its direct replies, oldest first, each with its own bounded replies.
+        Checks that the user has access to the comment's event
+Data sent to the frontend: {"comments": [<Comment_Node>], "pagination": {"limit": <int>, "has_next": <bool>, "next_cursor": <str> or null}, "message": "Replies list"}
+Output: 200 OK (or 400/403/404/500 on error)
+'''
+@comments_bp.route("/replies/<comment_id>", methods=["GET"])
+@jwt_required()
+@read_only_route
+def get_comment_replies(comment_id):
+    user = get_current_user()
+    c_uuid = validate_uuid(comment_id)
+    if not c_uuid:
+        return make_api_response(ResponseTypes.INVALID_DATA, message="Invalid comment ID")
 
-        def build_tree(comment_obj):
-            data = comment_obj.to_dict()
-            data["username"] = comment_obj.user.display_name if comment_obj.user else "[deleted]"
+    comment = db.session.get(Comment, c_uuid)
+    if not comment:
+        current_app.logger.warning(f"WARNING: /get_comment_replies, user: {user.user_id} tried to get replies of not existing comment {comment_id}")
+        return make_api_response(ResponseTypes.NOT_FOUND, message="Comment doesn't exist")
 
-            if comment_obj.replies:
-                data["replies"] = [build_tree(r) for r in comment_obj.replies]
-            return data 
-        
-        comments_tree = [build_tree(c) for c in top_level_comments]
+    if not has_event_access(user.user_id, comment.event):
+        current_app.logger.warning(f"WARNING: /get_comment_replies, user: {user.user_id} tried to get replies in event {comment.event_id} that is not visible to him")
+        return make_api_response(ResponseTypes.FORBIDDEN, message="You do not have access to this event")
 
-        current_app.logger.info(f"INFO: /get_comment, comments in event {event_id} sent to frontend")
-        return make_api_response(ResponseTypes.SUCCESS, message="Comments list", data={"comments": comments_tree})
+    page_args = get_thread_page_args(request.args)
+    if page_args is None:
+        return make_api_response(ResponseTypes.BAD_REQUEST, message="Invalid cursor")
+    cursor, limit, reply_depth, reply_limit = page_args
+
+    try:
+        replies, has_next, next_cursor = build_comment_threads_page(
+            Comment.parent_comment_id == c_uuid, cursor, limit, reply_depth, reply_limit
+        )
     except SQLAlchemyError as e:
-        current_app.logger.error(f"ERROR: /get_comment, DB exception occured:")
+        current_app.logger.error(f"ERROR: /get_comment_replies, DB exception occured:")
         current_app.logger.exception(e, stack_info=True)
         return make_api_response(ResponseTypes.SERVER_ERROR)
+
+    current_app.logger.info(f"INFO: /get_comment_replies, {len(replies)} replies of comment {comment_id} sent to user {user.user_id}")
+    return make_api_response(ResponseTypes.SUCCESS, message="Replies list", data={
+        "comments": replies,
+        "pagination": {"limit": limit, "has_next": has_next, "next_cursor": next_cursor}
+    })
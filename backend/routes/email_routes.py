@@ -4,7 +4,7 @@ from backend.extensions import db, mail, limiter
 from backend.constants import Constants
 from backend.responses import ResponseTypes, make_api_response
 from flask_jwt_extended import create_access_token, decode_token
-from backend.helpers import add_token_to_db, revoke_token, is_token_revoked, revoke_all_user_tokens
+from backend.helpers import add_token_to_db, revoke_token, is_token_revoked, revoke_all_user_tokens, invalidate_user_cache
 from backend.tasks import send_email_async
 import re
 from flask_mail import Message
@@ -82,6 +82,7 @@ def verify(token):
         revoke_token(decoded["jti"], user.user_id)
         revoke_all_user_tokens(user.user_id, token_type="email_verification")
         db.session.commit()
+        invalidate_user_cache(user.user_id)
 
         current_app.logger.info(f"INFO: /verify, user: {user_id} successfully verified their account")
         return make_api_response(ResponseTypes.SUCCESS, message="Verification succesful")
@@ -183,6 +184,7 @@ def reset_password(token):
     user.update_password(new_password)
     user.password_changed_at = datetime.now(timezone.utc)
     db.session.commit()
+    invalidate_user_cache(user.user_id)
 
     try:
         revoke_token(decoded["jti"], decoded["sub"])
@@ -224,6 +226,7 @@ def confirm_change(token):
         revoke_token(decoded["jti"], user.user_id)
         revoke_all_user_tokens(user.user_id, token_type="email_change")
         db.session.commit()
+        invalidate_user_cache(user.user_id)
 
         current_app.logger.info(f"INFO: /confirm_change, user: {user_id} changed their email")
         return make_api_response(ResponseTypes.SUCCESS, message="Email changed succesfully")
@@ -1,18 +1,20 @@
 from flask import Blueprint, request, current_app
 from backend.models.event import Event, Event_visibility, Event_participants, Invites
 from backend.models import User
-from backend.extensions import db, limiter, redis_client
+from backend.extensions import db, limiter
 from backend.constants import Constants
 from backend.responses import ResponseTypes, make_api_response
 from flask_jwt_extended import jwt_required, get_current_user
-from backend.helpers import validate_uuid, sanitize_input, get_event_cache_key, cache_event_data
+from backend.helpers import validate_uuid, sanitize_input, estimate_row_count, get_cached_events, cache_events_data
+from backend import metrics
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy import or_
-import json
-from .event_helpers import serialize_event_payload, get_friend_ids
+from sqlalchemy import or_, tuple_, literal
+from .event_helpers import serialize_event_payload, get_friend_ids, get_feed_sort_key, encode_feed_cursor, decode_feed_cursor, build_event_search
+from backend.db_routing import read_only_route
+from backend.picture_helpers import get_variant_srcset
 
 getters_bp = Blueprint("event_getters", __name__, url_prefix="/api/events")
 local_tz = ZoneInfo("Europe/Warsaw")
@@ -77,8 +79,12 @@ def get_event(event_id):
 
 '''
 /api/events/feed?page=1&limit=20&visibility=all&participation=all&created_window=all&sort_mode=default
-Input: Query Params { page=<int> & limit=<int> & q=<str> & visibility=all / public / private & participation=all/ joined / not_joined & sort_mode=default / members_desc / ... }
-Action: Returns a paginated list of events the user is permitted to see. Uses Redis for caching
+/api/events/feed?cursor=&limit=20&sort_mode=default&total=approx (cursor mode, first page - pass the returned next_cursor to get the next one)
+Input: Query Params { page=<int> & limit=<int> & q=<str> & visibility=all / public / private & participation=all/ joined / not_joined & sort_mode=default / members_desc / ... / relevance (only with q, page mode) }
+       q is a full-text search: prefix matching on name and description, plus typo tolerant matching on the name
+       In cursor mode (cursor=<str>, empty for the first page) page is ignored and total=approx adds the planner's row estimate
+Action: Returns a paginated list of events the user is permitted to see. The page is selected as ids only, then payloads are read from Redis with one MGET and only the misses are loaded (with creator and pictures) and written back in one pipeline.
+        Cursor mode uses keyset pagination on (sort column, event_id): no OFFSET and no COUNT(*), so deep pages cost the same as the first one
 Data sent to the frontend: {
     "data": [<Event_Objects>], 
     "pagination": {
@@ -86,11 +92,13 @@ Data sent to the frontend: {
         "pages": <int>, 
         "total": <int>, 
         "has_next": <bool>}}
-Output: 200 OK (or 500 on error)
+    cursor mode: "pagination": {"limit": <int>, "has_next": <bool>, "next_cursor": <str> or null, "total": <int> or null, "total_is_estimate": true}
+Output: 200 OK (or 400/500 on error)
 '''
 @getters_bp.route("/feed", methods=["GET"])
 @limiter.limit("600 per minute")
 @jwt_required()
+@read_only_route
 def feed():
     try:
         user = get_current_user()
@@ -126,10 +134,7 @@ def feed():
             Event_participants.user_id == user_id
         )
 
-        query = Event.query.options(
-            joinedload(Event.creator),
-            selectinload(Event.pictures)
-        ).filter(
+        query = Event.query.filter(
             or_(
                 Event.is_private == False,
                 Event.creator_id == user_id,
@@ -158,12 +163,12 @@ def feed():
                 query = query.filter(or_(*friend_conditions))
                 current_app.logger.info(f"INFO: /feed, user {user_id} filtered by friends_only={show_friends_only}, friends_attending={show_friends_attending}")
 
+        search_relevance = None
         if q:
-            search_filter = f"%{q}%"
-            query = query.filter(or_(
-                Event.event_name.ilike(search_filter),
-                Event.description.ilike(search_filter)
-            ))
+            search_filter, search_relevance = build_event_search(q)
+            query = query.filter(search_filter)
+            if search_relevance is not None:
+                search_relevance = search_relevance.label("relevance")
 
         if visibility == "public":
             query = query.filter(Event.is_private == False)
@@ -193,20 +198,86 @@ def feed():
             else:
                 query = query.filter(Event.created_at >= start_date)
 
-        if sort_mode == "members_asc": 
-            query = query.order_by(Event.participant_count.asc())
-        elif sort_mode == "members_desc": 
-            query = query.order_by(Event.participant_count.desc())
-        elif sort_mode == "comments_asc": 
-            query = query.order_by(Event.comment_count.asc())
-        elif sort_mode == "comments_desc": 
-            query = query.order_by(Event.comment_count.desc())
+        cursor = request.args.get("cursor", type=str)
+        if cursor is not None:
+            sort_mode, sort_key, descending = get_feed_sort_key(sort_mode)
+            sort_column = getattr(Event, sort_key)
+
+            if cursor:
+                decoded_cursor = decode_feed_cursor(cursor, sort_mode)
+                if decoded_cursor is None:
+                    return make_api_response(ResponseTypes.BAD_REQUEST, message="Invalid cursor")
+                cursor_value, cursor_id = decoded_cursor
+                position = tuple_(sort_column, Event.event_id)
+                boundary = tuple_(literal(cursor_value, sort_column.type), literal(cursor_id, Event.event_id.type))
+                query = query.filter(position < boundary if descending else position > boundary)
+
+            approx_total = estimate_row_count(query) if request.args.get("total") == "approx" else None
+
+            if descending:
+                query = query.order_by(sort_column.desc(), Event.event_id.desc())
+            else:
+                query = query.order_by(sort_column.asc(), Event.event_id.asc())
+
+            rows = query.with_entities(Event.event_id, Event.creator_id, sort_column).limit(limit + 1).all()
+            has_next = len(rows) > limit
+            rows = rows[:limit]
+            pagination_data = {
+                "limit": limit,
+                "has_next": has_next,
+                "next_cursor": encode_feed_cursor(sort_mode, getattr(rows[-1], sort_key), rows[-1].event_id) if has_next else None,
+                "total": approx_total,
+                "total_is_estimate": True
+            }
         else:
-            query = query.order_by(Event.date_and_time.asc())
-        
-        pagination = query.distinct().paginate(page=page, per_page=limit, error_out=False)
+            if sort_mode == "members_asc": 
+                query = query.order_by(Event.participant_count.asc())
+            elif sort_mode == "members_desc": 
+                query = query.order_by(Event.participant_count.desc())
+            elif sort_mode == "comments_asc": 
+                query = query.order_by(Event.comment_count.asc())
+            elif sort_mode == "comments_desc": 
+                query = query.order_by(Event.comment_count.desc())
+            elif sort_mode == "relevance" and search_relevance is not None:
+                query = query.order_by(search_relevance.desc(), Event.date_and_time.asc())
+            else:
+                query = query.order_by(Event.date_and_time.asc())
+            
+            entities = [Event.event_id, Event.creator_id, Event.date_and_time, Event.participant_count, Event.comment_count]
+            if sort_mode == "relevance" and search_relevance is not None:
+                entities.append(search_relevance) # DISTINCT needs the ORDER BY expression in the select list
+            pagination = query.with_entities(*entities).distinct().paginate(page=page, per_page=limit, error_out=False)
+            rows = pagination.items
+            pagination_data = {
+                "page": pagination.page,
+                "limit": limit,
+                "total": pagination.total,
+                "pages": pagination.pages,
+                "has_next": pagination.has_next
+            }
+
+        # phase 1 gave only the ordered ids, phase 2 hydrates the payloads: one MGET, ORM rows only for the misses, one pipelined write-back
+        event_ids = [str(row.event_id) for row in rows]
+        creator_ids = {str(row.event_id): str(row.creator_id) for row in rows}
+        events_data = get_cached_events(event_ids)
+        missing_ids = [eid for eid in event_ids if eid not in events_data]
+
+        if missing_ids:
+            missing_events = Event.query.options(
+                joinedload(Event.creator),
+                selectinload(Event.pictures)
+            ).filter(Event.event_id.in_(missing_ids)).all()
 
-        event_ids = [str(e.event_id) for e in pagination.items]
+            loaded_data = {}
+            for event in missing_events:
+                creator_lookup = {str(event.creator_id): event.creator}
+                loaded_data[str(event.event_id)] = serialize_event_payload(event, None, creator_lookup, set())
+            cache_events_data(loaded_data)
+            events_data.update(loaded_data)
+
+        cache_hits = len(event_ids) - len(missing_ids)
+        metrics.incr("feed_cache_hits", cache_hits)
+        metrics.incr("feed_cache_misses", len(missing_ids))
 
         if event_ids:
             part_query = db.select(Event_participants.event_id).filter(
@@ -220,33 +291,21 @@ def feed():
 
         final_event_list = []
 
-        for event in pagination.items:
-            eid_str = str(event.event_id)
-            cached_val = redis_client.get(get_event_cache_key(eid_str))
-
-            if cached_val:
-                event_data = json.loads(cached_val)
-            else:
-                creator_lookup = {str(event.creator_id): event.creator}
-                event_data = serialize_event_payload(event, None, creator_lookup, set())
-                cache_event_data(eid_str, event_data)
+        for eid_str in event_ids:
+            event_data = events_data.get(eid_str)
+            if event_data is None: # deleted between the two phases
+                continue
             
-            is_joined = (str(event.creator_id) == str(user_id)) or (eid_str in participating_event_ids)
+            is_joined = (creator_ids[eid_str] == str(user_id)) or (eid_str in participating_event_ids)
             event_data["is_participating"] = is_joined
             event_data["is_joined"] = is_joined
             
             final_event_list.append(event_data)
 
-        current_app.logger.info(f"INFO: /feed, user {user_id} successfully fetched events feed page {page}")
+        current_app.logger.info(f"INFO: /feed, user {user_id} successfully fetched events feed {'cursor page' if cursor is not None else f'page {page}'}, cache hits {cache_hits}/{len(event_ids)}")
         return make_api_response(ResponseTypes.SUCCESS, data={
             "data": final_event_list,
-            "pagination": {
-                "page": pagination.page,
-                "limit": limit,
-                "total": pagination.total,
-                "pages": pagination.pages,
-                "has_next": pagination.has_next
-            }
+            "pagination": pagination_data
         })
     except Exception as e:
         current_app.logger.error(f"ERROR: /feed, exception occured:")
@@ -261,6 +320,7 @@ Output: 200 OK (or 400/500 on error)
 '''
 @getters_bp.route("/<user_id>/creator", methods=["GET"])
 @jwt_required()
+@read_only_route
 def get_user_events_creator(user_id):
     u_uuid = validate_uuid(user_id)
     r2_base_url = current_app.config.get("R2_PUBLIC_URL", "").rstrip('/')
@@ -284,6 +344,7 @@ def get_user_events_creator(user_id):
                     {
                         "cloud_id": pic.cloud_id,
                         "url": f"{r2_base_url}/{pic.cloud_id}",
+                        "variants": get_variant_srcset(pic.variants, r2_base_url),
                         "status": pic.image_status
                     } 
                     for pic in event.pictures
@@ -310,6 +371,7 @@ Output: 200 OK (or 400/500 on error)
 '''
 @getters_bp.route("/<user_id>/participant", methods=["GET"])
 @jwt_required()
+@read_only_route
 def get_user_events_participand(user_id):
     u_uuid = validate_uuid(user_id)
 
@@ -337,6 +399,7 @@ def get_user_events_participand(user_id):
                     {
                         "cloud_id": pic.cloud_id,
                         "url": f"{r2_base_url}/{pic.cloud_id}",
+                        "variants": get_variant_srcset(pic.variants, r2_base_url),
                         "status": pic.image_status
                     } 
                     for pic in event.pictures
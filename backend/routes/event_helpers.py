@@ -1,14 +1,32 @@
 from flask import current_app
 from backend.constants import Constants
-from backend.helpers import sanitize_input
+from backend.helpers import sanitize_input, validate_uuid
+from backend.picture_helpers import get_variant_srcset
 import json
+import base64
+import binascii
+from datetime import datetime
 from zoneinfo import ZoneInfo
-from backend.models import Friendship
-from sqlalchemy import or_
+from backend.models import Friendship, Event
+from backend.models.event import SEARCH_CONFIG
+from sqlalchemy import or_, func, literal_column
+import re
 import math
 
 local_tz = ZoneInfo("Europe/Warsaw")
 
+SEARCH_WORD_PATTERN = re.compile(r"\w+")
+MAX_SEARCH_WORDS = 8
+
+# sort_mode -> (Event column used as the keyset, descending)
+FEED_SORT_KEYS = {
+    "default": ("date_and_time", False),
+    "members_asc": ("participant_count", False),
+    "members_desc": ("participant_count", True),
+    "comments_asc": ("comment_count", False),
+    "comments_desc": ("comment_count", True),
+}
+
 '''
 Input: raw_location: <str> / [<float:lng>, <float:lat>] / <json_str>
 Action: Standardizes location data. It checks if the input is a coordinate pair, a JSON string of coordinates, or a plain text name. It validates that coordinates are within geographical ranges and returns a formatted string like "[lng,lat]" or a sanitized string
@@ -122,6 +140,7 @@ def serialize_event_payload(event, user_id, creator_lookup, participating_event_
             {
                 "cloud_id": pic.cloud_id,
                 "url": f"{r2_base_url}/{pic.cloud_id}",
+                "variants": get_variant_srcset(pic.variants, r2_base_url),
                 "status": pic.image_status 
             }
             for pic in event.pictures
@@ -129,6 +148,7 @@ def serialize_event_payload(event, user_id, creator_lookup, participating_event_
         "creator_username": creator.display_name if creator else None,
         "creator_profile_picture": {
             "url": f"{r2_base_url}/{creator.profile_picture}" if creator and creator.profile_picture else None,
+            "variants": get_variant_srcset(creator.profile_picture_variants, r2_base_url) if creator else None,
             "status": creator.image_status if creator else None
         } if creator and creator.profile_picture else None,
         "creator_faculty": creator.faculty if creator else None,
@@ -177,4 +197,71 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     
-    return R_earth * c
\ No newline at end of file
+    return R_earth * c
+'''
+Input: sort_mode: <str>
+Action: Maps the feed sort_mode to the keyset column and direction (unknown modes fall back to "default", like the page based feed)
+Output: tuple (<str:normalized_sort_mode>, <str:column_name>, <bool:descending>)
+'''
+def get_feed_sort_key(sort_mode):
+    if sort_mode not in FEED_SORT_KEYS:
+        sort_mode = "default"
+    column_name, descending = FEED_SORT_KEYS[sort_mode]
+    return sort_mode, column_name, descending
+
+'''
+Input: sort_mode: <str>, sort_value: <datetime/int>, event_id: <uuid>
+Action: Builds the opaque cursor pointing after the given event: urlsafe base64 of {"s": sort_mode, "k": sort_value, "id": event_id}
+Output: <str:cursor>
+'''
+def encode_feed_cursor(sort_mode, sort_value, event_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps({"s": sort_mode, "k": sort_value, "id": str(event_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+'''
+Input: cursor: <str>, sort_mode: <str> (normalized, see get_feed_sort_key)
+Action: Decodes and validates a cursor made by encode_feed_cursor. A cursor made for another sort mode is rejected, because its key would point to a different position
+Output: tuple (<datetime/int:sort_value>, <uuid:event_id>) or None if the cursor is invalid
+'''
+def decode_feed_cursor(cursor, sort_mode):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if data["s"] != sort_mode:
+            return None
+        event_id = validate_uuid(data["id"])
+        if event_id is None:
+            return None
+        _, column_name, _ = get_feed_sort_key(sort_mode)
+        if column_name == "date_and_time":
+            sort_value = datetime.fromisoformat(data["k"])
+        else:
+            sort_value = int(data["k"])
+        return sort_value, event_id
+    except (ValueError, TypeError, KeyError, UnicodeError, binascii.Error):
+        return None
+
+'''
+Input: q: <str> (sanitized search text)
+Action: Builds the feed search condition. Every word of q becomes a prefix term ("krak" finds "Kraków") of a tsquery matched against Event.search_vector (GIN index),
+        OR-ed with a trigram word similarity on the event name (typo tolerance, trigram GIN index). Accents and case are ignored on both sides.
+        A query without any word characters falls back to the plain ILIKE filter
+Output: tuple (<SQLAlchemy_Expression:filter>, <SQLAlchemy_Expression:relevance> or None)
+'''
+def build_event_search(q):
+    words = SEARCH_WORD_PATTERN.findall(q.lower())[:MAX_SEARCH_WORDS]
+    if not words:
+        search_filter = f"%{q}%"
+        return or_(Event.event_name.ilike(search_filter), Event.description.ilike(search_filter)), None
+
+    ts_query = func.to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), " & ".join(f"{word}:*" for word in words))
+    search_text = func.immutable_unaccent(" ".join(words))
+    name_key = func.immutable_unaccent(func.lower(Event.event_name))
+
+    search_filter = or_(
+        Event.search_vector.op("@@")(ts_query),
+        search_text.op("<%")(name_key)
+    )
+    relevance = func.ts_rank_cd(Event.search_vector, ts_query) + func.word_similarity(search_text, name_key)
+    return search_filter, relevance
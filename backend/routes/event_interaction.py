@@ -93,7 +93,7 @@ def invite_to_event(event_id):
             status=InviteRequestStatus.pending
         )
         db.session.add(new_invite)
-        db.session.commit()
+        db.session.flush()
         
         invite_created.send(
             current_app._get_current_object(),
@@ -104,6 +104,7 @@ def invite_to_event(event_id):
             event_id=e_uuid,
             event_name=event.event_name
         )
+        db.session.commit()
         current_app.logger.info(f"INFO: /invite, user {u_uuid} invited user {i_uuid} to event {e_uuid}")
         
     except SQLAlchemyError as e:
@@ -281,10 +282,6 @@ def join_event(event_id):
         participant = Event_participants(event_id=e_uuid, user_id=user.user_id)
         db.session.add(participant)
         event.participant_count = Event.participant_count + 1
-        db.session.commit()
-        invalidate_event_cache(str(e_uuid))
-        db.session.refresh(event)
-        current_app.logger.info(f"INFO: /join, user {user.user_id} successfully joined event {event_id}")
 
         event_new_participant.send(
             current_app._get_current_object(),
@@ -295,6 +292,11 @@ def join_event(event_id):
             event_name=event.event_name
         )
 
+        db.session.commit()
+        invalidate_event_cache(str(e_uuid))
+        db.session.refresh(event)
+        current_app.logger.info(f"INFO: /join, user {user.user_id} successfully joined event {event_id}")
+
     except SQLAlchemyError as e:
         db.session.rollback()
         current_app.logger.error(f"ERROR: /join, DB exception occured:")
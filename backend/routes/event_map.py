@@ -14,6 +14,7 @@ from sqlalchemy import or_, and_, exists
 from sqlalchemy.orm import joinedload
 from .event_helpers import parse_location_coordinates, get_friend_ids, calculate_distance
 from zoneinfo import ZoneInfo
+from backend.db_routing import read_only_route
 
 map_bp = Blueprint("map", __name__, url_prefix="/api/events")
 local_tz = ZoneInfo("Europe/Warsaw")
@@ -65,6 +66,7 @@ Output: 200 OK (or 500 on error)
 @map_bp.route("/map", methods=["GET"])
 @limiter.limit("600 per minute")
 @jwt_required()
+@read_only_route
 def map_events():
     try:
         user = get_current_user()
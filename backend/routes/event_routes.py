@@ -4,7 +4,9 @@ from backend.models import User, Friendship
 from backend.extensions import db, limiter
 from backend.constants import Constants
 from backend.responses import ResponseTypes, make_api_response
-from backend.tasks import delete_from_r2_task, verify_event_image_task
+from backend.tasks import delete_from_r2_task, verify_event_image_task, process_staged_image_task
+from backend.picture_helpers import get_variant_map, is_staging_key, is_own_staging_key
+from backend.image_objects import acquire_image_refs
 from flask_jwt_extended import jwt_required, get_current_user
 from backend.helpers import validate_uuid, sanitize_input, invalidate_event_cache, cache_event_data
 from datetime import datetime, timezone
@@ -93,7 +95,7 @@ def create_event():
         return make_api_response(ResponseTypes.INVALID_DATA, message="Invalid date format. Use DD.MM.YYYY and HH:MM")
 
     # IMPORTANT: Before calling create/event endpoint frontend needs to call /upload and upload pictures to the cloud one by one
-    # or use /upload-batch to upload multiple pictures
+    # or use /upload-batch to upload multiple pictures, or get presigned URLs from /presign and send the staging keys
     # then frontend needs to send a list with picture data to /create or /edit
 
     pictures_data = event_data.get("pictures", [])
@@ -103,6 +105,10 @@ def create_event():
     if len(pictures_data) > Constants.MAX_PICTURES_COUNT:
         return make_api_response(ResponseTypes.BAD_REQUEST, message=f"Maximum of {Constants.MAX_PICTURES_COUNT} pictures allowed per event")
 
+    if any(is_staging_key(pic.get("cloud_id")) and not is_own_staging_key(pic.get("cloud_id"), user.user_id) for pic in pictures_data):
+        current_app.logger.warning(f"WARNING: /create_event, user {user.user_id} sent a staging key that is not theirs")
+        return make_api_response(ResponseTypes.BAD_REQUEST, message="Invalid staging key")
+
     try:
         new_event = Event(
             event_name=name,
@@ -116,21 +122,20 @@ def create_event():
         db.session.flush()
 
         pics_to_verify = []
-        for pic in pictures_data:
-            pub_id = pic.get("cloud_id")
+        pics_to_process = []
+        for pub_id in dict.fromkeys(pic.get("cloud_id") for pic in pictures_data):
             if pub_id:
+                staged = is_staging_key(pub_id)
                 new_picture = Pictures(
                     event_id=new_event.event_id,
                     cloud_id=pub_id,
-                    image_status="pending"
+                    variants=get_variant_map(pub_id, "event"),
+                    image_status="processing" if staged else "pending"
                 )
                 db.session.add(new_picture)
-                pics_to_verify.append(pub_id)
-
-        db.session.commit()
-
-        for pid in pics_to_verify:
-            verify_event_image_task.delay(pid)
+                (pics_to_process if staged else pics_to_verify).append(pub_id)
+        acquire_image_refs(pics_to_verify)
+        db.session.flush()
 
         creator_participant = Event_participants(event_id=new_event.event_id, user_id=user.user_id)
         db.session.add(creator_participant)
@@ -160,12 +165,7 @@ def create_event():
                 
                 valid_shared_ids.append(u_uuid)
 
-        db.session.commit() 
-        creator_lookup = {str(user.user_id): user}
-        ser_event_data = serialize_event_payload(new_event, user.user_id, creator_lookup, set())
-        cache_event_data(str(new_event.event_id), ser_event_data)
-        
-
+        # the event, its pictures and the queued notifications (outbox) are committed together below
         if new_event.is_private:
             if valid_shared_ids:
                 friend_new_private_event.send(
@@ -193,6 +193,18 @@ def create_event():
                     friend_ids=friend_ids
                 )
 
+        db.session.commit() 
+
+        # the tasks read the committed pictures
+        for pid in pics_to_verify:
+            verify_event_image_task.delay(pid)
+        for pid in pics_to_process:
+            process_staged_image_task.delay(pid, "event")
+
+        creator_lookup = {str(user.user_id): user}
+        ser_event_data = serialize_event_payload(new_event, user.user_id, creator_lookup, set())
+        cache_event_data(str(new_event.event_id), ser_event_data)
+
         current_app.logger.info(f"INFO: /create_event, user {user.user_id} created event {new_event.event_id}")
 
     except SQLAlchemyError as e:
@@ -236,12 +248,7 @@ def delete_event(event_id):
         participant_ids = [p.user_id for p in participants]
         event_name_cache = event.event_name
 
-        for picture in event.pictures:
-            delete_from_r2_task.delay(picture.cloud_id, image_type="event")
-
-        db.session.delete(event)
-        db.session.commit()
-        invalidate_event_cache(str(e_uuid))
+        pics_to_release = [picture.cloud_id for picture in event.pictures]
 
         if participant_ids:
             joined_event_deleted.send(
@@ -251,6 +258,12 @@ def delete_event(event_id):
                 participant_ids=participant_ids
             )
 
+        db.session.delete(event)
+        db.session.commit()
+        invalidate_event_cache(str(e_uuid))
+        for pid in pics_to_release:
+            delete_from_r2_task.delay(pid, image_type="event")
+
         current_app.logger.info(f"INFO: /delete_event, user {user.user_id} deleted event {event_id}")
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -378,6 +391,9 @@ def edit_event(event_id):
             current_app.logger.error(f"ERROR: /edit_event, user {user.user_id} tried to create event with invalid date format")
             return make_api_response(ResponseTypes.INVALID_DATA, message="Invalid date format. Use DD.MM.YYYY and HH:MM")
 
+    pics_to_verify = []
+    pics_to_process = []
+    pics_to_release = []
     raw_pictures = event_data.get("pictures", [])
     if raw_pictures is not None:
         if not isinstance(raw_pictures, list):
@@ -387,6 +403,9 @@ def edit_event(event_id):
         existing_ids = set(existing_pictures_map.keys())
         
         incoming_ids = {pic["cloud_id"] for pic in raw_pictures if pic.get("cloud_id")}
+        if any(is_staging_key(pic_id) and not is_own_staging_key(pic_id, user.user_id) for pic_id in incoming_ids - existing_ids):
+            current_app.logger.warning(f"WARNING: /edit_event, user {user.user_id} sent a staging key that is not theirs")
+            return make_api_response(ResponseTypes.BAD_REQUEST, message="Invalid staging key")
 
         staying_ids = existing_ids.intersection(incoming_ids)
 
@@ -401,22 +420,18 @@ def edit_event(event_id):
 
         for pic_id in ids_to_delete:
             pic_to_remove = existing_pictures_map[pic_id]
-            delete_from_r2_task.delay(pic_id, image_type="event")
+            pics_to_release.append(pic_id)
             event.pictures.remove(pic_to_remove)
 
-        pics_to_verify = []
         for new_id in ids_to_add:
-            new_picture = Pictures(cloud_id=new_id, event_id=event.event_id, image_status="pending")
+            staged = is_staging_key(new_id)
+            new_picture = Pictures(cloud_id=new_id, variants=get_variant_map(new_id, "event"), event_id=event.event_id, image_status="processing" if staged else "pending")
             event.pictures.append(new_picture)
-            pics_to_verify.append(new_id)
+            (pics_to_process if staged else pics_to_verify).append(new_id)
+        acquire_image_refs(pics_to_verify)
 
     try:
         event.is_edited = True
-        db.session.commit()
-        invalidate_event_cache(str(event.event_id))
-        
-        for pid in pics_to_verify:
-            verify_event_image_task.delay(pid)
 
         #get all participants except the creator who is editing the event
         participants = Event_participants.query.filter(
@@ -434,6 +449,17 @@ def edit_event(event_id):
                 participant_ids=participant_ids
             )
 
+        db.session.commit()
+        invalidate_event_cache(str(event.event_id))
+        
+        # the references are released only once the rows stopped using them (a failed commit keeps both)
+        for pid in pics_to_release:
+            delete_from_r2_task.delay(pid, image_type="event")
+        for pid in pics_to_verify:
+            verify_event_image_task.delay(pid)
+        for pid in pics_to_process:
+            process_staged_image_task.delay(pid, "event")
+
         current_app.logger.info(f"INFO: /edit_event, user {user.user_id} successfully edited event {event_id}")
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -61,7 +61,7 @@ def create_friend_request(friend_id):
     try:
         new_request = FriendRequest(sender_id=user.user_id, receiver_id=friend_id)
         db.session.add(new_request)
-        db.session.commit()
+        db.session.flush()
         
         friend_request_created.send(
             current_app._get_current_object(),
@@ -70,6 +70,7 @@ def create_friend_request(friend_id):
             to_user_id = friend_id, 
             request_id=new_request.request_id
         )
+        db.session.commit()
 
     except IntegrityError:
         db.session.rollback()
@@ -146,7 +147,7 @@ def accept_friend_request(friend_id):
     try:
         db.session.delete(request)
         db.session.add(new_friendship)
-        db.session.commit()
+        db.session.flush()
 
         friend_request_accepted.send(
             current_app._get_current_object(),
@@ -154,6 +155,7 @@ def accept_friend_request(friend_id):
             accepter_name=user.username,
             sender_id=friend_id
         )
+        db.session.commit()
         
     except IntegrityError:
         db.session.rollback()
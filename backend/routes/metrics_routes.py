@@ -0,0 +1,30 @@
+from flask import Blueprint, request, current_app
+from backend.responses import ResponseTypes, make_api_response
+from backend import metrics
+import hmac
+
+metrics_bp = Blueprint("metrics", __name__, url_prefix="/api/metrics")
+
+'''
+Input: Header "X-Metrics-Token: <str>" (must match METRICS_TOKEN)
+Action: Returns the counters and per-worker gauges collected by backend.metrics (ex. db_pool_checkout_wait, db_pool_saturation). Disabled (404) when METRICS_TOKEN is not configured
+Data sent to the frontend: {"message": <str>, "counters": {<str>: <float>}, "gauges": {<str>: <float>}}
+Output: 200 OK (or 403/404/500 on error)
+'''
+@metrics_bp.route("", methods=["GET"])
+def get_metrics():
+    expected_token = current_app.config.get("METRICS_TOKEN")
+    if not expected_token:
+        return make_api_response(ResponseTypes.NOT_FOUND)
+
+    if not hmac.compare_digest(request.headers.get("X-Metrics-Token", ""), expected_token):
+        current_app.logger.warning(f"WARNING: /metrics, invalid metrics token from {request.remote_addr}")
+        return make_api_response(ResponseTypes.FORBIDDEN)
+
+    try:
+        data = metrics.get_metrics()
+    except Exception as e:
+        current_app.logger.error(f"ERROR: /metrics, Redis exception occured: {e}")
+        return make_api_response(ResponseTypes.SERVER_ERROR)
+
+    return make_api_response(ResponseTypes.SUCCESS, data=data)
@@ -0,0 +1,98 @@
+from backend.helpers import validate_uuid
+from backend.constants import Constants
+from backend.models import Notification
+from backend.models.notification import NotificationTag
+from sqlalchemy import literal, tuple_
+from datetime import datetime, timezone, timedelta
+import json
+import base64
+import binascii
+
+'''
+Input: sort_mode: <str> ("newest"/"oldest", anything else is "newest")
+Action: Normalizes the inbox sort mode, the cursor is tied to it
+Output: <str:sort_mode>
+'''
+def get_notification_sort_mode(sort_mode):
+    return "oldest" if sort_mode == "oldest" else "newest"
+
+'''
+Input: sort_mode: <str> (normalized), created_at: <datetime>, notification_id: <uuid>
+Action: Builds the opaque cursor pointing after the given notification: urlsafe base64 of {"s": sort_mode, "k": created_at, "id": notification_id}
+Output: <str:cursor>
+'''
+def encode_notification_cursor(sort_mode, created_at, notification_id):
+    raw = json.dumps({"s": sort_mode, "k": created_at.isoformat(), "id": str(notification_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+'''
+Input: cursor: <str>, sort_mode: <str> (normalized)
+Action: Decodes and validates a cursor made by encode_notification_cursor. A cursor made for the other sort mode is rejected
+Output: tuple (<datetime:created_at>, <uuid:notification_id>) or None if the cursor is invalid
+'''
+def decode_notification_cursor(cursor, sort_mode):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if data["s"] != sort_mode:
+            return None
+        notification_id = validate_uuid(data["id"])
+        if notification_id is None:
+            return None
+        return datetime.fromisoformat(data["k"]), notification_id
+    except (ValueError, TypeError, KeyError, UnicodeError, binascii.Error):
+        return None
+
+'''
+Input: user_id: <uuid>, q: <str> (sanitized), status: <str>, notif_tag: <str>, created_window: <str>, sort_mode: <str> (normalized), cursor: <tuple> or None (decoded)
+Action: Builds the inbox query of the user with the filters of /api/notifications, ordered by (created_at, notification_id) in the sort_mode direction and started after the cursor.
+        Every combination is served by an index of Notifications: (user_id, created_at, notification_id), the partial index of unread rows, (user_id, tag, created_at, notification_id)
+        and the trigram index on payload->>'message' for q
+Output: <SQLAlchemy_Query>
+'''
+def build_notifications_query(user_id, q, status, notif_tag, created_window, sort_mode, cursor=None):
+    query = Notification.query.filter(Notification.user_id == user_id)
+
+    if q:
+        query = query.filter(Notification.payload.op('->>')('message').ilike(f"%{q}%"))
+
+    if status == "unread":
+        query = query.filter(Notification.is_read == False)
+    elif status == "read":
+        query = query.filter(Notification.is_read == True)
+
+    if notif_tag != "all":
+        try:
+            query = query.filter(Notification.tag == NotificationTag(notif_tag))
+        except ValueError:
+            pass
+
+    now = datetime.now(timezone.utc)
+    window_days = {"today": 1, "week": 7, "month": 30, "year": 365}
+    if created_window == "older":
+        query = query.filter(Notification.created_at < (now - timedelta(days=365)))
+    elif created_window in window_days:
+        query = query.filter(Notification.created_at >= now - timedelta(days=window_days[created_window]))
+
+    position = tuple_(Notification.created_at, Notification.notification_id)
+    if cursor:
+        cursor_created_at, cursor_id = cursor
+        boundary = tuple_(literal(cursor_created_at, Notification.created_at.type), literal(cursor_id, Notification.notification_id.type))
+        query = query.filter(position > boundary if sort_mode == "oldest" else position < boundary)
+
+    if sort_mode == "oldest":
+        return query.order_by(Notification.created_at.asc(), Notification.notification_id.asc())
+    return query.order_by(Notification.created_at.desc(), Notification.notification_id.desc())
+
+'''
+Input: data: <dict> (request JSON) or None
+Action: Reads the "notification_ids" list of the bulk endpoints: at least 1 and at most MAX_BULK_NOTIFICATION_IDS valid UUIDs (duplicates dropped)
+Output: <list[uuid]> or None if the list is missing, too long or contains an invalid ID
+'''
+def get_bulk_notification_ids(data):
+    notification_ids = data.get("notification_ids") if isinstance(data, dict) else None
+    if not isinstance(notification_ids, list) or not 0 < len(notification_ids) <= Constants.MAX_BULK_NOTIFICATION_IDS:
+        return None
+    parsed = [validate_uuid(str(notification_id)) for notification_id in notification_ids]
+    if any(notification_id is None for notification_id in parsed):
+        return None
+    return list(dict.fromkeys(parsed))
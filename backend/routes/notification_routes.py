@@ -1,24 +1,29 @@
-from flask import Blueprint, request, current_app
+from flask import Blueprint, request, current_app, Response
 from backend.models import Notification
-from backend.models.notification import NotificationTag
 from backend.extensions import limiter, db
 from backend.constants import Constants
 from backend.responses import ResponseTypes, make_api_response
 from sqlalchemy.exc import SQLAlchemyError
-from flask_jwt_extended import jwt_required, get_current_user
+from flask_jwt_extended import jwt_required, get_current_user, get_jwt
 from backend.helpers import sanitize_input
-from datetime import datetime, timezone, timedelta
-from zoneinfo import ZoneInfo
-from backend.helpers import validate_uuid
+from backend.helpers import validate_uuid, get_unread_count, adjust_unread_counts
+from backend.db_routing import read_only_route
+from backend import metrics
+from backend.notifications.stream import notification_hub, serialize_notification
+from .notification_helpers import get_notification_sort_mode, encode_notification_cursor, decode_notification_cursor, build_notifications_query, get_bulk_notification_ids
+from sqlalchemy import update, delete, literal, tuple_
+import queue
+import time
 
 notifications_bp = Blueprint("notifications", __name__, url_prefix="/api/notifications")
-local_tz = ZoneInfo("Europe/Warsaw")
 
 '''
+/api/notifications/?page=1&limit=20 (pages)
+/api/notifications/?cursor=&limit=20 (cursor mode, first page - pass the returned next_cursor to get the next one)
 Input: 
     Header { "Authorization": "Bearer <Access_Token>" }, 
     Query Params { 
-        page=<int>, 
+        page=<int> or cursor=<str>, 
         limit=<int>, 
         q=<str>, 
         status="unread"/"read"/"all", 
@@ -26,6 +31,7 @@ Input:
         created_window="today"/"week"/..., 
         sort_mode="newest"/"oldest" }
 Action: Retrieves paginated notifications for the current user. Filters by read status, type, and creation date. Converts timestamps to the local "Europe/Warsaw" timezone.
+        In cursor mode page is ignored, the next page starts after the last (created_at, notification_id) of the previous one (no OFFSET and no COUNT)
 Data sent to the frontend: {"data": [{
     "notification_id": <str>, 
     "type": <str>, 
@@ -40,11 +46,13 @@ Data sent to the frontend: {"data": [{
     "pages": <int>, 
     "has_next": <bool>, 
     "unread_count": <int>}}
-Output: 200 OK (or 500 on error)
+cursor mode: "pagination": {"limit": <int>, "has_next": <bool>, "next_cursor": <str> or null, "unread_count": <int> (first page) or null}
+Output: 200 OK (or 400 for an invalid cursor, 500 on error)
 '''
 @notifications_bp.route("/", methods=["GET"])
 @limiter.limit("600 per minute")
 @jwt_required()
+@read_only_route
 def get_notifications():
     try:
         user = get_current_user()
@@ -59,7 +67,7 @@ def get_notifications():
         status = request.args.get("status", default="all", type=str).lower()
         notif_tag = request.args.get("tag", default="all", type=str)
         created_window = request.args.get("created_window", default="all", type=str).lower()
-        sort_mode = request.args.get("sort_mode", default="newest", type=str).lower()
+        sort_mode = get_notification_sort_mode(request.args.get("sort_mode", default="newest", type=str).lower())
 
 
         if page < 1:
@@ -69,62 +77,34 @@ def get_notifications():
         if limit > Constants.MAX_PAGINATION_LIMIT:
             limit = Constants.MAX_PAGINATION_LIMIT
 
-        query = Notification.query.filter(Notification.user_id == user_id)
-
-        if q:
-            search_filter = f"%{q}%"
-            query = query.filter(
-                Notification.payload.op('->>')('message').ilike(search_filter)
-            )
-
-        if status == "unread":
-            query = query.filter(Notification.is_read == False)
-        elif status == "read":
-            query = query.filter(Notification.is_read == True)
-
-        if notif_tag != "all":
-            try:
-                enum_tag = NotificationTag(notif_tag)
-                query = query.filter(Notification.tag == enum_tag)
-            except ValueError:
-                pass
-
-
-        now = datetime.now(timezone.utc)
-        if created_window != "all":
-            if created_window == "today":
-                start_date = now - timedelta(days=1)
-            elif created_window == "week":
-                start_date = now - timedelta(weeks=1)
-            elif created_window == "month":
-                start_date = now - timedelta(days=30)
-            elif created_window == "year":
-                start_date = now - timedelta(days=365)
-            
-            if created_window == "older":
-                query = query.filter(Notification.created_at < (now - timedelta(days=365)))
-            else:
-                query = query.filter(Notification.created_at >= start_date)
-
-
-        if sort_mode == "oldest": 
-            query = query.order_by(Notification.created_at.asc())
-        else:
-            query = query.order_by(Notification.created_at.desc())
-        
+        cursor = request.args.get("cursor", type=str)
+        if cursor is not None:
+            decoded_cursor = None
+            if cursor:
+                decoded_cursor = decode_notification_cursor(cursor, sort_mode)
+                if decoded_cursor is None:
+                    return make_api_response(ResponseTypes.BAD_REQUEST, message="Invalid cursor")
+
+            query = build_notifications_query(user_id, q, status, notif_tag, created_window, sort_mode, decoded_cursor)
+            notifications = query.limit(limit + 1).all()
+            has_next = len(notifications) > limit
+            notifications = notifications[:limit]
+
+            current_app.logger.info(f"INFO: /get_notifications, retrieved notifications cursor page for user: {user_id}")
+            return make_api_response(ResponseTypes.SUCCESS, data={
+                "data": [serialize_notification(notif) for notif in notifications],
+                "pagination": {
+                    "limit": limit,
+                    "has_next": has_next,
+                    "next_cursor": encode_notification_cursor(sort_mode, notifications[-1].created_at, notifications[-1].notification_id) if has_next else None,
+                    "unread_count": get_unread_count(user_id) if not cursor else None
+                }
+            })
+
+        query = build_notifications_query(user_id, q, status, notif_tag, created_window, sort_mode)
         pagination = query.paginate(page=page, per_page=limit, error_out=False)
 
-        notification_list = [
-            {
-                "notification_id": str(notif.notification_id),
-                "tag": notif.tag.value,
-                "is_read": notif.is_read,
-                "date": notif.created_at.astimezone(local_tz).strftime("%d.%m.%Y"),
-                "time": notif.created_at.astimezone(local_tz).strftime("%H:%M"),
-                "payload": notif.payload 
-            }
-            for notif in pagination.items
-        ]
+        notification_list = [serialize_notification(notif) for notif in pagination.items]
 
         current_app.logger.info(f"INFO: /get_notifications, retrieved notifications for user: {user_id}")
         return make_api_response(ResponseTypes.SUCCESS, data={
@@ -135,7 +115,7 @@ def get_notifications():
                 "total": pagination.total,
                 "pages": pagination.pages,
                 "has_next": pagination.has_next,
-                "unread_count": Notification.query.filter_by(user_id=user_id, is_read=False).count() if page == 1 else None 
+                "unread_count": get_unread_count(user_id) if page == 1 else None 
             }
         })
     except Exception as e:
@@ -144,6 +124,67 @@ def get_notifications():
         return make_api_response(ResponseTypes.SERVER_ERROR)
 
 
+'''
+Input: Header { "Authorization": "Bearer <Access_Token>" }
+Action: Returns the number of unread notifications of the current user (badge) from the Redis counter, the database is only counted when the counter is not cached
+Data sent to the frontend: {"unread_count": <int>}
+Output: 200 OK (or 500 on error)
+'''
+@notifications_bp.route("/unread_count", methods=["GET"])
+@limiter.limit("600 per minute")
+@jwt_required()
+@read_only_route
+def get_unread_notifications_count():
+    user = get_current_user()
+    try:
+        unread_count = get_unread_count(user.user_id)
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"ERROR: /unread_count, DB exception occured:")
+        current_app.logger.exception(e, stack_info=True)
+        return make_api_response(ResponseTypes.SERVER_ERROR)
+
+    return make_api_response(ResponseTypes.SUCCESS, data={"unread_count": unread_count})
+
+'''
+Input: Header { "Authorization": "Bearer <Access_Token>" }
+Action: Server-Sent Events stream of the user's new notifications. The notification tasks publish every created notification on the user's Redis channel and the process-wide NotificationHub
+        pushes it to the open streams of that user. The stream holds no DB session or Redis connection of its own; a comment line is sent every SSE_HEARTBEAT_INTERVAL seconds
+        and the stream ends after SSE_MAX_DURATION seconds or when the access token expires - the client reconnects (EventSource does it after the "retry" delay).
+        Every open stream keeps a worker thread busy, serve this route with an async worker class (ex. gunicorn -k gevent) so idle streams stay cheap
+Data sent to the frontend: text/event-stream, "event: notification" with data = {"notification_id": <str>, "tag": <str>, "is_read": <bool>, "date": <str>, "time": <str>, "payload": <dict>}
+Output: 200 OK (stream)
+'''
+@notifications_bp.route("/stream", methods=["GET"])
+@limiter.limit("60 per minute")
+@jwt_required()
+def stream_notifications():
+    user_id = str(get_current_user().user_id)
+    deadline = min(time.time() + Constants.SSE_MAX_DURATION, get_jwt()["exp"])
+    subscriber = notification_hub.subscribe(user_id)
+    metrics.set_gauge("sse_subscribers", notification_hub.subscriber_count())
+    current_app.logger.info(f"INFO: /stream_notifications, user {user_id} opened the notification stream")
+
+    def generate():
+        try:
+            yield f"retry: {Constants.SSE_RETRY_MS}\n\n"
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    data = subscriber.get(timeout=min(Constants.SSE_HEARTBEAT_INTERVAL, remaining))
+                    yield f"event: notification\ndata: {data}\n\n"
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            notification_hub.unsubscribe(user_id, subscriber)
+            metrics.set_gauge("sse_subscribers", notification_hub.subscriber_count())
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no" # nginx must not buffer the stream
+    })
+
 @notifications_bp.route("<notification_id>/read", methods=["PUT"])
 @limiter.limit("600 per minute")
 @jwt_required()
@@ -163,8 +204,11 @@ def read_notification(notification_id):
         return make_api_response(ResponseTypes.FORBIDDEN, message="You can read your own notifications only")
     
     try:
+        was_unread = not notification.is_read
         notification.is_read = True
         db.session.commit()
+        if was_unread:
+            adjust_unread_counts([user.user_id], -1)
         current_app.logger.info(f"INFO: /read_notifications, user {user.user_id} successfully read notification {notification_id}")
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -172,4 +216,121 @@ def read_notification(notification_id):
         current_app.logger.exception(e, stack_info=True)
         return make_api_response(ResponseTypes.SERVER_ERROR)
 
-    return make_api_response(ResponseTypes.SUCCESS, message="Notification read successfully")
\ No newline at end of file
+    return make_api_response(ResponseTypes.SUCCESS, message="Notification read successfully")
+
+'''
+Input: Header { "Authorization": "Bearer <Access_Token>" }, Body (optional) { "up_to": <uuid:notification_id> }
+Action: Marks all unread notifications of the current user as read in one UPDATE. With up_to only the notifications not newer than the given one, in the inbox order
+        (created_at, notification_id), are marked - the client passes the newest notification it has shown, so ones that arrived later stay unread. The unread counter goes down by the affected count
+Data sent to the frontend: {"updated": <int>, "message": "Notifications read successfully"}
+Output: 200 OK (or 400 for an invalid up_to, 404 if up_to is not a notification of the user, 500 on error)
+'''
+@notifications_bp.route("/read_all", methods=["PUT"])
+@limiter.limit("60 per minute")
+@jwt_required()
+def read_all_notifications():
+    user = get_current_user()
+    data = request.get_json(silent=True)
+
+    statement = update(Notification).where(
+        Notification.user_id == user.user_id,
+        Notification.is_read == False
+    ).values(is_read=True).execution_options(synchronize_session=False)
+
+    up_to = data.get("up_to") if isinstance(data, dict) else None
+    try:
+        if up_to is not None:
+            up_to_uuid = validate_uuid(up_to)
+            if not up_to_uuid:
+                return make_api_response(ResponseTypes.INVALID_DATA, message="Invalid notification UD format")
+            bound = Notification.query.with_entities(Notification.created_at, Notification.notification_id).filter(
+                Notification.notification_id == up_to_uuid,
+                Notification.user_id == user.user_id
+            ).first()
+            if bound is None:
+                return make_api_response(ResponseTypes.NOT_FOUND, message="This notification does not exist")
+            statement = statement.where(tuple_(Notification.created_at, Notification.notification_id) <= tuple_(
+                literal(bound.created_at, Notification.created_at.type), literal(bound.notification_id, Notification.notification_id.type)
+            ))
+
+        updated = db.session.execute(statement).rowcount
+        db.session.commit()
+        adjust_unread_counts([user.user_id], -updated)
+        current_app.logger.info(f"INFO: /read_all_notifications, user {user.user_id} read {updated} notifications")
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"ERROR: /read_all_notifications, DB exception occured:")
+        current_app.logger.exception(e, stack_info=True)
+        return make_api_response(ResponseTypes.SERVER_ERROR)
+
+    return make_api_response(ResponseTypes.SUCCESS, data={"updated": updated}, message="Notifications read successfully")
+
+'''
+Input: Header { "Authorization": "Bearer <Access_Token>" }, Body { "notification_ids": [<uuid>, ...] } (at most MAX_BULK_NOTIFICATION_IDS)
+Action: Marks the given notifications of the current user as read in one UPDATE, IDs of other users' notifications are ignored. The unread counter goes down by the number of rows that were unread
+Data sent to the frontend: {"updated": <int>, "message": "Notifications read successfully"}
+Output: 200 OK (or 400 for an invalid list, 500 on error)
+'''
+@notifications_bp.route("/read", methods=["PUT"])
+@limiter.limit("600 per minute")
+@jwt_required()
+def read_notifications():
+    user = get_current_user()
+    notification_ids = get_bulk_notification_ids(request.get_json(silent=True))
+    if notification_ids is None:
+        return make_api_response(ResponseTypes.INVALID_DATA, message=f"notification_ids must be a list of 1-{Constants.MAX_BULK_NOTIFICATION_IDS} notification IDs")
+
+    try:
+        updated = db.session.execute(update(Notification).where(
+            Notification.user_id == user.user_id,
+            Notification.notification_id.in_(notification_ids),
+            Notification.is_read == False
+        ).values(is_read=True).execution_options(synchronize_session=False)).rowcount
+        db.session.commit()
+        adjust_unread_counts([user.user_id], -updated)
+        current_app.logger.info(f"INFO: /read_notifications, user {user.user_id} read {updated} notifications")
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"ERROR: /read_notifications, DB exception occured:")
+        current_app.logger.exception(e, stack_info=True)
+        return make_api_response(ResponseTypes.SERVER_ERROR)
+
+    return make_api_response(ResponseTypes.SUCCESS, data={"updated": updated}, message="Notifications read successfully")
+
+'''
+Input: Header { "Authorization": "Bearer <Access_Token>" }, Body (optional) { "notification_ids": [<uuid>, ...] } (at most MAX_BULK_NOTIFICATION_IDS)
+Action: Deletes notifications of the current user in one DELETE: the given ones (read or not, IDs of other users' notifications are ignored) or, without a body, every read notification.
+        The unread counter goes down by the number of deleted rows that were unread
+Data sent to the frontend: {"deleted": <int>, "message": "Notifications deleted successfully"}
+Output: 200 OK (or 400 for an invalid list, 500 on error)
+'''
+@notifications_bp.route("/", methods=["DELETE"])
+@limiter.limit("60 per minute")
+@jwt_required()
+def delete_notifications():
+    user = get_current_user()
+    data = request.get_json(silent=True)
+
+    statement = delete(Notification).where(Notification.user_id == user.user_id)
+    if data:
+        notification_ids = get_bulk_notification_ids(data)
+        if notification_ids is None:
+            return make_api_response(ResponseTypes.INVALID_DATA, message=f"notification_ids must be a list of 1-{Constants.MAX_BULK_NOTIFICATION_IDS} notification IDs")
+        statement = statement.where(Notification.notification_id.in_(notification_ids))
+    else:
+        statement = statement.where(Notification.is_read == True)
+
+    try:
+        deleted_read_flags = db.session.execute(
+            statement.returning(Notification.is_read).execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.session.commit()
+        adjust_unread_counts([user.user_id], -deleted_read_flags.count(False))
+        current_app.logger.info(f"INFO: /delete_notifications, user {user.user_id} deleted {len(deleted_read_flags)} notifications")
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"ERROR: /delete_notifications, DB exception occured:")
+        current_app.logger.exception(e, stack_info=True)
+        return make_api_response(ResponseTypes.SERVER_ERROR)
+
+    return make_api_response(ResponseTypes.SUCCESS, data={"deleted": len(deleted_read_flags)}, message="Notifications deleted successfully")
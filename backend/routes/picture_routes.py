@@ -3,16 +3,62 @@ from backend.extensions import limiter
 from backend.responses import ResponseTypes, make_api_response
 from flask_jwt_extended import jwt_required, get_current_user
 from backend.constants import Constants
-from backend.picture_helpers import validate_and_process_image, upload_to_r2
+from backend.picture_helpers import validate_and_process_image, upload_to_r2, get_image_pool, run_in_app_context, get_variant_map, get_variant_srcset, create_staging_uploads
+from collections import deque
 import magic
 import os
 
 pictures_bp = Blueprint("pictures", __name__, url_prefix="/api/pictures")
 
+'''
+Input: app: <Flask_Application_Object>, io_pool: <ThreadPoolExecutor>, file: <FileStorage>, processing: <Future> (validate_and_process_image of the file)
+Action: Waits for the processed image and submits it to the I/O pool (upload_to_r2). An exception in the worker is reported as the file's error
+Output: tuple (<str:filename>, <Future:upload> or None, <str:error> or None)
+'''
+def start_upload(app, io_pool, file, processing):
+    try:
+        processed_file, error = processing.result()
+    except Exception as e:
+        processed_file, error = None, str(e)
+    upload = None if error else io_pool.submit(run_in_app_context, app, upload_to_r2, processed_file, "event")
+    return file.filename, upload, error
+
+'''
+Input: files: <list[FileStorage]>
+Action: Submits the files to the image CPU pool (validate_and_process_image), at most IMAGE_CPU_WORKERS of them at a time, and, taking the results in file order, submits each processed image
+        to the I/O pool (upload_to_r2) right away. A processed image is kept only until its upload finishes, the next file is submitted when the oldest one is handed to the I/O pool
+Output: list of tuples (<str:filename>, <str:s3_key> or None, <str:error> or None), in file order
+'''
+def process_and_upload_batch(files):
+    app = current_app._get_current_object()
+    cpu_pool = get_image_pool("cpu")
+    io_pool = get_image_pool("io")
+    window = current_app.config["IMAGE_CPU_WORKERS"]
+
+    processing = deque()
+    uploads = []
+    for file in files:
+        processing.append((file, cpu_pool.submit(run_in_app_context, app, validate_and_process_image, file, "event")))
+        if len(processing) >= window:
+            uploads.append(start_upload(app, io_pool, *processing.popleft()))
+    while processing:
+        uploads.append(start_upload(app, io_pool, *processing.popleft()))
+
+    results = []
+    for filename, upload, error in uploads:
+        s3_key = None
+        if upload is not None:
+            try:
+                s3_key = upload.result()
+            except Exception as e:
+                current_app.logger.error(f"ERROR: /upload_multiple_files, upload of {filename} raised: {e}")
+        results.append((filename, s3_key, error))
+    return results
+
 '''
 Input: Form-Data { "file": <File_Binary>, "tags": <str>, "type": <str: "profile"/"event"> }
 Action: Validates, compresses, and uploads a single image to S3.
-Data sent to the frontend: {"picture_url": <str>, "cloud_id": <str>, "public_id": <str>, "tags": [<str>]}
+Data sent to the frontend: {"picture_url": <str>, "cloud_id": <str>, "variants": {"webp": <str:srcset>, "jpg": <str:srcset>}}
 Output: 201 Created
 '''
 @pictures_bp.route("/upload", methods=["POST"])
@@ -36,12 +82,7 @@ def upload_file():
         current_app.logger.warning(f"WARNING: /upload_file, error: {error}")
         return make_api_response(ResponseTypes.BAD_REQUEST, message=error)
 
-    if image_type == "profile":
-        folder = "profiles"
-    else:
-        folder = "events"
-
-    s3_key = upload_to_r2(processed_file, folder)
+    s3_key = upload_to_r2(processed_file, image_type)
 
     if not s3_key:
         current_app.logger.error(f"ERROR: /upload_file, picture upload to s3 failed")
@@ -52,17 +93,20 @@ def upload_file():
 
     return make_api_response(ResponseTypes.CREATED, data={
         "picture_url": full_url,
-        "cloud_id": s3_key
+        "cloud_id": s3_key,
+        "variants": get_variant_srcset(get_variant_map(s3_key, image_type), r2_base_url)
     })
 
 '''
 Input: Form-Data { "files": [<File_Binary>, ...], "tags": <str> } (Supports up to 5 files simultaneously).
-Action: It iterates through the file list, uploading each to Cloudinary. It tracks successes and failures individually for each file
+Action: Processes the files in parallel on the image CPU pool and uploads each one to R2 on the I/O pool as soon as it is processed, so uploads overlap with the processing of the next files.
+        It tracks successes and failures individually for each file, the results keep the order of the files
 Data sent to the frontend: {
 "pictures": [{
     "picture_url": <str>, 
     "cloud_id": <str>, 
-    "public_id": <str>}],
+    "public_id": <str>,
+    "variants": {"webp": <str:srcset>, "jpg": <str:srcset>}}],
 "errors": [{"filename": <str>, "error": <str>}], 
 "message": <str>}
 Output: 201 Created (or 400/500 on error)
@@ -88,27 +132,22 @@ def upload_multiple_files():
     uploaded_data = []
     errors = []
 
-    for file in files:
-        if file.filename == '':
-            continue
-
-        processed_file, error = validate_and_process_image(file, "event")
+    for filename, s3_key, error in process_and_upload_batch([file for file in files if file.filename != '']):
         if error:
-            errors.append({"filename": file.filename, "error": error})
+            errors.append({"filename": filename, "error": error})
             continue
 
-        s3_key = upload_to_r2(processed_file, "events")
-        
         if s3_key:
             r2_base_url = current_app.config.get("R2_PUBLIC_URL", "").rstrip('/')
             uploaded_data.append({
                 "picture_url": f"{r2_base_url}/{s3_key}",
                 "cloud_id": s3_key,
-                "public_id": s3_key
+                "public_id": s3_key,
+                "variants": get_variant_srcset(get_variant_map(s3_key), r2_base_url)
             })
 
         else:
-            errors.append({"filename": file.filename, "error": "S3 Upload failed"})
+            errors.append({"filename": filename, "error": "S3 Upload failed"})
 
     current_app.logger.error(f"ERROR: /upload_multiple_files, s3 upload error for all files: {errors}")
 
@@ -125,4 +164,35 @@ def upload_multiple_files():
     return make_api_response(ResponseTypes.CREATED, data={
         "pictures": uploaded_data,
         "errors": errors 
-    }, message=message)
\ No newline at end of file
+    }, message=message)
+
+'''
+Input: JSON {"type": <str: "profile"/"event">, "count": <int> (1 - MAX_PICTURES_COUNT, default 1)}
+Action: Issues presigned PUT URLs into the staging bucket. The client uploads the original files straight to R2 (the API worker never receives the bytes) and sends the staging keys
+        as cloud_id to /events/create, /events/edit or /users/update_profile. The pictures are processed by process_staged_image_task (status "processing" until then)
+Data sent to the frontend: {"uploads": [{"staging_key": <str>, "upload_url": <str>, "expires_in": <int>}], "max_size": <int>}
+Output: 201 Created (or 400 on error)
+'''
+@pictures_bp.route("/presign", methods=["POST"])
+@jwt_required()
+@limiter.limit("100 per minute")
+def presign_uploads():
+    user = get_current_user()
+    data = request.get_json(silent=True) or {}
+
+    image_type = data.get("type", "event")
+    if image_type not in ("event", "profile"):
+        return make_api_response(ResponseTypes.BAD_REQUEST, message="Type must be event or profile")
+
+    count = data.get("count", 1)
+    max_count = 1 if image_type == "profile" else Constants.MAX_PICTURES_COUNT
+    if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= max_count:
+        return make_api_response(ResponseTypes.BAD_REQUEST, message=f"Count must be between 1 and {max_count}")
+
+    uploads = create_staging_uploads(user.user_id, count)
+
+    current_app.logger.info(f"INFO: /presign, {count} {image_type} upload URLs issued for user {user.user_id}")
+    return make_api_response(ResponseTypes.CREATED, data={
+        "uploads": uploads,
+        "max_size": Constants.MAX_PROFILE_PIC_SIZE if image_type == "profile" else Constants.MAX_EVENT_PIC_SIZE
+    })
@@ -1,7 +1,78 @@
 from backend.models import User
 from backend.responses import ResponseTypes, make_api_response
 from backend.extensions import db, jwt
-from backend.helpers import is_token_revoked
+from backend.helpers import is_token_revoked, get_user_snapshot, validate_uuid, USER_SNAPSHOT_FIELDS
+from flask_jwt_extended.exceptions import UserLookupError
+
+'''
+Lazily resolved stand-in for the current User returned by get_current_user().
+- user_id is taken straight from the JWT "sub" claim (no cache or database access)
+- fields listed in USER_SNAPSHOT_FIELDS (and display_name) are read from the cached user snapshot (in-process -> Redis -> database)
+- anything else (methods such as validate_password, relationships, password_hash) and every assignment loads the real ORM row with db.session.get, 
+  after that all reads go to the ORM row so changes made in the request are visible
+- write endpoints call for_update() first: it locks and loads the real row (SELECT ... FOR UPDATE on the primary), so the state they change is never read from a snapshot
+  that another process may still serve for USER_SNAPSHOT_LOCAL_TTL (or USER_SNAPSHOT_TTL when an invalidation failed)
+If the user row no longer exists, the first lookup raises UserLookupError (401), just like the old eager loader did
+'''
+class CurrentUserProxy:
+    __slots__ = ("_user_id", "_jwt_header", "_jwt_payload", "_snapshot", "_user")
+
+    def __init__(self, user_id, jwt_header, jwt_payload):
+        object.__setattr__(self, "_user_id", user_id)
+        object.__setattr__(self, "_jwt_header", jwt_header)
+        object.__setattr__(self, "_jwt_payload", jwt_payload)
+        object.__setattr__(self, "_snapshot", None)
+        object.__setattr__(self, "_user", None)
+
+    @property
+    def user_id(self):
+        return self._user_id
+
+    @property
+    def display_name(self):
+        if self.deleted:
+            return "[deleted]"
+        return self.username
+
+    def _lookup_failed(self):
+        return UserLookupError(f"User {self._user_id} not found", self._jwt_header, self._jwt_payload)
+
+    def _get_snapshot(self):
+        if self._snapshot is None:
+            snapshot = get_user_snapshot(self._user_id)
+            if snapshot is None:
+                raise self._lookup_failed()
+            object.__setattr__(self, "_snapshot", snapshot)
+        return self._snapshot
+
+    def _get_user(self):
+        if self._user is None:
+            user = db.session.get(User, self._user_id)
+            if user is None:
+                raise self._lookup_failed()
+            object.__setattr__(self, "_user", user)
+        return self._user
+
+    def for_update(self):
+        user = db.session.get(User, self._user_id, with_for_update=True, populate_existing=True)
+        if user is None:
+            raise self._lookup_failed()
+        object.__setattr__(self, "_user", user)
+        return user
+
+    def __getattr__(self, name):
+        if self._user is None and name in USER_SNAPSHOT_FIELDS:
+            return self._get_snapshot()[name]
+        return getattr(self._get_user(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get_user(), name, value)
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return f"CurrentUserProxy {self._user_id}"
 
 '''
 Input: jwt_header: <dict>, jwt_payload: <dict>
@@ -44,10 +115,12 @@ def expired_token_callback(jwt_header, jwt_payload):
 
 '''
 Input: jwt_header: <dict>, jwt_payload: <dict>
-Action: Retrieves the User object from the database using the identity (sub) stored in the JWT payload.
-Output: <User_Model_Object> or None
+Action: Wraps the identity (sub) stored in the JWT payload in a CurrentUserProxy. Nothing is loaded here - the cached snapshot or the User row are only fetched when the endpoint reads them
+Output: <CurrentUserProxy> or None (if sub is not a valid UUID)
 '''
 @jwt.user_lookup_loader
 def load_user(jwt_header, jwt_payload):
-    user_id = jwt_payload["sub"]
-    return db.session.get(User, user_id)
\ No newline at end of file
+    user_id = validate_uuid(jwt_payload["sub"])
+    if user_id is None:
+        return None
+    return CurrentUserProxy(user_id, jwt_header, jwt_payload)
\ No newline at end of file
@@ -4,14 +4,18 @@ from backend.extensions import db, limiter
 from backend.models import User, Friendship
 from sqlalchemy import or_
 from backend.responses import ResponseTypes, make_api_response
-from backend.tasks import send_email_async, delete_from_r2_task, verify_profile_image_task
+from backend.tasks import send_email_async, delete_from_r2_task, verify_profile_image_task, process_staged_image_task
+from backend.picture_helpers import get_variant_map, get_variant_srcset, is_staging_key, is_own_staging_key
+from backend.image_objects import acquire_image_refs
 from backend.helpers import (
     sanitize_input, 
     revoke_all_user_tokens, 
     add_token_to_db,
-    validate_uuid
+    validate_uuid,
+    invalidate_user_cache
 )
 from backend.constants import Constants
+from backend.db_routing import read_only_route
 from datetime import datetime, timezone, timedelta
 import re
 import uuid
@@ -34,13 +38,14 @@ Data sent to the frontend: {
     "faculty": <str>, 
     "academic_clubs": [<str>], 
     "description": <str>, 
-    "profile_picture": {"cloud_id": <str>, "url": <str>}, 
+    "profile_picture": {"cloud_id": <str>, "url": <str>, "variants": {"webp": <str:srcset>, "jpg": <str:srcset>}}, 
     "friend_count": <int>, 
     "deleted": <bool>}
 Output: 200 OK (or 404 on error)
 '''
 @users_bp.route("/profile/<user_id>", methods=["GET"])
 @jwt_required()
+@read_only_route
 def get_user_info(user_id):
     user = User.query.filter_by(user_id=user_id).first()
 
@@ -53,6 +58,7 @@ def get_user_info(user_id):
         profile_pic_data = {
             "cloud_id": user.profile_picture,
             "url": f"{r2_base_url}/{user.profile_picture}",
+            "variants": get_variant_srcset(user.profile_picture_variants, r2_base_url),
             "status": user.image_status
         }
 
@@ -83,7 +89,7 @@ def get_user_info(user_id):
     return make_api_response(ResponseTypes.SUCCESS, data=user_data)
 
 '''
-Input: JSON { "username": <str>, "description": <str>, "academy": <str>, "profile_picture": {"cloud_id": <str>} OR null } (all fields optional)
+Input: JSON { "username": <str>, "description": <str>, "academy": <str>, "profile_picture": {"cloud_id": <str> (uploaded key or staging key from /presign)} OR null } (all fields optional)
 Action: Updates profile fields. Handles username uniqueness checks and manages Cloudinary profile picture deletion if updated.
 Data sent to the frontend: {"message": "Profile updated successfully"}.
 Output: 200 OK (or 400/403/500 on error)
@@ -92,7 +98,7 @@ Output: 200 OK (or 400/403/500 on error)
 @limiter.limit("300 per minute")
 @jwt_required()
 def update_profile():
-    user = get_current_user()
+    user = get_current_user().for_update()
 
     if user.deleted:
         current_app.logger.warning(f"WARNING: /update_profile, user {user.user_id} tried to update deleted profile")
@@ -142,32 +148,55 @@ def update_profile():
             user.faculty = None
             user.academic_clubs = None
 
+    staged_picture = None
+    picture_to_verify = None
+    picture_to_release = None
     if "profile_picture" in user_data:
         pic_data = user_data["profile_picture"]
         current_pic_key = user.profile_picture 
 
         if pic_data is None:
             if current_pic_key:
-                delete_from_r2_task.delay(current_pic_key, image_type="profile")
+                picture_to_release = current_pic_key
                 user.profile_picture = None
+                user.profile_picture_variants = None
                 user.image_status = "approved"
 
         elif isinstance(pic_data, dict) and "cloud_id" in pic_data:
             new_r2_key = pic_data["cloud_id"]
+            if is_staging_key(new_r2_key):
+                if not is_own_staging_key(new_r2_key, user.user_id):
+                    current_app.logger.warning(f"WARNING: /update_profile, user {user.user_id} sent a staging key that is not theirs")
+                    return make_api_response(ResponseTypes.BAD_REQUEST, message="Invalid staging key")
+                staged_picture = new_r2_key
+
             if current_pic_key and current_pic_key != new_r2_key:
-                delete_from_r2_task.delay(current_pic_key, image_type="profile")
+                picture_to_release = current_pic_key
+            if not staged_picture and current_pic_key != new_r2_key:
+                acquire_image_refs([new_r2_key])
             user.profile_picture = new_r2_key
-            user.image_status = "pending"
+            user.profile_picture_variants = get_variant_map(new_r2_key, "profile")
+            user.image_status = "processing" if staged_picture else "pending"
 
-            verify_profile_image_task.delay(user.user_id, new_r2_key)
+            if not staged_picture:
+                picture_to_verify = new_r2_key
 
     try:
         db.session.commit()
+        invalidate_user_cache(user.user_id)
     except SQLAlchemyError as e:
         db.session.rollback()
         current_app.logger.error(f"ERROR: /update_profile, DB exception occured:")
         current_app.logger.exception(e, stack_info=True)
         return make_api_response(ResponseTypes.SERVER_ERROR)
+
+    # the old picture is released only after the row stopped pointing to it (a failed commit keeps both)
+    if picture_to_release:
+        delete_from_r2_task.delay(picture_to_release, image_type="profile")
+    if picture_to_verify:
+        verify_profile_image_task.delay(user.user_id, picture_to_verify)
+    if staged_picture:
+        process_staged_image_task.delay(staged_picture, "profile", str(user.user_id))
     
     current_app.logger.info(f"INFO: /update_profile, success in editing user profile for ID: {user.user_id}")
     return make_api_response(ResponseTypes.SUCCESS, message="Profile updated successfully")
@@ -182,7 +211,7 @@ Output: 200 OK (or 400/403/404/500 on error)
 @limiter.limit("100 per minute")
 @jwt_required()
 def update_academic_details():
-    user = get_current_user()
+    user = get_current_user().for_update()
     
     if not user:
         return make_api_response(ResponseTypes.NOT_FOUND, message="User not found")
@@ -244,6 +273,7 @@ def update_academic_details():
 
     try:
         db.session.commit()
+        invalidate_user_cache(user.user_id)
         current_app.logger.info(f"INFO: /update_academic_details, user {user.user_id} updated their profile")
         return make_api_response(ResponseTypes.SUCCESS, message="Academic details updated successfully")
     except SQLAlchemyError as e:
@@ -262,7 +292,7 @@ Output: 200 OK (or 400/401/500 on error)
 @jwt_required()
 @limiter.limit("500 per minute")
 def change_password():
-    user = get_current_user()
+    user = get_current_user().for_update()
     password_data = request.get_json(silent=True)
     
     required_keys = {"old_password", "new_password"}
@@ -285,6 +315,7 @@ def change_password():
         
         revoke_all_user_tokens(user.user_id)
         db.session.commit()
+        invalidate_user_cache(user.user_id)
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"ERROR: /settings/password, DB exception occurred:")
@@ -304,7 +335,7 @@ Output: 200 OK (or 400/409/500 on error)
 @jwt_required()
 @limiter.limit("300 per minute")
 def change_email_request():
-    user = get_current_user()
+    user = get_current_user().for_update()
     data = request.get_json(silent=True)
     
     if not data or "new_email" not in data:
@@ -344,6 +375,7 @@ def change_email_request():
     try:
         user.pending_email = new_email 
         db.session.commit()
+        invalidate_user_cache(user.user_id)
         
         send_email_async.delay('Change email confirmation', new_email, new_email_body)
         send_email_async.delay('Security Alert: Email Change Requested', user.email, security_alert_body)
@@ -386,7 +418,7 @@ Output: 200 OK (or 400/401/500 on error)
 @users_bp.route("/settings/delete_account", methods=["DELETE"])
 @jwt_required()
 def delete_account():
-    user = get_current_user()
+    user = get_current_user().for_update()
     data = request.get_json(silent=True)
     
     if not data or "password" not in data:
@@ -418,11 +450,14 @@ def delete_account():
         
         revoke_all_user_tokens(user.user_id)
 
-        if user.profile_picture:
-            delete_from_r2_task.delay(user.profile_picture, image_type="profile")
-            user.profile_picture = None
+        picture_to_release = user.profile_picture
+        user.profile_picture = None
+        user.profile_picture_variants = None
         
         db.session.commit()
+        invalidate_user_cache(user.user_id)
+        if picture_to_release:
+            delete_from_r2_task.delay(picture_to_release, image_type="profile")
         current_app.logger.info(f"INFO: /settings/delete_account, user: {user.user_id} deleted their account")
         return make_api_response(ResponseTypes.SUCCESS, message="Account successfully deleted")
     
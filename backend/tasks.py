@@ -4,11 +4,23 @@ from backend.extensions import mail, db
 from backend.models.notification import Notification, NotificationTag
 from backend.models.event import Pictures
 from backend.models.user import User
+from backend.models.tokenblocklist import TokenBlocklist
+from backend.models.outbox import OutboxMessage
+from backend.outbox import relay_outbox
 from backend.constants import Constants
-from backend.picture_helpers import get_r2_client
-from backend.helpers import invalidate_event_cache
+from backend.picture_helpers import get_r2_client, get_variant_map, validate_and_process_image, upload_to_r2, pop_spooled_image
+from backend.moderation import get_moderation_backend
+from backend.image_objects import acquire_image_refs, release_image_ref, claim_unreferenced_images, get_moderation_verdict, find_rejected_lookalike, record_moderation_verdict
+from backend.helpers import invalidate_event_cache, invalidate_user_cache, adjust_unread_counts, reconcile_unread_counts, get_unread_count_key
+from backend.extensions import redis_client
+from backend.notifications.stream import publish_notifications
+from backend.notifications.coalesce import write_notifications
+from backend.db_maintenance import is_partitioned, ensure_monthly_partitions, drop_partitions_before, delete_in_batches, month_start, table_size
+from backend import metrics
 from flask import current_app
-import boto3
+from datetime import datetime, timezone, timedelta
+import time
+import io
 
 
 
@@ -33,59 +45,100 @@ def send_email_async(subject, recipient, body):
 
 '''
 Input: user_id: <uuid>, notification_tag_value: <str>, payload: <JSONB/Dict>
-Action: Creates a database record in the Notifications table asynchronously.
+Action: Creates a database record in the Notifications table asynchronously (or merges it into the recipient's unread notification of the same event, see write_notifications).
 Output: None
 '''
 @shared_task
 def create_notification_task(user_id, notification_tag_value, payload):
     notification_tag = NotificationTag(notification_tag_value)
-    
-    notification = Notification(
-        user_id=user_id,
-        tag=notification_tag,
-        payload=payload
-    )
-    
-    db.session.add(notification)
-    db.session.commit()
+
+    created, coalesced = write_notifications([str(user_id)], notification_tag, payload)
+    adjust_unread_counts([n.user_id for n in created], 1)
+    publish_notifications(created + coalesced)
+
+'''
+Input: user_ids: <list[str]>, notification_tag_value: <str>, payload: <JSONB/Dict>
+Action: Fan-out version of create_notification_task, enqueued once per signal: creates the same notification for every recipient (duplicates skipped).
+        Rows are written with one multi-row INSERT per chunk of NOTIFICATION_BULK_CHUNK_SIZE recipients, each chunk in its own short transaction.
+        Recipients with an unread notification of the same event get it updated instead (see write_notifications)
+Output: None
+'''
+@shared_task(ignore_result=True)
+def create_notifications_bulk_task(user_ids, notification_tag_value, payload):
+    notification_tag = NotificationTag(notification_tag_value)
+    recipients = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+    chunk_size = Constants.NOTIFICATION_BULK_CHUNK_SIZE
+    coalesced_count = 0
+
+    for start in range(0, len(recipients), chunk_size):
+        chunk = recipients[start:start + chunk_size]
+        try:
+            created, coalesced = write_notifications(chunk, notification_tag, payload)
+            adjust_unread_counts([n.user_id for n in created], 1)
+            publish_notifications(created + coalesced)
+            coalesced_count += len(coalesced)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"ERROR: create_notifications_bulk_task, {notification_tag_value} chunk of {len(chunk)} recipients failed: {e}")
+            raise
+
+    current_app.logger.info(f"INFO: create_notifications_bulk_task, {notification_tag_value} created for {len(recipients)} recipients ({coalesced_count} merged into unread notifications)")
+
+'''
+Input: image_key: <str>, bucket_name: <str>
+Action: Returns the moderation verdict of the image. A verdict already known for the same content (see get_moderation_verdict) is reused without reading the image or calling the backend.
+        A rejected picture with the same perceptual hash is only logged and counted (moderation_perceptual_matches), it never decides the verdict. Otherwise the bytes spooled by upload_to_r2 are used (the object is downloaded from R2 only when they are gone), checked by the moderation backend (MODERATION_BACKEND)
+        and the verdict is saved on its ImageObject (in the caller's transaction) for the next identical uploads. The time from the upload to the approval is reported
+Output: tuple (<str:status> "approved"/"rejected", <list:moderation_labels>, <bool:files_removed> - True when the object was rejected before and its files are already deleted)
+'''
+def moderate_image(image_key, bucket_name):
+    status = get_moderation_verdict(image_key)
+    if status:
+        metrics.incr("moderation_cache_hits")
+        return status, [], status == "rejected"
+
+    lookalike = find_rejected_lookalike(image_key)
+    if lookalike:
+        metrics.incr("moderation_perceptual_matches")
+        current_app.logger.info(f"Image {image_key} has the perceptual hash of the rejected image {lookalike}")
+
+    image_bytes = pop_spooled_image(image_key)
+    if image_bytes is None:
+        metrics.incr("moderation_spool_misses")
+        r2 = get_r2_client(permission="read")
+        r2_obj = r2.get_object(Bucket=bucket_name, Key=image_key)
+        image_bytes = r2_obj['Body'].read()
+
+    labels = get_moderation_backend().detect_labels(image_bytes)
+
+    status = "rejected" if labels else "approved"
+    uploaded_at = record_moderation_verdict(image_key, status)
+    if uploaded_at and status == "approved":
+        metrics.observe("image_approval_latency_seconds", (datetime.now(timezone.utc) - uploaded_at).total_seconds())
+    return status, labels, False
 
 '''
 Input: image_key: <str>
-Action: Downloads the image from R2, sends it to AWS Rekognition for safety analysis, and updates the event picture status in the database.
+Action: Moderates the image (moderate_image) and updates the status of every event picture using it (identical uploads share one object).
 Output: None
 '''
 @shared_task(ignore_result=True)
 def verify_event_image_task(image_key):
-    r2 = get_r2_client(permission="read")
     try:
-        r2_obj = r2.get_object(Bucket=current_app.config["BUCKET_EVENTS"], Key=image_key)
-        image_bytes = r2_obj['Body'].read()
+        status, labels, files_removed = moderate_image(image_key, current_app.config["BUCKET_EVENTS"])
 
-        rekognition = boto3.client(
-            'rekognition',
-            aws_access_key_id=current_app.config["AWS_ACCESS_KEY_ID"],
-            aws_secret_access_key=current_app.config["AWS_SECRET_ACCESS_KEY"],
-            region_name=current_app.config["AWS_REGION"]
-        )
-        
-        response = rekognition.detect_moderation_labels(
-            Image={'Bytes': image_bytes},
-            MinConfidence=Constants.MIN_CONFIDENCE_REKOGITION
-        )
+        pictures = Pictures.query.filter_by(cloud_id=image_key).all()
+        for picture in pictures:
+            picture.image_status = status
 
-        picture = Pictures.query.filter_by(cloud_id=image_key).first()
-        if not picture:
-            return
-
-        if not response['ModerationLabels']:
-            picture.image_status = "approved"
-        else:
-            picture.image_status = "rejected"
-            current_app.logger.warning(f"Event picture {image_key} rejected: {response['ModerationLabels']}")
-            delete_from_r2_task.delay(image_key, "event") #automatic deletion
+        if status == "rejected":
+            current_app.logger.warning(f"Event picture {image_key} rejected: {labels}")
+            if not files_removed:
+                delete_from_r2_task.delay(image_key, "event", force=True) #automatic deletion
         
         db.session.commit()
-        invalidate_event_cache(str(picture.event_id))
+        for event_id in {picture.event_id for picture in pictures}:
+            invalidate_event_cache(str(event_id))
 
     except Exception as e:
         current_app.logger.error(f"Async Event Picture Verification Error: {e}")
@@ -93,52 +146,133 @@ def verify_event_image_task(image_key):
 
 '''
 Input: user_id: <uuid/str>, image_key: <str>
-Action: Downloads the image from R2, sends it to AWS Rekognition for safety analysis, and updates the user profile picture status in the database.
+Action: Moderates the image (moderate_image) and updates the user profile picture status in the database.
 Output: None
 '''
 @shared_task(ignore_result=True)
 def verify_profile_image_task(user_id, image_key):
-    r2 = get_r2_client(permission="read")
     try:
-        r2_obj = r2.get_object(Bucket=current_app.config["BUCKET_PROFILES"], Key=image_key)
-        image_bytes = r2_obj['Body'].read()
-
-        rekognition = boto3.client(
-            'rekognition',
-            aws_access_key_id=current_app.config["AWS_ACCESS_KEY_ID"],
-            aws_secret_access_key=current_app.config["AWS_SECRET_ACCESS_KEY"],
-            region_name=current_app.config["AWS_REGION"]
-        )
-        
-        response = rekognition.detect_moderation_labels(
-            Image={'Bytes': image_bytes},
-            MinConfidence=Constants.MIN_CONFIDENCE_REKOGITION
-        )
+        status, labels, files_removed = moderate_image(image_key, current_app.config["BUCKET_PROFILES"])
 
         user = db.session.get(User, user_id)
-        if not user:
-            return
+        if user and user.profile_picture == image_key:
+            user.image_status = status
 
-        if not response['ModerationLabels']:
-            user.image_status = "approved"
-        else:
-            user.image_status = "rejected"
-            current_app.logger.warning(f"Profile picture of user {user_id} rejected: {response['ModerationLabels']}")
-            delete_from_r2_task.delay(image_key, "profile") #automatic deletion
+        if status == "rejected":
+            current_app.logger.warning(f"Profile picture of user {user_id} rejected: {labels}")
+            if not files_removed:
+                delete_from_r2_task.delay(image_key, "profile", force=True) #automatic deletion
         
         db.session.commit()
+        invalidate_user_cache(user_id)
         
     except Exception as e:
         current_app.logger.error(f"Async Profile Picture Verification Error: {e}")
         db.session.rollback()
 
 '''
-Input: image_key: <str>, image_type: <str> ("profile" or "event")
-Action: Connects to Cloudflare R2 and deletes the object from the specified bucket in the background.
+Input: staging_key: <str>, image_type: <str> ("profile" or "event"), user_id: <uuid/str> (owner of the profile picture, profile only)
+Action: Runs on the "images" queue. Downloads the original uploaded with a presigned URL from the staging bucket (files above the size limit are not downloaded), processes it with
+        validate_and_process_image, uploads the result with upload_to_r2 and always removes the staging object. The picture row (Pictures or User) still pointing at the staging key
+        is locked and moved to the final key with status "pending" (taking a reference of the object), then the moderation task is queued. An invalid file sets status "failed".
+        If the row was removed or changed in the meantime, the processed object is left unreferenced (purge_unreferenced_images_task removes it)
 Output: None
 '''
 @shared_task(ignore_result=True)
-def delete_from_r2_task(image_key, image_type="event"):
+def process_staged_image_task(staging_key, image_type="event", user_id=None):
+    started = time.monotonic()
+    r2 = get_r2_client(permission="upload")
+    staging_bucket = current_app.config["BUCKET_STAGING"]
+    max_size = Constants.MAX_PROFILE_PIC_SIZE if image_type == "profile" else Constants.MAX_EVENT_PIC_SIZE
+
+    cloud_id, error = None, None
+    try:
+        r2_obj = r2.get_object(Bucket=staging_bucket, Key=staging_key)
+        if r2_obj["ContentLength"] > max_size:
+            error = f"File too big, max size is {max_size // (1024 * 1024)}MB."
+        else:
+            processed_file, error = validate_and_process_image(io.BytesIO(r2_obj["Body"].read()), image_type)
+            if not error:
+                cloud_id = upload_to_r2(processed_file, image_type)
+                if not cloud_id:
+                    error = "Upload to S3 failed"
+    except Exception as e:
+        error = f"Staged upload unavailable: {e}"
+    finally:
+        try:
+            r2.delete_object(Bucket=staging_bucket, Key=staging_key)
+        except Exception as e:
+            current_app.logger.error(f"R2 Staging Delete Error: {e}")
+
+    try:
+        if image_type == "profile":
+            owner = db.session.get(User, user_id, with_for_update=True)
+            if owner is not None and owner.profile_picture != staging_key:
+                owner = None
+        else:
+            owner = Pictures.query.filter_by(cloud_id=staging_key).with_for_update().first()
+
+        if owner is None: #the processed object is not referenced, purge_unreferenced_images_task removes it
+            db.session.rollback()
+            current_app.logger.info(f"INFO: process_staged_image_task, picture {staging_key} was removed while processing")
+            return
+
+        if error:
+            owner.image_status = "failed"
+        elif image_type == "profile":
+            owner.profile_picture = cloud_id
+            owner.profile_picture_variants = get_variant_map(cloud_id, "profile")
+            owner.image_status = "pending"
+        else:
+            owner.cloud_id = cloud_id
+            owner.variants = get_variant_map(cloud_id, "event")
+            owner.image_status = "pending"
+        if not error:
+            acquire_image_refs([cloud_id])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"ERROR: process_staged_image_task, {staging_key} could not be recorded: {e}")
+        raise
+
+    if image_type == "profile":
+        invalidate_user_cache(user_id)
+    else:
+        invalidate_event_cache(str(owner.event_id))
+
+    metrics.observe("staged_image_seconds", time.monotonic() - started)
+    if error:
+        metrics.incr("staged_images_failed")
+        current_app.logger.warning(f"WARNING: process_staged_image_task, {image_type} picture {staging_key} failed: {error}")
+        return
+
+    metrics.incr("staged_images_processed")
+    if image_type == "profile":
+        verify_profile_image_task.delay(str(user_id), cloud_id)
+    else:
+        verify_event_image_task.delay(cloud_id)
+
+'''
+Input: r2: <boto3.client>, bucket_name: <str>, image_key: <str>, image_type: <str>
+Action: Deletes the object with its variants (one delete_objects request), or the single object of an upload made before variants existed
+Output: None
+'''
+def delete_image_files(r2, bucket_name, image_key, image_type):
+    variants = get_variant_map(image_key, image_type)
+    if variants:
+        keys = [image_key] + [key for formats in variants.values() for key in formats.values()]
+        r2.delete_objects(Bucket=bucket_name, Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True})
+    else:
+        r2.delete_object(Bucket=bucket_name, Key=image_key)
+
+'''
+Input: image_key: <str>, image_type: <str> ("profile" or "event"), force: <bool> (True for rejected pictures)
+Action: Called when a picture row stops using the object. Drops its reference (release_image_ref) and deletes the object (with its variants) from R2 only when nobody references it anymore,
+        identical uploads share one object. Objects uploaded before deduplication are deleted right away. force deletes the files whatever the references (moderation rejection)
+Output: None
+'''
+@shared_task(ignore_result=True)
+def delete_from_r2_task(image_key, image_type="event", force=False):
 
     r2 = get_r2_client(permission="upload")
     
@@ -149,6 +283,184 @@ def delete_from_r2_task(image_key, image_type="event"):
     )
     
     try:
-        r2.delete_object(Bucket=bucket_name, Key=image_key)
+        if not force:
+            tracked, removable = release_image_ref(image_key)
+            if tracked and not removable:
+                return
+        delete_image_files(r2, bucket_name, image_key, image_type)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"R2 Delete Error: {e}")
+
+'''
+Input: None (run periodically by Celery beat)
+Action: Deletes from R2 the objects nobody referenced for IMAGE_OBJECT_GRACE_SECONDS: uploads never attached to an event or profile and objects whose last reference was dropped shortly after
+        they were handed out again. Works in batches of IMAGE_OBJECT_PURGE_BATCH rows
+Output: None
+'''
+@shared_task(ignore_result=True)
+def purge_unreferenced_images_task():
+    started = time.monotonic()
+    r2 = get_r2_client(permission="upload")
+    removed = 0
+
+    while True:
+        claimed = claim_unreferenced_images(Constants.IMAGE_OBJECT_PURGE_BATCH)
+        for image_key, image_type in claimed:
+            bucket_name = current_app.config["BUCKET_PROFILES"] if image_type == "profile" else current_app.config["BUCKET_EVENTS"]
+            try:
+                delete_image_files(r2, bucket_name, image_key, image_type)
+            except Exception as e:
+                current_app.logger.error(f"R2 Delete Error: {e}")
+        removed += len(claimed)
+        if len(claimed) < Constants.IMAGE_OBJECT_PURGE_BATCH:
+            break
+
+    metrics.incr("image_objects_purged", removed)
+    current_app.logger.info(f"INFO: purge_unreferenced_images_task, removed {removed} unreferenced images in {time.monotonic() - started:.2f}s")
+
+'''
+Input: None (run periodically by Celery beat)
+Action: Removes expired rows from Token_blocklist. For the regular layout it deletes rows with expires < now() in bounded batches (no long locks).
+        When the table is partitioned by expiry, it makes sure the upcoming monthly partitions exist and drops every partition whose whole range has already expired. Logs how many rows were removed and how long it took
+Output: None
+'''
+@shared_task(ignore_result=True)
+def purge_expired_tokens_task():
+    started = time.monotonic()
+    now = datetime.now(timezone.utc)
+    table_name = TokenBlocklist.__tablename__
+
+    try:
+        if is_partitioned(table_name):
+            ensure_monthly_partitions(table_name, Constants.PARTITION_MONTHS_AHEAD)
+            dropped, removed_rows = drop_partitions_before(table_name, month_start(now))
+            mode = f"partition drop ({', '.join(dropped) or 'none'})"
+        else:
+            removed_rows = delete_in_batches(
+                TokenBlocklist,
+                TokenBlocklist.expires < now,
+                Constants.PURGE_BATCH_SIZE,
+                Constants.PURGE_MAX_BATCHES
+            )
+            mode = "batched delete"
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"ERROR: purge_expired_tokens_task, exception occured: {e}")
+        return
+
+    elapsed = time.monotonic() - started
+    current_app.logger.info(f"INFO: purge_expired_tokens_task, removed {removed_rows} expired tokens in {elapsed:.2f}s using {mode}")
+
+'''
+Input: None (run periodically by Celery beat)
+Action: Removes notifications older than their TTL (NOTIFICATION_RETENTION_DAYS_BY_TAG, NOTIFICATION_RETENTION_DAYS for the other tags).
+        When Notifications is partitioned by created_at, it makes sure the upcoming monthly partitions exist and drops (or moves to NOTIFICATION_ARCHIVE_SCHEMA) every partition
+        whose whole range is older than the longest TTL, so most rows go away without row-level DELETEs - they may stay until the end of their month.
+        Tags with a shorter TTL, and every tag of the regular layout, are deleted in bounded batches. Unread counters of deleted rows are fixed by reconcile_unread_counts_task.
+        Logs and reports ("notifications_table_bytes" gauge) the table size before and after (dropped partitions free their space at once, deleted rows only become reusable after VACUUM)
+Output: None
+'''
+@shared_task(ignore_result=True)
+def purge_notifications_task():
+    started = time.monotonic()
+    now = datetime.now(timezone.utc)
+    table_name = Notification.__tablename__
+    default_days = current_app.config["NOTIFICATION_RETENTION_DAYS"]
+    days_by_tag = {tag: current_app.config["NOTIFICATION_RETENTION_DAYS_BY_TAG"].get(tag.value, default_days) for tag in NotificationTag}
+    longest_days = max(days_by_tag.values())
+
+    try:
+        size_before = table_size(table_name)
+        removed_rows = 0
+        dropped = []
+        partitioned = is_partitioned(table_name)
+        if partitioned:
+            ensure_monthly_partitions(table_name, Constants.PARTITION_MONTHS_AHEAD)
+            dropped, removed_rows = drop_partitions_before(
+                table_name, now - timedelta(days=longest_days), current_app.config["NOTIFICATION_ARCHIVE_SCHEMA"]
+            )
+
+        for tag, days in days_by_tag.items():
+            if partitioned and days == longest_days:
+                continue
+            removed_rows += delete_in_batches(
+                Notification,
+                (Notification.tag == tag) & (Notification.created_at < now - timedelta(days=days)),
+                Constants.PURGE_BATCH_SIZE,
+                Constants.PURGE_MAX_BATCHES
+            )
+        size_after = table_size(table_name)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"ERROR: purge_notifications_task, exception occured: {e}")
+        return
+
+    metrics.set_gauge("notifications_table_bytes", size_after)
+    mode = f"partition {'archive' if current_app.config['NOTIFICATION_ARCHIVE_SCHEMA'] else 'drop'} ({', '.join(dropped) or 'none'}) + batched delete" if partitioned else "batched delete"
+    elapsed = time.monotonic() - started
+    current_app.logger.info(
+        f"INFO: purge_notifications_task, removed {removed_rows} notifications in {elapsed:.2f}s using {mode}, "
+        f"table size {size_before / 1048576:.1f} MB -> {size_after / 1048576:.1f} MB"
+    )
+
+'''
+Input: None (run by Celery beat every OUTBOX_RELAY_INTERVAL seconds)
+Action: Publishes the pending Outbox messages to the broker (see relay_outbox)
+Output: None
+'''
+@shared_task(ignore_result=True)
+def relay_outbox_task():
+    try:
+        published = relay_outbox(Constants.OUTBOX_BATCH_SIZE, Constants.OUTBOX_MAX_BATCHES)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"ERROR: relay_outbox_task, exception occured: {e}")
+        return
+
+    if published:
+        current_app.logger.info(f"INFO: relay_outbox_task, published {published} outbox messages")
+
+'''
+Input: None (run periodically by Celery beat)
+Action: Deletes Outbox messages published more than OUTBOX_RETENTION_DAYS ago in bounded batches (until then they can be replayed with "flask outbox-replay")
+Output: None
+'''
+@shared_task(ignore_result=True)
+def purge_outbox_task():
+    cutoff = datetime.now(timezone.utc) - timedelta(days=Constants.OUTBOX_RETENTION_DAYS)
+    removed_rows = delete_in_batches(
+        OutboxMessage,
+        OutboxMessage.published_at < cutoff,
+        Constants.PURGE_BATCH_SIZE,
+        Constants.PURGE_MAX_BATCHES
+    )
+    current_app.logger.info(f"INFO: purge_outbox_task, removed {removed_rows} published outbox messages")
+
+'''
+Input: None (run periodically by Celery beat)
+Action: Compares every cached unread notification counter with the database and fixes the ones that drifted (ex. a Redis error during an adjustment), UNREAD_RECONCILE_BATCH users per query
+Output: None
+'''
+@shared_task(ignore_result=True)
+def reconcile_unread_counts_task():
+    checked = 0
+    fixed = 0
+    batch = []
+    try:
+        for key in redis_client.scan_iter(match=get_unread_count_key("*"), count=Constants.UNREAD_RECONCILE_BATCH):
+            batch.append(key.rsplit(":", 1)[1])
+            if len(batch) >= Constants.UNREAD_RECONCILE_BATCH:
+                fixed += reconcile_unread_counts(batch)
+                checked += len(batch)
+                batch = []
+        fixed += reconcile_unread_counts(batch)
+        checked += len(batch)
+        db.session.commit()
     except Exception as e:
-        current_app.logger.error(f"R2 Delete Error: {e}")
\ No newline at end of file
+        db.session.rollback()
+        current_app.logger.error(f"ERROR: reconcile_unread_counts_task, exception occured: {e}")
+        return
+
+    current_app.logger.info(f"INFO: reconcile_unread_counts_task, checked {checked} unread counters, fixed {fixed}")
@@ -1,7 +1,7 @@
 import pytest
 from backend import create_app
 from backend.extensions import db, mail
-from backend.models import User, TokenBlocklist, Friendship, FriendRequest, Event
+from backend.models import User, TokenBlocklist, Friendship, FriendRequest, Event, ImageObject
 from backend.helpers import add_token_to_db
 from flask_jwt_extended import create_access_token
 from datetime import datetime, timezone, timedelta
@@ -35,7 +35,7 @@ def rollback_db(app):
     """Clean database rows after each test."""
     yield  
     db.session.rollback()  
-    for model in [User, TokenBlocklist, Friendship, FriendRequest, Event]:
+    for model in [User, TokenBlocklist, Friendship, FriendRequest, Event, ImageObject]:
         db.session.query(model).delete() 
     db.session.commit()
     try:
@@ -49,7 +49,7 @@ def cleanup_all(app):
     yield
     with app.app_context():
         db.session.rollback()
-        for model in [User, TokenBlocklist, Friendship, FriendRequest, Event]:
+        for model in [User, TokenBlocklist, Friendship, FriendRequest, Event, ImageObject]:
             db.session.query(model).delete()
         db.session.commit()
         try:
@@ -131,7 +131,7 @@ def event(client, logged_in_user):
 @pytest.fixture(autouse=True)
 def mock_aws_and_r2():
     with patch("backend.tasks.get_r2_client") as mock_r2_client_func, \
-         patch("backend.tasks.boto3.client") as mock_boto_client_func, \
+         patch("backend.moderation.get_rekognition_client") as mock_rekognition_client_func, \
          patch("backend.routes.user_routes.delete_from_r2_task.delay"), \
          patch("backend.routes.event_routes.delete_from_r2_task.delay"):
 
@@ -142,7 +142,7 @@ def mock_aws_and_r2():
         }
 
         mock_rekognition = MagicMock()
-        mock_boto_client_func.return_value = mock_rekognition
+        mock_rekognition_client_func.return_value = mock_rekognition
         
         mock_rekognition.detect_moderation_labels.return_value = {'ModerationLabels': []}
 
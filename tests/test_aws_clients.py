@@ -0,0 +1,45 @@
+import threading
+from unittest.mock import patch, MagicMock
+from backend.aws_clients import get_client, reset_clients
+
+# =============================================================================
+# Tests for the per-process boto3 client registry
+# =============================================================================
+
+@patch("backend.aws_clients.boto3.session.Session")
+def test_get_client_reuses_client_per_service_and_permission(mock_session, app):
+    mock_session.return_value.client.side_effect = lambda *args, **kwargs: MagicMock()
+    reset_clients()
+
+    read_client = get_client("s3", "read")
+    assert get_client("s3", "read") is read_client
+    assert get_client("s3", "upload") is not read_client
+    assert get_client("rekognition") is get_client("rekognition")
+    assert mock_session.return_value.client.call_count == 3
+
+    upload_kwargs = mock_session.return_value.client.call_args_list[1].kwargs
+    assert upload_kwargs["aws_access_key_id"] == app.config["CF_R2_ACCESS_KEY_ID_UPLOAD"]
+    assert upload_kwargs["config"].max_pool_connections > 1
+
+    reset_clients()
+    assert get_client("s3", "read") is not read_client
+
+@patch("backend.aws_clients.boto3.session.Session")
+def test_get_client_creates_one_client_under_concurrency(mock_session, app):
+    mock_session.return_value.client.side_effect = lambda *args, **kwargs: MagicMock()
+    reset_clients()
+    clients = []
+
+    def worker():
+        with app.app_context():
+            clients.append(get_client("s3", "read"))
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in clients}) == 1
+    assert mock_session.return_value.client.call_count == 1
+    reset_clients()
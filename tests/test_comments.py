@@ -281,4 +281,119 @@ def test_comment_structure_with_usernames(client, logged_in_user, event, app):
         assert len(comments[0]["replies"]) == 1
         reply = comments[0]["replies"][0]
         assert reply["content"] == "Child"
-        assert reply["username"] == user.username
\ No newline at end of file
+        assert reply["username"] == user.username
+# =============================================================================
+# Tests for the comment tree builder and thread pages
+# =============================================================================
+
+def add_comment(user, event, content, parent=None):
+    comment = Comment(user_id=user.user_id, event_id=event.event_id, content=content,
+                      parent_comment_id=parent.comment_id if parent else None)
+    db.session.add(comment)
+    db.session.commit()
+    return comment
+
+def test_get_comments_does_not_lazy_load_replies(client, logged_in_user, event, app):
+    from sqlalchemy import event as sa_event
+
+    with app.app_context():
+        user, token = logged_in_user
+        for i in range(5):
+            parent = add_comment(user, event, f"Root {i}")
+            for j in range(3):
+                add_comment(user, event, f"Reply {i}.{j}", parent)
+        event_id = event.event_id
+
+        statements = []
+        def count(conn, cursor, statement, *args):
+            if "Comments" in statement:
+                statements.append(statement)
+
+        engine = db.engines[None]
+        sa_event.listen(engine, "before_cursor_execute", count)
+        readonly = db.engines.get("readonly")
+        if readonly is not None and readonly is not engine:
+            sa_event.listen(readonly, "before_cursor_execute", count)
+        try:
+            response = client.get(f"/api/comments/event/{event_id}", headers={"Authorization": f"Bearer {token}"})
+        finally:
+            sa_event.remove(engine, "before_cursor_execute", count)
+            if readonly is not None and readonly is not engine:
+                sa_event.remove(readonly, "before_cursor_execute", count)
+
+        comments = response.get_json()["comments"]
+        assert [c["content"] for c in comments] == [f"Root {i}" for i in range(5)]
+        assert all(len(c["replies"]) == 3 for c in comments)
+        assert len(statements) == 1
+
+def test_get_comments_thread_pages(client, logged_in_user, event, app):
+    with app.app_context():
+        user, token = logged_in_user
+        for i in range(5):
+            add_comment(user, event, f"Root {i}")
+
+        headers = {"Authorization": f"Bearer {token}"}
+        seen = []
+        cursor = ""
+        while True:
+            data = client.get(f"/api/comments/event/{event.event_id}?cursor={cursor}&limit=2", headers=headers).get_json()
+            seen += [c["content"] for c in data["comments"]]
+            if not data["pagination"]["has_next"]:
+                break
+            cursor = data["pagination"]["next_cursor"]
+
+        assert seen == [f"Root {i}" for i in range(5)]
+
+def test_get_comments_reply_limit_and_depth(client, logged_in_user, event, app):
+    with app.app_context():
+        user, token = logged_in_user
+        root = add_comment(user, event, "Root")
+        replies = [add_comment(user, event, f"Reply {i}", root) for i in range(4)]
+        deep = add_comment(user, event, "Deep", replies[0])
+        add_comment(user, event, "Deeper", deep)
+
+        response = client.get(f"/api/comments/event/{event.event_id}?cursor=&reply_depth=2&reply_limit=3",
+                              headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        thread = response.get_json()["comments"][0]
+
+        assert [r["content"] for r in thread["replies"]] == ["Reply 0", "Reply 1", "Reply 2"]
+        assert thread["has_more_replies"] is True
+
+        first_reply = thread["replies"][0]
+        assert [r["content"] for r in first_reply["replies"]] == ["Deep"]
+        assert first_reply["has_more_replies"] is False
+        # "Deeper" is below reply_depth
+        assert first_reply["replies"][0]["replies"] == []
+        assert first_reply["replies"][0]["has_more_replies"] is True
+        assert thread["replies"][1]["has_more_replies"] is False
+
+def test_get_comment_replies_pages(client, logged_in_user, event, app):
+    with app.app_context():
+        user, token = logged_in_user
+        root = add_comment(user, event, "Root")
+        for i in range(4):
+            add_comment(user, event, f"Reply {i}", root)
+
+        headers = {"Authorization": f"Bearer {token}"}
+        data = client.get(f"/api/comments/replies/{root.comment_id}?limit=3", headers=headers).get_json()
+        assert [r["content"] for r in data["comments"]] == ["Reply 0", "Reply 1", "Reply 2"]
+        assert data["pagination"]["has_next"] is True
+
+        cursor = data["pagination"]["next_cursor"]
+        data = client.get(f"/api/comments/replies/{root.comment_id}?limit=3&cursor={cursor}", headers=headers).get_json()
+        assert [r["content"] for r in data["comments"]] == ["Reply 3"]
+        assert data["pagination"]["has_next"] is False
+
+def test_get_comments_invalid_cursor(client, logged_in_user, event, app):
+    with app.app_context():
+        token = logged_in_user[1]
+        response = client.get(f"/api/comments/event/{event.event_id}?cursor=nope", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 400
+        assert response.get_json()["message"] == "Invalid cursor"
+
+def test_get_comment_replies_not_exist(client, logged_in_user, app):
+    with app.app_context():
+        token = logged_in_user[1]
+        response = client.get(f"/api/comments/replies/{uuid.uuid4()}", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 404
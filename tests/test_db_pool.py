@@ -0,0 +1,56 @@
+import pytest
+from backend.db_pool import build_engine_options, InstrumentedNullPool, InstrumentedQueuePool
+from backend import metrics
+
+# =============================================================================
+# Tests for engine pool modes and metrics
+# =============================================================================
+
+def test_null_mode():
+    assert build_engine_options("null") == {"poolclass": InstrumentedNullPool}
+
+def test_queue_mode():
+    options = build_engine_options("queue", pool_size=3, max_overflow=2, pool_recycle=600, pool_timeout=5)
+
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == 2
+    assert options["pool_recycle"] == 600
+    assert options["pool_pre_ping"] is True
+
+def test_pgbouncer_mode():
+    options = build_engine_options("pgbouncer", pool_recycle=1800)
+
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_reset_on_return"] == "rollback"
+    assert options["pool_recycle"] <= 300
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        build_engine_options("session")
+
+def test_metrics_counters_and_observations(app):
+    metrics.incr("test_counter", 2)
+    metrics.observe("test_latency", 0.5)
+    metrics.observe("test_latency", 1.5)
+
+    data = metrics.get_metrics()
+
+    assert data["counters"]["test_counter"] == 2
+    assert data["counters"]["test_latency:count"] == 2
+    assert data["counters"]["test_latency:sum"] == 2.0
+
+def test_metrics_endpoint_requires_token(app, client):
+    app.config["METRICS_TOKEN"] = None
+    assert client.get("/api/metrics").status_code == 404
+
+    app.config["METRICS_TOKEN"] = "secret"
+    try:
+        assert client.get("/api/metrics", headers={"X-Metrics-Token": "wrong"}).status_code == 403
+
+        response = client.get("/api/metrics", headers={"X-Metrics-Token": "secret"})
+        assert response.status_code == 200
+        assert "counters" in response.get_json()
+        assert "gauges" in response.get_json()
+    finally:
+        app.config["METRICS_TOKEN"] = None
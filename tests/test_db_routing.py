@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import select, update, text
+from backend.models import User
+from backend.extensions import db, redis_client
+from backend import db_routing
+from backend.db_routing import use_replica, replica_available, pin_to_primary, is_pinned_to_primary, get_primary_pin_key
+
+# =============================================================================
+# Tests for read replica routing
+# =============================================================================
+
+@pytest.fixture
+def clean_session(app):
+    session = db.session()
+    saved = dict(session.info)
+    session.info.clear()
+    db_routing._replica_state["checked_at"] = 0.0
+    yield session
+    session.info.clear()
+    session.info.update(saved)
+    db_routing._replica_state["checked_at"] = 0.0
+
+def test_readonly_bind_configured(app):
+    assert "readonly" in db.engines
+
+def test_selects_go_to_replica_in_replica_mode(app, clean_session):
+    with use_replica() as enabled:
+        assert enabled is True
+        assert clean_session.get_bind(clause=select(User)) is db.engines["readonly"]
+
+    assert clean_session.get_bind(clause=select(User)) is db.engines[None]
+
+def test_writes_and_locks_go_to_primary(app, clean_session):
+    with use_replica():
+        assert clean_session.get_bind(clause=select(User).with_for_update()) is db.engines[None]
+        assert clean_session.get_bind(clause=text("SELECT 1")) is db.engines[None]
+        assert clean_session.get_bind(clause=update(User).values(year=1)) is db.engines[None]
+        # after a write the session sticks to the primary
+        assert clean_session.get_bind(clause=select(User)) is db.engines[None]
+
+def test_lagging_replica_falls_back_to_primary(app, clean_session):
+    app.config["REPLICA_MAX_LAG"] = -1
+    try:
+        assert replica_available() is False
+        with use_replica() as enabled:
+            assert enabled is False
+            assert clean_session.get_bind(clause=select(User)) is db.engines[None]
+    finally:
+        app.config["REPLICA_MAX_LAG"] = 2
+
+def test_pin_to_primary(app, registered_user):
+    user, _ = registered_user
+
+    assert is_pinned_to_primary(user.user_id) is False
+    pin_to_primary(user.user_id)
+    assert is_pinned_to_primary(user.user_id) is True
+    assert redis_client.ttl(get_primary_pin_key(user.user_id)) <= app.config["REPLICA_PIN_SECONDS"]
+
+def test_read_only_endpoint_after_write(client, logged_in_user):
+    user, token = logged_in_user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.put("/api/users/update_profile", json={"description": "fresh"}, headers=headers)
+    assert response.status_code == 200
+
+    response = client.get(f"/api/users/profile/{user.user_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["description"] == "fresh"
+
+def test_write_without_readonly_bind_does_not_pin(client, logged_in_user):
+    user, token = logged_in_user
+    readonly_engine = db.engines.pop("readonly")
+    try:
+        response = client.put("/api/users/update_profile", json={"description": "fresh"}, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        assert redis_client.exists(get_primary_pin_key(user.user_id)) == 0
+    finally:
+        db.engines["readonly"] = readonly_engine
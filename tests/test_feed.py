@@ -345,4 +345,173 @@ def test_friends_filter_no_friends(client, logged_in_user, app):
         db.session.commit()
 
     res = client.get("/api/events/feed?friends_only=true", headers=headers)
-    assert len(res.get_json()["data"]) == 0
\ No newline at end of file
+    assert len(res.get_json()["data"]) == 0
+# =============================================================================
+# Tests for feed cursor (keyset) pagination
+# =============================================================================
+
+def test_feed_cursor_walks_all_pages(client, logged_in_user, app):
+    with app.app_context():
+        user, token = logged_in_user
+        for i in range(25):
+            db.session.add(Event(event_name=f"E{i}", location="X", creator_id=user.user_id, is_private=False))
+        db.session.commit()
+
+        seen = []
+        cursor = ""
+        while True:
+            response = client.get(f"/api/events/feed?cursor={cursor}&limit=10", headers=get_auth_header(token))
+            assert response.status_code == 200
+            data = response.get_json()
+            seen.extend(e["id"] for e in data["data"])
+            if not data["pagination"]["has_next"]:
+                assert data["pagination"]["next_cursor"] is None
+                break
+            cursor = data["pagination"]["next_cursor"]
+
+        assert len(seen) == 25
+        assert len(set(seen)) == 25
+
+def test_feed_cursor_members_desc(client, logged_in_user, app):
+    with app.app_context():
+        user, token = logged_in_user
+        for count in [3, 7, 1, 7, 5]:
+            db.session.add(Event(event_name=f"M{count}", location="X", creator_id=user.user_id, is_private=False, participant_count=count))
+        db.session.commit()
+
+        response = client.get("/api/events/feed?cursor=&limit=2&sort_mode=members_desc", headers=get_auth_header(token))
+        first = response.get_json()
+        assert [e["name"] for e in first["data"]] == ["M7", "M7"]
+
+        cursor = first["pagination"]["next_cursor"]
+        response = client.get(f"/api/events/feed?cursor={cursor}&limit=10&sort_mode=members_desc", headers=get_auth_header(token))
+        rest = response.get_json()
+        assert [e["name"] for e in rest["data"]] == ["M5", "M3", "M1"]
+        assert rest["pagination"]["has_next"] is False
+
+def test_feed_cursor_invalid(client, logged_in_user, app):
+    with app.app_context():
+        user, token = logged_in_user
+        response = client.get("/api/events/feed?cursor=not-a-cursor", headers=get_auth_header(token))
+        assert response.status_code == 400
+
+def test_feed_cursor_sort_mode_mismatch(client, logged_in_user, app):
+    with app.app_context():
+        user, token = logged_in_user
+        for i in range(3):
+            db.session.add(Event(event_name=f"E{i}", location="X", creator_id=user.user_id, is_private=False))
+        db.session.commit()
+
+        response = client.get("/api/events/feed?cursor=&limit=1", headers=get_auth_header(token))
+        cursor = response.get_json()["pagination"]["next_cursor"]
+
+        response = client.get(f"/api/events/feed?cursor={cursor}&sort_mode=comments_desc", headers=get_auth_header(token))
+        assert response.status_code == 400
+
+def test_feed_cursor_approximate_total(client, logged_in_user, app):
+    with app.app_context():
+        user, token = logged_in_user
+        db.session.add(Event(event_name="E1", location="X", creator_id=user.user_id, is_private=False))
+        db.session.commit()
+
+        response = client.get("/api/events/feed?cursor=&total=approx", headers=get_auth_header(token))
+        pagination = response.get_json()["pagination"]
+        assert isinstance(pagination["total"], int)
+        assert pagination["total_is_estimate"] is True
+        assert "pages" not in pagination
+
+# =============================================================================
+# Tests for batched feed hydration
+# =============================================================================
+
+def test_feed_hydration_writes_back_and_reuses_cache(client, logged_in_user, app):
+    from backend.extensions import redis_client
+    from backend.helpers import get_event_cache_key
+    from unittest.mock import patch
+
+    with app.app_context():
+        user, token = logged_in_user
+        events = [Event(event_name=f"H{i}", location="X", creator_id=user.user_id, is_private=False) for i in range(3)]
+        db.session.add_all(events)
+        db.session.commit()
+
+        first = client.get("/api/events/feed", headers=get_auth_header(token)).get_json()["data"]
+        for event in events:
+            assert redis_client.get(get_event_cache_key(str(event.event_id))) is not None
+
+        with patch("backend.routes.event_getters.serialize_event_payload") as mock_serialize:
+            second = client.get("/api/events/feed", headers=get_auth_header(token)).get_json()["data"]
+            mock_serialize.assert_not_called()
+
+        assert [e["id"] for e in first] == [e["id"] for e in second]
+        assert all(e["is_joined"] for e in second)
+
+def test_feed_hydration_partial_cache(client, logged_in_user, app):
+    from backend.extensions import redis_client
+    from backend.helpers import get_event_cache_key
+
+    with app.app_context():
+        user, token = logged_in_user
+        events = [Event(event_name=f"P{i}", location="X", creator_id=user.user_id, is_private=False, participant_count=i) for i in range(4)]
+        db.session.add_all(events)
+        db.session.commit()
+
+        client.get("/api/events/feed", headers=get_auth_header(token))
+        redis_client.delete(get_event_cache_key(str(events[1].event_id)))
+
+        response = client.get("/api/events/feed?sort_mode=members_desc", headers=get_auth_header(token))
+        names = [e["name"] for e in response.get_json()["data"]]
+        assert names == ["P3", "P2", "P1", "P0"]
+
+def test_feed_search_prefix_unaccent_and_typo(client, logged_in_user, app):
+    with app.app_context():
+        user, token = logged_in_user
+        db.session.add_all([
+            Event(event_name="Mecz Wisły", description="Derby Krakowa", location="Stadion", creator_id=user.user_id, is_private=False),
+            Event(event_name="Koncert", description="Muzyka na żywo", location="AGH", creator_id=user.user_id, is_private=False),
+        ])
+        db.session.commit()
+
+        for q in ("Mec", "wisly", "wislu", "krakow", "zywo"):
+            response = client.get(f"/api/events/feed?q={q}", headers=get_auth_header(token))
+            assert response.status_code == 200
+            names = [e["name"] for e in response.get_json()["data"]]
+            assert names == (["Koncert"] if q == "zywo" else ["Mecz Wisły"]), q
+
+def test_feed_search_relevance_sort(client, logged_in_user, app):
+    with app.app_context():
+        user, token = logged_in_user
+        db.session.add_all([
+            Event(event_name="Spotkanie", description="Po spotkaniu idziemy na grill", location="X", creator_id=user.user_id, is_private=False),
+            Event(event_name="Grill", description="Grill w akademiku", location="X", creator_id=user.user_id, is_private=False),
+        ])
+        db.session.commit()
+
+        response = client.get("/api/events/feed?q=grill&sort_mode=relevance", headers=get_auth_header(token))
+        assert response.status_code == 200
+        names = [e["name"] for e in response.get_json()["data"]]
+        assert names == ["Grill", "Spotkanie"]
+
+def test_feed_search_respects_visibility(client, logged_in_user, registered_friend, app):
+    with app.app_context():
+        user, token = logged_in_user
+        friend, _ = registered_friend
+        db.session.add_all([
+            Event(event_name="Tajny grill", location="X", creator_id=friend.user_id, is_private=True),
+            Event(event_name="Otwarty grill", location="X", creator_id=friend.user_id, is_private=False),
+        ])
+        db.session.commit()
+
+        response = client.get("/api/events/feed?q=grill", headers=get_auth_header(token))
+        names = [e["name"] for e in response.get_json()["data"]]
+        assert names == ["Otwarty grill"]
+
+def test_feed_search_punctuation_only(client, logged_in_user, app):
+    with app.app_context():
+        user, token = logged_in_user
+        db.session.add(Event(event_name="C++ warsztaty", location="X", creator_id=user.user_id, is_private=False))
+        db.session.commit()
+
+        response = client.get("/api/events/feed?q=%2B%2B", headers=get_auth_header(token))
+        assert response.status_code == 200
+        assert [e["name"] for e in response.get_json()["data"]] == ["C++ warsztaty"]
@@ -0,0 +1,144 @@
+import io
+from datetime import datetime, timezone, timedelta
+from unittest.mock import patch
+from backend.extensions import db
+from backend.models import ImageObject
+from backend.models.event import Pictures
+
+def processed(content=b"poster"):
+    return {"image": io.BytesIO(content), "variants": [(256, "webp", io.BytesIO(b"small"))], "perceptual_hash": "0f0f0f0f0f0f0f0f"}
+
+def add_image_object(cloud_id, ref_count=0, moderation_status="pending", perceptual_hash=None, last_used_at=None):
+    db.session.add(ImageObject(
+        cloud_id=cloud_id,
+        image_type="event",
+        content_hash=cloud_id.ljust(64, "0"),
+        perceptual_hash=perceptual_hash,
+        moderation_status=moderation_status,
+        ref_count=ref_count,
+        last_used_at=last_used_at or datetime.now(timezone.utc)
+    ))
+    db.session.commit()
+
+def create_event(client, token, cloud_ids):
+    payload = {
+        "name": "poster event",
+        "description": "same poster everywhere",
+        "date": (datetime.now() + timedelta(days=30)).strftime("%d.%m.%Y"),
+        "time": "18:00",
+        "location": "here",
+        "is_private": False,
+        "pictures": [{"cloud_id": cloud_id} for cloud_id in cloud_ids]
+    }
+    response = client.post("/api/events/create", json=payload, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+    return response.get_json()["event_id"]
+
+def test_upload_reuses_identical_content(app):
+    from backend.picture_helpers import upload_to_r2
+
+    with app.app_context(), patch("backend.picture_helpers.get_r2_client") as mock_client_func:
+        s3 = mock_client_func.return_value
+
+        first = upload_to_r2(processed(), "event")
+        second = upload_to_r2(processed(), "event")
+        profile = upload_to_r2(processed(), "profile")
+
+        assert first == second
+        assert profile != first
+        assert s3.upload_fileobj.call_count == 4
+        image_object = db.session.get(ImageObject, first)
+        assert image_object.perceptual_hash == "0f0f0f0f0f0f0f0f"
+        assert image_object.ref_count == 0
+
+def test_delete_keeps_object_until_last_reference(app, mock_aws_and_r2):
+    from backend.tasks import delete_from_r2_task
+    mock_r2, _ = mock_aws_and_r2
+
+    with app.app_context():
+        add_image_object("shared/orig.jpg", ref_count=2, last_used_at=datetime.now(timezone.utc) - timedelta(days=2))
+
+        delete_from_r2_task("shared/orig.jpg", "event")
+        db.session.expire_all()
+        assert db.session.get(ImageObject, "shared/orig.jpg").ref_count == 1
+        mock_r2.delete_objects.assert_not_called()
+
+        delete_from_r2_task("shared/orig.jpg", "event")
+        db.session.expire_all()
+        assert db.session.get(ImageObject, "shared/orig.jpg") is None
+        keys = {obj["Key"] for obj in mock_r2.delete_objects.call_args.kwargs["Delete"]["Objects"]}
+        assert "shared/orig.jpg" in keys and "shared/w640.webp" in keys
+
+def test_recently_uploaded_object_is_purged_later(app, mock_aws_and_r2):
+    from backend.tasks import delete_from_r2_task, purge_unreferenced_images_task
+    mock_r2, _ = mock_aws_and_r2
+
+    with app.app_context():
+        add_image_object("fresh/orig.jpg", ref_count=1)
+
+        delete_from_r2_task("fresh/orig.jpg", "event")
+        db.session.expire_all()
+        assert db.session.get(ImageObject, "fresh/orig.jpg").ref_count == 0
+        mock_r2.delete_objects.assert_not_called()
+
+        db.session.get(ImageObject, "fresh/orig.jpg").last_used_at = datetime.now(timezone.utc) - timedelta(days=2)
+        db.session.commit()
+        purge_unreferenced_images_task()
+
+        db.session.expire_all()
+        assert db.session.get(ImageObject, "fresh/orig.jpg") is None
+        mock_r2.delete_objects.assert_called_once()
+
+def test_shared_picture_is_moderated_once(client, logged_in_user, app, mock_aws_and_r2):
+    _, token = logged_in_user
+    _, mock_rekognition = mock_aws_and_r2
+
+    with app.app_context():
+        add_image_object("poster/orig.jpg")
+
+    first_event = create_event(client, token, ["poster/orig.jpg"])
+    second_event = create_event(client, token, ["poster/orig.jpg"])
+
+    assert mock_rekognition.detect_moderation_labels.call_count == 1
+    with app.app_context():
+        image_object = db.session.get(ImageObject, "poster/orig.jpg")
+        assert image_object.ref_count == 2
+        assert image_object.moderation_status == "approved"
+        for event_id in (first_event, second_event):
+            assert Pictures.query.filter_by(event_id=event_id).one().image_status == "approved"
+
+def test_flat_picture_is_not_rejected_by_perceptual_hash(client, logged_in_user, app, mock_aws_and_r2):
+    from backend.tasks import delete_from_r2_task
+    _, token = logged_in_user
+    _, mock_rekognition = mock_aws_and_r2
+
+    # two different flat posters share the all-zero dHash, only the first one was rejected
+    with app.app_context():
+        add_image_object("rejected-poster/orig.jpg", moderation_status="rejected", perceptual_hash="0000000000000000")
+        add_image_object("other-poster/orig.jpg", perceptual_hash="0000000000000000")
+
+    event_id = create_event(client, token, ["other-poster/orig.jpg"])
+
+    assert mock_rekognition.detect_moderation_labels.call_count == 1
+    with app.app_context():
+        assert Pictures.query.filter_by(event_id=event_id).one().image_status == "approved"
+        assert db.session.get(ImageObject, "other-poster/orig.jpg").moderation_status == "approved"
+    delete_from_r2_task.delay.assert_not_called()
+
+def test_failed_edit_keeps_the_reference(client, logged_in_user, app, mock_aws_and_r2):
+    from sqlalchemy.exc import SQLAlchemyError
+    from backend.tasks import delete_from_r2_task
+    _, token = logged_in_user
+
+    with app.app_context():
+        add_image_object("kept/orig.jpg")
+    event_id = create_event(client, token, ["kept/orig.jpg"])
+
+    with patch("backend.routes.event_routes.db.session.commit", side_effect=SQLAlchemyError("commit failed")):
+        response = client.put(f"/api/events/edit/{event_id}", json={"pictures": []}, headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 500
+    delete_from_r2_task.delay.assert_not_called()
+    with app.app_context():
+        assert Pictures.query.filter_by(event_id=event_id).count() == 1
+        assert db.session.get(ImageObject, "kept/orig.jpg").ref_count == 1
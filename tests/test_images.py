@@ -12,6 +12,16 @@ TINY_JPG = base64.b64decode(
     "AAAAAAAAAAAAAP/aAAgBAQAGPwJ//8QAFBABAAAAAAAAAAAAAAAAAAAAAP/aAAgBAQABPyF//9k="
 )
 
+def process_by_filename(file, image_type):
+    """Stands in for validate_and_process_image, the processed data names the file it came from."""
+    return io.BytesIO(file.filename.encode()), None
+
+def upload_by_content(cloud_ids):
+    """Stands in for upload_to_r2, the result is looked up by the processed data (the upload pool runs in any order)."""
+    def upload(processed_file, image_type):
+        return cloud_ids[processed_file.getvalue().decode()]
+    return upload
+
 @patch('backend.routes.picture_routes.validate_and_process_image')
 @patch('backend.routes.picture_routes.upload_to_r2')
 def test_upload_file_success(mock_upload_to_r2, mock_validate, client, logged_in_user, app):
@@ -45,8 +55,8 @@ def test_upload_batch_success(mock_upload_to_r2, mock_validate, client, logged_i
     with app.app_context():
         user, user_token = logged_in_user
 
-        mock_upload_to_r2.side_effect = ['id_1.jpg', 'id_2.jpg']
-        mock_validate.return_value = (io.BytesIO(b"fake_processed_data"), None)
+        mock_upload_to_r2.side_effect = upload_by_content({'test1.jpg': 'id_1.jpg', 'test2.jpg': 'id_2.jpg'})
+        mock_validate.side_effect = process_by_filename
 
         data = {
             'files': [
@@ -109,8 +119,8 @@ def test_upload_batch_partial_failure(mock_upload_to_r2, mock_validate, client,
     with app.app_context():
         user, user_token = logged_in_user
 
-        mock_upload_to_r2.side_effect = ['success_id.jpg', None]
-        mock_validate.return_value = (io.BytesIO(b"fake_processed_data"), None)
+        mock_upload_to_r2.side_effect = upload_by_content({'good.jpg': 'success_id.jpg', 'bad.jpg': None})
+        mock_validate.side_effect = process_by_filename
 
         data = {
             'files': [
@@ -132,6 +142,7 @@ def test_upload_batch_partial_failure(mock_upload_to_r2, mock_validate, client,
         assert len(json_data['pictures']) == 1
         assert len(json_data['errors']) == 1
         assert json_data['pictures'][0]['cloud_id'] == 'success_id.jpg'
+        assert json_data['errors'][0]['filename'] == 'bad.jpg'
         assert "Some pictures failed to upload" in json_data['message']
 
 @patch('backend.routes.picture_routes.validate_and_process_image')
@@ -164,3 +175,175 @@ def test_upload_file_no_file(client, logged_in_user):
 
     assert response.status_code == 400
     assert "No file provided" in response.get_json()['message']
+
+@patch('backend.routes.picture_routes.validate_and_process_image')
+@patch('backend.routes.picture_routes.upload_to_r2')
+def test_upload_batch_processes_files_in_parallel(mock_upload_to_r2, mock_validate, client, logged_in_user, app):
+    """Two files are processed at the same time (both wait on one barrier), a failing worker is reported for its own file."""
+    import threading
+    barrier = threading.Barrier(2, timeout=5)
+
+    def process(file, image_type):
+        if file.filename == 'broken.jpg':
+            raise ValueError("decoder crashed")
+        barrier.wait()
+        return process_by_filename(file, image_type)
+
+    with app.app_context():
+        user, user_token = logged_in_user
+        mock_validate.side_effect = process
+        mock_upload_to_r2.side_effect = upload_by_content({'first.jpg': 'id_1.jpg', 'second.jpg': 'id_2.jpg'})
+
+        data = {
+            'files': [
+                (io.BytesIO(TINY_JPG), 'first.jpg'),
+                (io.BytesIO(TINY_JPG), 'second.jpg'),
+                (io.BytesIO(TINY_JPG), 'broken.jpg'),
+            ]
+        }
+        response = client.post("/api/pictures/upload-batch", data=data, headers={"Authorization": f"Bearer {user_token}"})
+
+        assert response.status_code == 201
+        json_data = response.get_json()
+        assert [p['cloud_id'] for p in json_data['pictures']] == ['id_1.jpg', 'id_2.jpg']
+        assert json_data['errors'] == [{"filename": "broken.jpg", "error": "decoder crashed"}]
+
+# =============================================================================
+# Tests for the image processing pipeline
+# =============================================================================
+
+def make_image_file(size, image_format="JPEG", mode="RGB", orientation=None):
+    from PIL import Image
+    img = Image.new(mode, size, color=1 if mode == "P" else (200, 30, 30))
+    output = io.BytesIO()
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        img.save(output, format=image_format, exif=exif)
+    else:
+        img.save(output, format=image_format)
+    output.seek(0)
+    return output
+
+def test_process_image_applies_exif_orientation(app):
+    from PIL import Image
+    from backend.picture_helpers import validate_and_process_image
+
+    with app.app_context():
+        output, error = validate_and_process_image(make_image_file((4000, 3000), orientation=6), "event")
+
+        assert error is None
+        result = Image.open(output["image"])
+        assert result.format == "JPEG"
+        assert result.height == 1080 and result.width < result.height
+        assert result.getexif().get(0x0112) is None
+
+def test_process_image_reports_memory_of_the_image(app):
+    from backend.picture_helpers import validate_and_process_image
+
+    with app.app_context(), patch("backend.picture_helpers.metrics") as mock_metrics:
+        output, error = validate_and_process_image(make_image_file((4000, 3000)), "event")
+
+        assert error is None
+        observed = {c.args[0]: c.args[1] for c in mock_metrics.observe.call_args_list}
+        # the 4000x3000 JPEG is drafted to 2000x1500 (DCT scale 1/2) before the resize to 1440x1080
+        assert observed["image_decoded_bytes"] == 2000 * 1500 * 3
+        assert observed["image_working_bytes"] > observed["image_decoded_bytes"] + 1440 * 1080 * 3
+        mock_metrics.set_gauge.assert_called_once()
+        assert mock_metrics.set_gauge.call_args.args[0] == "process_peak_rss_bytes"
+
+def test_process_image_rejects_pixel_budget(app):
+    from backend.picture_helpers import validate_and_process_image
+
+    with app.app_context(), patch("backend.picture_helpers.Constants.MAX_IMAGE_PIXELS", 1000):
+        output, error = validate_and_process_image(make_image_file((100, 100), "PNG"), "event")
+
+        assert output is None
+        assert "Image too large" in error
+
+def test_process_image_palette_png(app):
+    from PIL import Image
+    from backend.picture_helpers import validate_and_process_image
+
+    with app.app_context():
+        output, error = validate_and_process_image(make_image_file((1200, 1200), "PNG", mode="P"), "profile")
+
+        assert error is None
+        result = Image.open(output["image"])
+        assert result.mode == "RGB"
+        assert result.size == (400, 400)
+
+def test_process_image_renders_variants(app):
+    from PIL import Image
+    from backend.picture_helpers import validate_and_process_image
+
+    with app.app_context():
+        output, error = validate_and_process_image(make_image_file((4000, 3000)), "event")
+
+        assert error is None
+        variants = {(width, image_format): Image.open(data) for width, image_format, data in output["variants"]}
+        assert set(variants) == {(width, image_format) for width in (256, 640, 1280) for image_format in ("webp", "jpg")}
+        assert variants[(640, "webp")].format == "WEBP"
+        assert variants[(640, "jpg")].format == "JPEG"
+        assert variants[(640, "webp")].width == 640
+        assert variants[(1280, "jpg")].size == (1280, 960)
+
+def test_process_image_never_upscales_variants(app):
+    from PIL import Image
+    from backend.picture_helpers import validate_and_process_image
+
+    with app.app_context():
+        output, error = validate_and_process_image(make_image_file((200, 200)), "profile")
+
+        assert error is None
+        sizes = {width: Image.open(data).size for width, image_format, data in output["variants"]}
+        assert sizes == {256: (200, 200), 96: (96, 96)}
+
+def test_variant_map_and_srcset():
+    from backend.picture_helpers import get_variant_map, get_variant_srcset
+
+    variants = get_variant_map("abc/orig.jpg", "profile")
+    assert variants == {
+        "96": {"webp": "abc/w96.webp", "jpg": "abc/w96.jpg"},
+        "256": {"webp": "abc/w256.webp", "jpg": "abc/w256.jpg"}
+    }
+    assert get_variant_srcset(variants, "https://cdn") == {
+        "webp": "https://cdn/abc/w96.webp 96w, https://cdn/abc/w256.webp 256w",
+        "jpg": "https://cdn/abc/w96.jpg 96w, https://cdn/abc/w256.jpg 256w"
+    }
+    assert get_variant_map("legacy.jpg") is None
+    assert get_variant_srcset(None, "https://cdn") is None
+
+def test_upload_to_r2_sends_variants_with_cache_control(app):
+    from backend.picture_helpers import upload_to_r2
+
+    with app.app_context(), patch("backend.picture_helpers.get_r2_client") as mock_client_func:
+        s3 = mock_client_func.return_value
+        key = upload_to_r2({"image": io.BytesIO(b"main"), "variants": [(256, "webp", io.BytesIO(b"small"))]}, "event")
+
+        assert key.endswith("/orig.jpg")
+        uploaded = {call.args[2]: call.kwargs["ExtraArgs"] for call in s3.upload_fileobj.call_args_list}
+        assert uploaded[key.replace("orig.jpg", "w256.webp")]["ContentType"] == "image/webp"
+        assert all(args["CacheControl"].endswith("immutable") for args in uploaded.values())
+
+def test_upload_to_r2_cleans_up_on_failure(app):
+    from backend.picture_helpers import upload_to_r2
+
+    with app.app_context(), patch("backend.picture_helpers.get_r2_client") as mock_client_func:
+        s3 = mock_client_func.return_value
+        s3.upload_fileobj.side_effect = [None, Exception("R2 down")]
+
+        assert upload_to_r2({"image": io.BytesIO(b"main"), "variants": [(256, "webp", io.BytesIO(b"small"))]}, "event") is None
+        deleted = s3.delete_objects.call_args.kwargs["Delete"]["Objects"]
+        assert len(deleted) == 1 and deleted[0]["Key"].endswith("/orig.jpg")
+
+def test_delete_task_removes_variants(app, mock_aws_and_r2):
+    from backend.tasks import delete_from_r2_task
+    mock_r2, _ = mock_aws_and_r2
+
+    with app.app_context():
+        delete_from_r2_task("abc/orig.jpg", "profile")
+
+        keys = {obj["Key"] for obj in mock_r2.delete_objects.call_args.kwargs["Delete"]["Objects"]}
+        assert keys == {"abc/orig.jpg", "abc/w96.webp", "abc/w96.jpg", "abc/w256.webp", "abc/w256.jpg"}
+        mock_r2.delete_object.assert_not_called()
@@ -0,0 +1,72 @@
+import io
+import pytest
+from unittest.mock import patch
+from backend.extensions import db
+from backend.models import ImageObject
+
+@pytest.fixture
+def stub_moderation(app, monkeypatch):
+    from backend.moderation import get_moderation_backend
+    monkeypatch.setitem(app.config, "MODERATION_BACKEND", "stub")
+    monkeypatch.setattr("backend.moderation._backends", {})
+    with app.app_context():
+        yield get_moderation_backend()
+
+def upload(content):
+    from backend.picture_helpers import upload_to_r2
+    with patch("backend.picture_helpers.get_r2_client"):
+        return upload_to_r2({"image": io.BytesIO(content), "variants": [], "perceptual_hash": None}, "event")
+
+def test_moderation_uses_spooled_bytes(app, mock_aws_and_r2, stub_moderation):
+    from backend.tasks import verify_event_image_task
+    from backend.picture_helpers import pop_spooled_image
+    mock_r2, _ = mock_aws_and_r2
+
+    with app.app_context(), patch("backend.tasks.metrics.observe") as mock_observe:
+        cloud_id = upload(b"freshly processed")
+
+        verify_event_image_task(cloud_id)
+
+        mock_r2.get_object.assert_not_called()
+        assert stub_moderation.calls == [len(b"freshly processed")]
+        assert pop_spooled_image(cloud_id) is None
+        db.session.expire_all()
+        assert db.session.get(ImageObject, cloud_id).moderation_status == "approved"
+        assert mock_observe.call_args.args[0] == "image_approval_latency_seconds"
+
+def test_moderation_falls_back_to_r2(app, mock_aws_and_r2, stub_moderation):
+    from backend.tasks import verify_event_image_task
+    from backend.picture_helpers import pop_spooled_image
+    mock_r2, _ = mock_aws_and_r2
+
+    with app.app_context():
+        cloud_id = upload(b"spool expired")
+        pop_spooled_image(cloud_id)
+
+        verify_event_image_task(cloud_id)
+
+        mock_r2.get_object.assert_called_once_with(Bucket=app.config["BUCKET_EVENTS"], Key=cloud_id)
+        assert stub_moderation.calls == [len(b"fake_image_bytes")]
+
+def test_stub_labels_reject_image(app, mock_aws_and_r2, stub_moderation):
+    from backend.tasks import verify_event_image_task, delete_from_r2_task
+
+    with app.app_context():
+        stub_moderation.labels = [{"Name": "Violence", "Confidence": 99.0}]
+        cloud_id = upload(b"violent poster")
+
+        verify_event_image_task(cloud_id)
+
+        db.session.expire_all()
+        assert db.session.get(ImageObject, cloud_id).moderation_status == "rejected"
+        delete_from_r2_task.delay.assert_called_once_with(cloud_id, "event", force=True)
+
+def test_large_images_are_not_spooled(app, stub_moderation):
+    from backend.picture_helpers import spool_image, pop_spooled_image
+
+    with app.app_context(), patch("backend.picture_helpers.Constants.IMAGE_SPOOL_MAX_BYTES", 4):
+        spool_image("big/orig.jpg", io.BytesIO(b"too large"))
+        spool_image("small/orig.jpg", io.BytesIO(b"tiny"))
+
+        assert pop_spooled_image("big/orig.jpg") is None
+        assert pop_spooled_image("small/orig.jpg") == b"tiny"
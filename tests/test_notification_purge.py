@@ -0,0 +1,119 @@
+import pytest
+import logging
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import text
+from backend.models import Notification
+from backend.models.notification import NotificationTag
+from backend.extensions import db
+from backend.tasks import purge_notifications_task
+from backend.db_maintenance import table_size, month_start, add_months, partition_name, list_monthly_partitions
+
+ARCHIVE_SCHEMA = "notifications_archive"
+
+# =============================================================================
+# Tests for notification retention
+# =============================================================================
+
+def add_notifications(user, tag, count, age_days):
+    created_at = datetime.now(timezone.utc) - timedelta(days=age_days)
+    for i in range(count):
+        db.session.add(Notification(user_id=user.user_id, tag=tag, payload={"message": f"msg {i}"}, created_at=created_at))
+    db.session.commit()
+
+def add_notifications_at(user, tag, count, created_at):
+    for i in range(count):
+        db.session.add(Notification(user_id=user.user_id, tag=tag, payload={"message": f"msg {i}"}, created_at=created_at.replace(tzinfo=None)))
+    db.session.commit()
+
+@pytest.fixture
+def partitioned_notifications(app):
+    """Restore the regular Notifications table (and drop the archive schema) after a test that partitions it."""
+    yield
+    app.config["NOTIFICATION_ARCHIVE_SCHEMA"] = None
+    db.session.rollback()
+    db.session.execute(text(f'DROP TABLE IF EXISTS "{Notification.__tablename__}"'))
+    db.session.execute(text(f'DROP SCHEMA IF EXISTS "{ARCHIVE_SCHEMA}" CASCADE'))
+    db.session.commit()
+    Notification.__table__.create(db.engine)
+
+def fill_partitioned_notifications(app, runner, user):
+    Notification.query.delete()
+    db.session.commit()
+    now = datetime.now(timezone.utc)
+    longest_days = max([app.config["NOTIFICATION_RETENTION_DAYS"], *app.config["NOTIFICATION_RETENTION_DAYS_BY_TAG"].values()])
+    expired_month = add_months(month_start(now - timedelta(days=longest_days)), -1)
+
+    add_notifications_at(user, NotificationTag.invite_created, 5, expired_month + timedelta(days=1))
+    add_notifications_at(user, NotificationTag.invite_created, 1, month_start(now - timedelta(days=longest_days)))
+    add_notifications(user, NotificationTag.joined_event_updated, 3, 31)
+    add_notifications(user, NotificationTag.joined_event_updated, 2, 29)
+
+    result = runner.invoke(args=["partition-notifications"])
+    assert result.exit_code == 0
+    assert Notification.query.count() == 11
+    return partition_name(Notification.__tablename__, expired_month)
+
+def test_purge_notifications_applies_ttl_per_tag(app, registered_user):
+    user, _ = registered_user
+    Notification.query.delete()
+    db.session.commit()
+
+    app.config["NOTIFICATION_RETENTION_DAYS_BY_TAG"]["joined-event-updated"] = 30
+    default_days = app.config["NOTIFICATION_RETENTION_DAYS"]
+
+    add_notifications(user, NotificationTag.joined_event_updated, 3, 31)
+    add_notifications(user, NotificationTag.joined_event_updated, 2, 29)
+    add_notifications(user, NotificationTag.invite_created, 4, 31)
+    add_notifications(user, NotificationTag.invite_created, 1, default_days + 1)
+
+    purge_notifications_task()
+
+    assert Notification.query.filter_by(tag=NotificationTag.joined_event_updated).count() == 2
+    assert Notification.query.filter_by(tag=NotificationTag.invite_created).count() == 4
+
+def test_table_size_reports_bytes(app, registered_user):
+    user, _ = registered_user
+    add_notifications(user, NotificationTag.other, 10, 0)
+
+    assert table_size(Notification.__tablename__) > 0
+
+def test_purge_partitioned_notifications_drops_expired_months(app, runner, registered_user, partitioned_notifications, caplog):
+    user, _ = registered_user
+    expired_partition = fill_partitioned_notifications(app, runner, user)
+    size_before = table_size(Notification.__tablename__)
+
+    with caplog.at_level(logging.INFO, logger=app.logger.name):
+        purge_notifications_task()
+
+    assert expired_partition not in [name for name, _, _ in list_monthly_partitions(Notification.__tablename__)]
+    assert db.session.execute(text("SELECT to_regclass(:name)"), {"name": f'"{expired_partition}"'}).scalar() is None
+    # the default-TTL row waits for its partition, only the short-TTL tag is deleted row by row
+    assert Notification.query.filter_by(tag=NotificationTag.invite_created).count() == 1
+    assert Notification.query.filter_by(tag=NotificationTag.joined_event_updated).count() == 2
+    assert table_size(Notification.__tablename__) < size_before
+
+    messages = [record.getMessage() for record in caplog.records if "purge_notifications_task" in record.getMessage()]
+    assert any(f"partition drop ({expired_partition})" in message and "table size" in message and "MB ->" in message for message in messages)
+
+def test_purge_partitioned_notifications_archives_expired_months(app, runner, registered_user, partitioned_notifications):
+    user, _ = registered_user
+    expired_partition = fill_partitioned_notifications(app, runner, user)
+    app.config["NOTIFICATION_ARCHIVE_SCHEMA"] = ARCHIVE_SCHEMA
+
+    purge_notifications_task()
+
+    assert expired_partition not in [name for name, _, _ in list_monthly_partitions(Notification.__tablename__)]
+    assert db.session.execute(text(f'SELECT count(*) FROM "{ARCHIVE_SCHEMA}"."{expired_partition}"')).scalar() == 5
+    assert Notification.query.count() == 3
+
+def test_install_notification_indexes_on_partitioned_table(app, runner, registered_user, partitioned_notifications):
+    user, _ = registered_user
+    fill_partitioned_notifications(app, runner, user)
+    db.session.execute(text('DROP INDEX "ix_Notifications_user_id_tag_created_at"'))
+    db.session.commit()
+
+    result = runner.invoke(args=["install-notification-indexes"])
+
+    assert result.exit_code == 0
+    assert db.session.execute(text("SELECT to_regclass('\"ix_Notifications_user_id_tag_created_at\"')")).scalar() is not None
+    assert not any(index.dialect_options["postgresql"]["concurrently"] for index in Notification.__table__.indexes)
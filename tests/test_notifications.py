@@ -448,3 +448,392 @@ def test_read_notification(client, logged_in_user, app):
 
         assert len(Notification.query.filter_by(user_id=user.user_id).all()) == 1
         assert example_notif.is_read == True
+
+# =============================================================================
+# Tests for the notifications keyset pagination
+# =============================================================================
+
+def test_notifications_cursor_pagination(client, logged_in_user, app):
+    with app.app_context():
+        user, token = logged_in_user
+        Notification.query.delete()
+        same_time = datetime.now(timezone.utc) - timedelta(minutes=5)
+        for i in range(5):
+            db.session.add(Notification(
+                user_id=user.user_id, tag=NotificationTag.other, is_read=i % 2 == 0,
+                payload={"message": f"msg {i}"}, created_at=same_time if i < 3 else same_time + timedelta(minutes=i)
+            ))
+        db.session.commit()
+
+        for sort_mode in ("newest", "oldest"):
+            seen = []
+            cursor = ""
+            while True:
+                response = client.get(f"/api/notifications/?cursor={cursor}&limit=2&sort_mode={sort_mode}", headers=get_auth_header(token))
+                assert response.status_code == 200
+                body = response.get_json()
+                seen += [n["notification_id"] for n in body["data"]]
+                if not body["pagination"]["has_next"]:
+                    break
+                cursor = body["pagination"]["next_cursor"]
+            assert len(seen) == len(set(seen)) == 5
+
+        response = client.get("/api/notifications/?cursor=&limit=10&status=unread", headers=get_auth_header(token))
+        assert len(response.get_json()["data"]) == 2
+        assert response.get_json()["pagination"]["unread_count"] == 2
+
+        response = client.get(f"/api/notifications/?cursor={cursor}&sort_mode=newest", headers=get_auth_header(token))
+        assert response.status_code == 400
+
+def explain_plan_nodes(query):
+    from backend.helpers import ExplainStatement
+    import json
+
+    db.session.execute(db.text("SET LOCAL enable_seqscan = off")) # the test table is tiny, make the planner show whether an index can serve the query
+    plan = db.session.execute(ExplainStatement(query.statement)).scalar()
+    db.session.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    nodes = [plan[0]["Plan"]]
+    for node in nodes:
+        nodes.extend(node.get("Plans", []))
+    return nodes
+
+def test_notifications_query_uses_index_for_every_filter(logged_in_user, app):
+    from backend.routes.notification_helpers import build_notifications_query
+    from itertools import product
+
+    with app.app_context():
+        user, _ = logged_in_user
+        cursor = (datetime.now(timezone.utc), user.user_id)
+        combinations = product(
+            ("all", "unread", "read"),
+            ("all", NotificationTag.event_new_comment.value),
+            ("all", "today", "week", "month", "year", "older"),
+            ("newest", "oldest"),
+            (None, cursor)
+        )
+        for status, notif_tag, created_window, sort_mode, page_cursor in combinations:
+            query = build_notifications_query(user.user_id, "", status, notif_tag, created_window, sort_mode, page_cursor)
+            nodes = explain_plan_nodes(query.limit(20))
+            node_types = [node["Node Type"] for node in nodes]
+            assert "Seq Scan" not in node_types, (status, notif_tag, created_window, sort_mode, page_cursor)
+            assert any("Index" in node_type for node_type in node_types), (status, notif_tag, created_window, sort_mode, page_cursor)
+
+def test_notifications_message_search_uses_trigram_index(logged_in_user, app):
+    from backend.routes.notification_helpers import build_notifications_query
+
+    with app.app_context():
+        user, _ = logged_in_user
+        query = build_notifications_query(user.user_id, "grill", "all", "all", "all", "newest")
+        assert all(node["Node Type"] != "Seq Scan" for node in explain_plan_nodes(query.limit(20)))
+
+        search_only = Notification.query.filter(Notification.payload.op('->>')('message').ilike("%grill%"))
+        assert any(node.get("Index Name") == "ix_Notifications_message_trgm" for node in explain_plan_nodes(search_only))
+
+# =============================================================================
+# Tests for the bulk notification state operations
+# =============================================================================
+
+def add_inbox(user_id, count, is_read=False, start=None):
+    start = start or datetime.now(timezone.utc) - timedelta(hours=1)
+    notifications = [Notification(
+        user_id=user_id, tag=NotificationTag.other, is_read=is_read,
+        payload={"message": f"msg {i}"}, created_at=start + timedelta(minutes=i)
+    ) for i in range(count)]
+    db.session.add_all(notifications)
+    db.session.commit()
+    return [n.notification_id for n in notifications]
+
+def test_read_all_notifications(client, logged_in_user, registered_friend, app):
+    with app.app_context():
+        user, token = logged_in_user
+        friend, _ = registered_friend
+        Notification.query.delete()
+        db.session.commit()
+        ids = add_inbox(user.user_id, 4)
+        add_inbox(friend.user_id, 2)
+
+        assert client.get("/api/notifications/unread_count", headers=get_auth_header(token)).get_json()["unread_count"] == 4
+
+        response = client.put("/api/notifications/read_all", json={"up_to": str(ids[1])}, headers=get_auth_header(token))
+        assert response.status_code == 200
+        assert response.get_json()["updated"] == 2
+        assert client.get("/api/notifications/unread_count", headers=get_auth_header(token)).get_json()["unread_count"] == 2
+
+        response = client.put("/api/notifications/read_all", headers=get_auth_header(token))
+        assert response.get_json()["updated"] == 2
+        assert client.get("/api/notifications/unread_count", headers=get_auth_header(token)).get_json()["unread_count"] == 0
+        assert Notification.query.filter_by(user_id=friend.user_id, is_read=False).count() == 2
+
+        response = client.put("/api/notifications/read_all", json={"up_to": "not-a-uuid"}, headers=get_auth_header(token))
+        assert response.status_code == 400
+
+def test_read_and_delete_many_notifications(client, logged_in_user, registered_friend, app):
+    with app.app_context():
+        user, token = logged_in_user
+        friend, _ = registered_friend
+        Notification.query.delete()
+        db.session.commit()
+        unread_ids = add_inbox(user.user_id, 3)
+        read_ids = add_inbox(user.user_id, 2, is_read=True)
+        friend_ids = add_inbox(friend.user_id, 1)
+
+        response = client.put("/api/notifications/read", json={"notification_ids": [str(unread_ids[0]), str(read_ids[0]), str(friend_ids[0])]}, headers=get_auth_header(token))
+        assert response.status_code == 200
+        assert response.get_json()["updated"] == 1
+        assert client.get("/api/notifications/unread_count", headers=get_auth_header(token)).get_json()["unread_count"] == 2
+
+        response = client.delete("/api/notifications/", json={"notification_ids": [str(unread_ids[1]), str(friend_ids[0])]}, headers=get_auth_header(token))
+        assert response.get_json()["deleted"] == 1
+        assert client.get("/api/notifications/unread_count", headers=get_auth_header(token)).get_json()["unread_count"] == 1
+
+        response = client.delete("/api/notifications/", headers=get_auth_header(token))
+        assert response.get_json()["deleted"] == 3
+        assert [n.notification_id for n in Notification.query.filter_by(user_id=user.user_id).all()] == [unread_ids[2]]
+        assert db.session.get(Notification, friend_ids[0]) is not None
+
+        response = client.put("/api/notifications/read", json={"notification_ids": []}, headers=get_auth_header(token))
+        assert response.status_code == 400
+
+# =============================================================================
+# Tests for the bulk notification fan-out
+# =============================================================================
+
+def test_bulk_task_creates_one_row_per_recipient(logged_in_user, registered_friend, app):
+    from backend.tasks import create_notifications_bulk_task
+
+    with app.app_context():
+        user, _ = logged_in_user
+        friend, _ = registered_friend
+        Notification.query.delete()
+        db.session.commit()
+
+        payload = {"event_name": "Juwenalia", "message": "Juwenalia has been updated."}
+        with patch("backend.tasks.Constants.NOTIFICATION_BULK_CHUNK_SIZE", 1):
+            create_notifications_bulk_task(
+                [str(user.user_id), str(friend.user_id), str(user.user_id)],
+                NotificationTag.joined_event_updated.value,
+                payload
+            )
+
+        notifications = Notification.query.filter_by(tag=NotificationTag.joined_event_updated).all()
+        assert sorted(str(n.user_id) for n in notifications) == sorted([str(user.user_id), str(friend.user_id)])
+        assert all(n.payload["message"] == payload["message"] and n.payload["count"] == 1 and n.is_read is False for n in notifications)
+
+@patch("backend.notifications.receivers.create_notifications_bulk_task.delay")
+def test_fan_out_signal_enqueues_single_task(mock_delay, app):
+    from backend.notifications import friend_new_public_event
+
+    with app.app_context():
+        friend_ids = [f"00000000-0000-0000-0000-{i:012d}" for i in range(400)]
+        friend_new_public_event.send(
+            app,
+            creator_id="creator",
+            creator_name="Ziomek",
+            event_id="event",
+            event_name="Grill",
+            friend_ids=friend_ids
+        )
+
+        mock_delay.assert_called_once()
+        kwargs = mock_delay.call_args.kwargs
+        assert kwargs["user_ids"] == friend_ids
+        assert kwargs["notification_tag_value"] == NotificationTag.friend_new_public_event.value
+
+@patch("backend.notifications.receivers.create_notifications_bulk_task.delay")
+def test_fan_out_signal_without_recipients(mock_delay, app):
+    from backend.notifications import joined_event_deleted
+
+    with app.app_context():
+        joined_event_deleted.send(app, event_name="Grill", creator_username="Ziomek", participant_ids=[])
+        mock_delay.assert_not_called()
+
+# =============================================================================
+# Tests for notification coalescing
+# =============================================================================
+
+def participant_payload(participant_id, participant_name, event_id="11111111-1111-1111-1111-111111111111"):
+    return {
+        "participant_id": participant_id,
+        "participant_name": participant_name,
+        "event_id": event_id,
+        "event_name": "Grill",
+        "message": f"{participant_name} joined your event Grill."
+    }
+
+def test_coalesce_merges_into_unread_notification(logged_in_user, app):
+    from backend.tasks import create_notification_task
+
+    with app.app_context():
+        user, _ = logged_in_user
+        Notification.query.delete()
+        db.session.commit()
+
+        tag = NotificationTag.event_new_participant.value
+        create_notification_task(str(user.user_id), tag, participant_payload("p1", "Ania"))
+        create_notification_task(str(user.user_id), tag, participant_payload("p2", "Bartek"))
+        create_notification_task(str(user.user_id), tag, participant_payload("p3", "Celina"))
+        create_notification_task(str(user.user_id), tag, participant_payload("p4", "Darek", event_id="22222222-2222-2222-2222-222222222222"))
+
+        notifications = Notification.query.filter_by(user_id=user.user_id).order_by(Notification.created_at.asc()).all()
+        assert len(notifications) == 2
+        merged = notifications[0]
+        assert merged.payload["count"] == 3
+        assert merged.payload["actor_count"] == 3
+        assert [a["name"] for a in merged.payload["actors"]] == ["Celina", "Bartek", "Ania"]
+        assert merged.payload["message"] == "Celina and 2 others joined your event Grill."
+        assert notifications[1].payload["message"] == "Darek joined your event Grill."
+
+def test_coalesce_skips_read_and_old_notifications(logged_in_user, app):
+    from backend.tasks import create_notification_task
+
+    with app.app_context():
+        user, _ = logged_in_user
+        Notification.query.delete()
+        db.session.commit()
+
+        tag = NotificationTag.event_new_participant.value
+        create_notification_task(str(user.user_id), tag, participant_payload("p1", "Ania"))
+        Notification.query.update({"is_read": True})
+        db.session.commit()
+
+        create_notification_task(str(user.user_id), tag, participant_payload("p2", "Bartek"))
+        Notification.query.filter_by(is_read=False).update({"created_at": datetime.now(timezone.utc) - timedelta(seconds=app.config["NOTIFICATION_COALESCE_WINDOW"] + 60)})
+        db.session.commit()
+
+        create_notification_task(str(user.user_id), tag, participant_payload("p3", "Celina"))
+
+        notifications = Notification.query.filter_by(user_id=user.user_id).all()
+        assert len(notifications) == 3
+        assert all(n.payload["count"] == 1 for n in notifications)
+
+def test_merge_payload_counts_repeated_actor_once():
+    from backend.notifications.coalesce import initial_payload, merge_payload
+
+    tag = NotificationTag.event_new_comment
+    comment = {"commenter_id": "c1", "commenter_name": "Ania", "event_id": "e1", "event_name": "Grill", "message": "Ania commented on your event Grill."}
+
+    payload = merge_payload(tag, initial_payload(tag, comment), comment)
+    assert payload["count"] == 2
+    assert payload["actor_count"] == 1
+    assert payload["message"] == "Ania commented 2 times on your event Grill."
+
+    payload = merge_payload(tag, payload, dict(comment, commenter_id="c2", commenter_name="Bartek"))
+    assert payload["actor_count"] == 2
+    assert [a["id"] for a in payload["actors"]] == ["c2", "c1"]
+    assert payload["message"] == "Bartek and 1 other commented on your event Grill."
+
+# =============================================================================
+# Tests for the unread notification counter
+# =============================================================================
+
+def test_unread_count_endpoint_and_counter_updates(client, logged_in_user, app):
+    from backend.tasks import create_notification_task
+
+    with app.app_context():
+        user, token = logged_in_user
+        Notification.query.delete()
+        db.session.commit()
+
+        response = client.get("/api/notifications/unread_count", headers=get_auth_header(token))
+        assert response.status_code == 200
+        assert response.get_json()["unread_count"] == 0
+
+        for i in range(3):
+            create_notification_task(str(user.user_id), NotificationTag.other.value, {"message": f"m{i}"})
+
+        with patch("backend.helpers.Notification") as mock_model:
+            response = client.get("/api/notifications/unread_count", headers=get_auth_header(token))
+            mock_model.query.filter_by.assert_not_called()
+        assert response.get_json()["unread_count"] == 3
+
+        notification = Notification.query.filter_by(user_id=user.user_id).first()
+        client.put(f"/api/notifications/{notification.notification_id}/read", headers=get_auth_header(token))
+        client.put(f"/api/notifications/{notification.notification_id}/read", headers=get_auth_header(token))
+
+        response = client.get("/api/notifications/unread_count", headers=get_auth_header(token))
+        assert response.get_json()["unread_count"] == 2
+
+def test_unread_counter_not_created_by_adjustment(logged_in_user, app):
+    from backend.extensions import redis_client
+    from backend.helpers import adjust_unread_counts, get_unread_count_key
+
+    with app.app_context():
+        user, _ = logged_in_user
+        adjust_unread_counts([user.user_id], 1)
+        assert redis_client.get(get_unread_count_key(user.user_id)) is None
+
+def test_reconcile_unread_counts_fixes_drift(logged_in_user, app):
+    from backend.extensions import redis_client
+    from backend.helpers import get_unread_count_key
+    from backend.tasks import reconcile_unread_counts_task
+
+    with app.app_context():
+        user, _ = logged_in_user
+        Notification.query.delete()
+        db.session.add(Notification(user_id=user.user_id, tag=NotificationTag.other, payload={"message": "m"}))
+        db.session.commit()
+
+        redis_client.set(get_unread_count_key(user.user_id), 7)
+        reconcile_unread_counts_task()
+        assert redis_client.get(get_unread_count_key(user.user_id)) == "1"
+
+# =============================================================================
+# Tests for the live notification stream
+# =============================================================================
+
+def test_notification_hub_dispatch_many_subscribers():
+    from backend.notifications.stream import NotificationHub
+
+    hub = NotificationHub(client=None)
+    hub._thread = type("AliveThread", (), {"is_alive": lambda self: True})() # no Redis listener in this test
+
+    subscribers = [(f"user-{i % 100}", hub.subscribe(f"user-{i % 100}")) for i in range(2000)]
+    assert hub.subscriber_count() == 2000
+
+    hub.dispatch("user-7", '{"message": "hi"}')
+    received = [user_id for user_id, q in subscribers if not q.empty()]
+    assert len(received) == 20 and set(received) == {"user-7"}
+
+    for user_id, q in subscribers:
+        hub.unsubscribe(user_id, q)
+    assert hub.subscriber_count() == 0
+
+def test_notification_task_publishes_on_user_channel(logged_in_user, app):
+    import json
+    from backend.extensions import redis_client
+    from backend.notifications.stream import get_notification_channel
+    from backend.tasks import create_notification_task
+
+    with app.app_context():
+        user, _ = logged_in_user
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(get_notification_channel(user.user_id))
+        try:
+            create_notification_task(str(user.user_id), NotificationTag.other.value, {"message": "Live!"})
+            message = None
+            for _ in range(50):
+                message = pubsub.get_message(timeout=0.1)
+                if message:
+                    break
+            assert message is not None
+            assert json.loads(message["data"])["payload"]["message"] == "Live!"
+        finally:
+            pubsub.close()
+
+def test_notification_stream_pushes_published_notification(client, logged_in_user, app):
+    from backend.notifications.stream import notification_hub
+
+    with app.app_context():
+        user, token = logged_in_user
+        response = client.get("/api/notifications/stream", headers=get_auth_header(token))
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+
+        chunks = iter(response.response)
+        assert next(chunks).decode().startswith("retry:")
+        notification_hub.dispatch(str(user.user_id), '{"payload": {"message": "Live!"}}')
+        assert next(chunks).decode() == 'event: notification\ndata: {"payload": {"message": "Live!"}}\n\n'
+        response.close()
@@ -0,0 +1,146 @@
+import pytest
+from unittest.mock import patch
+from datetime import datetime, timezone, timedelta
+from backend.extensions import db
+from backend.models import Notification, OutboxMessage
+from backend.outbox import enqueue_task, relay_outbox, replay_outbox
+from backend.tasks import create_notification_task
+
+# =============================================================================
+# Tests for the transactional outbox
+# =============================================================================
+
+def get_auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def outbox_enabled(app):
+    app.config["OUTBOX_ENABLED"] = True
+    yield
+    app.config["OUTBOX_ENABLED"] = False
+    db.session.rollback()
+    OutboxMessage.query.delete()
+    db.session.commit()
+
+def add_message(task_name="backend.tasks.create_notification_task", **kwargs):
+    message = OutboxMessage(task_name=task_name, kwargs=kwargs)
+    db.session.add(message)
+    db.session.commit()
+    return message
+
+def test_enqueue_task_is_part_of_the_transaction(app, outbox_enabled):
+    with app.app_context(), patch.object(create_notification_task, "delay") as mock_delay:
+        enqueue_task(create_notification_task, user_id="u1", notification_tag_value="other", payload={})
+        db.session.rollback()
+        assert OutboxMessage.query.count() == 0
+
+        enqueue_task(create_notification_task, user_id="u2", notification_tag_value="other", payload={})
+        db.session.commit()
+
+        message = OutboxMessage.query.one()
+        assert message.task_name == create_notification_task.name
+        assert message.kwargs["user_id"] == "u2"
+        assert message.published_at is None
+        mock_delay.assert_not_called()
+
+def test_enqueue_task_without_outbox_waits_for_commit(app):
+    with app.app_context(), patch.object(create_notification_task, "delay") as mock_delay:
+        enqueue_task(create_notification_task, user_id="u1", notification_tag_value="other", payload={})
+        db.session.rollback()
+        db.session.commit()
+        mock_delay.assert_not_called()
+
+        enqueue_task(create_notification_task, user_id="u2", notification_tag_value="other", payload={})
+        mock_delay.assert_not_called()
+        db.session.commit()
+
+        mock_delay.assert_called_once_with(user_id="u2", notification_tag_value="other", payload={})
+        assert OutboxMessage.query.count() == 0
+
+def test_route_signal_goes_to_outbox(client, logged_in_user, registered_friend, event, app, outbox_enabled):
+    with app.app_context():
+        friend, friend_password = registered_friend
+        friend_token = client.post("/api/auth/login", json={"username": friend.username, "password": friend_password}).get_json()["access_token"]
+
+        Notification.query.delete()
+        db.session.commit()
+
+        response = client.post(f"/api/comments/create/{event.event_id}", headers=get_auth_header(friend_token), json={"content": "Będę!"})
+        assert response.status_code == 201
+
+        message = OutboxMessage.query.one()
+        assert message.kwargs["notification_tag_value"] == "event-new-comment"
+        assert Notification.query.count() == 0
+
+def test_relay_publishes_in_order(app, outbox_enabled):
+    with app.app_context():
+        first = add_message(user_id="u1")
+        second = add_message(user_id="u2")
+
+        with patch.object(app.extensions["celery"], "send_task") as mock_send:
+            assert relay_outbox(batch_size=1, max_batches=5) == 2
+
+        assert [c.kwargs["kwargs"]["user_id"] for c in mock_send.call_args_list] == ["u1", "u2"]
+        assert mock_send.call_args_list[0].args[0] == "backend.tasks.create_notification_task"
+        assert all(m.published_at is not None for m in (db.session.get(OutboxMessage, first.outbox_id), db.session.get(OutboxMessage, second.outbox_id)))
+
+def test_relay_stops_on_broker_error(app, outbox_enabled):
+    with app.app_context():
+        first = add_message(user_id="u1")
+        add_message(user_id="u2")
+
+        with patch.object(app.extensions["celery"], "send_task", side_effect=ConnectionError("broker down")) as mock_send:
+            assert relay_outbox(batch_size=10, max_batches=5) == 0
+            assert mock_send.call_count == 1
+
+        failed = db.session.get(OutboxMessage, first.outbox_id)
+        assert failed.published_at is None
+        assert failed.attempts == 1
+        assert "broker down" in failed.last_error
+        assert OutboxMessage.query.filter(OutboxMessage.published_at.is_(None)).count() == 2
+
+def test_replay_marks_messages_pending(app, outbox_enabled):
+    with app.app_context():
+        old = add_message(user_id="u1")
+        recent = add_message(user_id="u2")
+        old.published_at = datetime.now(timezone.utc)
+        old.created_at = datetime.now(timezone.utc) - timedelta(days=2)
+        recent.published_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+        assert replay_outbox(datetime.now(timezone.utc) - timedelta(hours=1)) == 1
+        assert db.session.get(OutboxMessage, recent.outbox_id).published_at is None
+        assert db.session.get(OutboxMessage, old.outbox_id).published_at is not None
+
+def test_outbox_replay_command(runner, app, outbox_enabled):
+    with app.app_context():
+        message = add_message(user_id="u1")
+        message.published_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+        since = (datetime.now(timezone.utc) - timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M")
+        result = runner.invoke(args=["outbox-replay", "--since", since])
+        assert "1 outbox messages" in result.output
+
+def test_create_event_with_invalid_share_commits_nothing(client, logged_in_user, app):
+    from backend.models.event import Event
+    from backend.tasks import verify_event_image_task
+    _, token = logged_in_user
+    payload = {
+        "name": "never created",
+        "description": "shared with a broken id",
+        "date": (datetime.now() + timedelta(days=30)).strftime("%d.%m.%Y"),
+        "time": "18:00",
+        "location": "here",
+        "is_private": True,
+        "shared_list": ["not-a-uuid"],
+        "pictures": [{"cloud_id": "pic_A"}]
+    }
+
+    with patch.object(verify_event_image_task, "delay") as mock_verify:
+        response = client.post("/api/events/create", json=payload, headers=get_auth_header(token))
+
+    assert response.status_code == 400
+    mock_verify.assert_not_called()
+    with app.app_context():
+        assert Event.query.filter_by(event_name="never created").count() == 0
@@ -0,0 +1,132 @@
+import io
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from backend.extensions import db
+from backend.models import User
+from backend.models.event import Pictures
+
+class FakeR2:
+    """In-memory stand-in for the R2 (S3 compatible) client, objects are kept per (bucket, key)."""
+    def __init__(self):
+        self.objects = {}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://r2.test/{Params['Bucket']}/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+    def get_object(self, Bucket, Key):
+        data = self.objects[(Bucket, Key)]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def upload_fileobj(self, data, bucket, key, ExtraArgs=None):
+        self.objects[(bucket, key)] = data.read()
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop((Bucket, obj["Key"]), None)
+
+@pytest.fixture
+def fake_r2():
+    r2 = FakeR2()
+    with patch("backend.tasks.get_r2_client", return_value=r2), \
+         patch("backend.picture_helpers.get_r2_client", return_value=r2):
+        yield r2
+
+def make_jpeg(size=(800, 600)):
+    from PIL import Image
+    output = io.BytesIO()
+    Image.new("RGB", size, color=(30, 120, 200)).save(output, format="JPEG")
+    return output.getvalue()
+
+def presign(client, token, **body):
+    response = client.post("/api/pictures/presign", json=body, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+    return response.get_json()["uploads"]
+
+def create_event_with_pictures(client, token, cloud_ids):
+    payload = {
+        "name": "staged event",
+        "description": "pictures uploaded to staging",
+        "date": (datetime.now() + timedelta(days=30)).strftime("%d.%m.%Y"),
+        "time": "18:00",
+        "location": "here",
+        "is_private": False,
+        "pictures": [{"cloud_id": cloud_id} for cloud_id in cloud_ids]
+    }
+    return client.post("/api/events/create", json=payload, headers={"Authorization": f"Bearer {token}"})
+
+def test_presign_issues_staging_urls(client, logged_in_user, app, fake_r2):
+    user, token = logged_in_user
+
+    uploads = presign(client, token, type="event", count=2)
+
+    assert len(uploads) == 2
+    assert len({upload["staging_key"] for upload in uploads}) == 2
+    for upload in uploads:
+        assert upload["staging_key"].startswith(f"staging/{user.user_id}/")
+        assert f"/{app.config['BUCKET_STAGING']}/{upload['staging_key']}" in upload["upload_url"]
+        assert upload["expires_in"] == app.config["STAGING_UPLOAD_EXPIRES"]
+
+def test_presign_rejects_invalid_count(client, logged_in_user, fake_r2):
+    _, token = logged_in_user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.post("/api/pictures/presign", json={"type": "event", "count": 6}, headers=headers).status_code == 400
+    assert client.post("/api/pictures/presign", json={"type": "profile", "count": 2}, headers=headers).status_code == 400
+    assert client.post("/api/pictures/presign", json={"type": "banner"}, headers=headers).status_code == 400
+
+def test_create_event_processes_staged_picture(client, logged_in_user, app, fake_r2):
+    _, token = logged_in_user
+    staging_key = presign(client, token, type="event")[0]["staging_key"]
+    fake_r2.objects[(app.config["BUCKET_STAGING"], staging_key)] = make_jpeg()
+
+    response = create_event_with_pictures(client, token, [staging_key])
+
+    assert response.status_code == 201
+    with app.app_context():
+        picture = Pictures.query.filter_by(event_id=response.get_json()["event_id"]).one()
+        assert picture.cloud_id.endswith("/orig.jpg")
+        assert picture.image_status == "approved"
+        assert picture.variants["640"]["webp"] in {key for _, key in fake_r2.objects}
+        assert (app.config["BUCKET_EVENTS"], picture.cloud_id) in fake_r2.objects
+    assert (app.config["BUCKET_STAGING"], staging_key) not in fake_r2.objects
+
+def test_staged_picture_with_invalid_file_fails(client, logged_in_user, app, fake_r2):
+    _, token = logged_in_user
+    staging_key = presign(client, token, type="event")[0]["staging_key"]
+    fake_r2.objects[(app.config["BUCKET_STAGING"], staging_key)] = b"definitely not a picture"
+
+    response = create_event_with_pictures(client, token, [staging_key])
+
+    assert response.status_code == 201
+    with app.app_context():
+        picture = Pictures.query.filter_by(event_id=response.get_json()["event_id"]).one()
+        assert picture.image_status == "failed"
+    assert fake_r2.objects == {}
+
+def test_create_event_rejects_foreign_staging_key(client, logged_in_user, registered_friend, app, fake_r2):
+    _, token = logged_in_user
+    friend, _ = registered_friend
+
+    response = create_event_with_pictures(client, token, [f"staging/{friend.user_id}/{'a' * 32}"])
+
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Invalid staging key"
+
+def test_update_profile_processes_staged_picture(client, logged_in_user, app, fake_r2):
+    user, token = logged_in_user
+    staging_key = presign(client, token, type="profile")[0]["staging_key"]
+    fake_r2.objects[(app.config["BUCKET_STAGING"], staging_key)] = make_jpeg((600, 600))
+
+    response = client.put("/api/users/update_profile", json={"profile_picture": {"cloud_id": staging_key}}, headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    with app.app_context():
+        updated_user = db.session.get(User, user.user_id)
+        assert updated_user.profile_picture.endswith("/orig.jpg")
+        assert updated_user.profile_picture_variants["96"]["jpg"].endswith("/w96.jpg")
+        assert updated_user.image_status == "approved"
+        assert (app.config["BUCKET_PROFILES"], updated_user.profile_picture) in fake_r2.objects
@@ -0,0 +1,111 @@
+import pytest
+import uuid
+from datetime import datetime, timezone, timedelta
+from flask_jwt_extended import create_access_token, decode_token
+from sqlalchemy import text
+from backend.models import TokenBlocklist
+from backend.extensions import db, redis_client
+from backend.constants import Constants
+from backend.helpers import add_token_to_db, is_token_revoked, revoke_token, get_token_cache_key
+from backend.tasks import purge_expired_tokens_task
+from backend.db_maintenance import delete_in_batches, month_start, add_months, partition_name, is_partitioned, list_monthly_partitions
+
+# =============================================================================
+# Tests for expired token purge
+# =============================================================================
+
+def add_tokens(user, count, expires):
+    for _ in range(count):
+        db.session.add(TokenBlocklist(
+            jti=str(uuid.uuid4()),
+            token_type="access",
+            user_id=user.user_id,
+            expires=expires
+        ))
+    db.session.commit()
+
+@pytest.fixture
+def partitioned_tokens(app):
+    """Restore the regular Token_blocklist table after a test that partitions it."""
+    yield
+    db.session.rollback()
+    db.session.execute(text(f'DROP TABLE IF EXISTS "{TokenBlocklist.__tablename__}"'))
+    db.session.commit()
+    TokenBlocklist.__table__.create(db.engine)
+
+def table_index_names(table_name):
+    return set(db.session.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = :table_name AND schemaname = current_schema()"
+    ), {"table_name": table_name}).scalars().all())
+
+def table_foreign_keys(table_name):
+    return set(db.session.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table_name AS regclass) AND contype = 'f'"
+    ), {"table_name": f'"{table_name}"'}).scalars().all())
+
+def test_purge_removes_only_expired_tokens(app, registered_user):
+    user, _ = registered_user
+    now = datetime.now(timezone.utc)
+    add_tokens(user, 5, now - timedelta(days=1))
+    add_tokens(user, 3, now + timedelta(days=1))
+
+    purge_expired_tokens_task()
+
+    assert TokenBlocklist.query.filter(TokenBlocklist.expires < now).count() == 0
+    assert TokenBlocklist.query.count() == 3
+
+def test_delete_in_batches_respects_batch_limits(app, registered_user):
+    user, _ = registered_user
+    expired_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    add_tokens(user, 7, expired_at)
+
+    removed = delete_in_batches(TokenBlocklist, TokenBlocklist.expires < datetime.now(timezone.utc), batch_size=2, max_batches=2)
+    assert removed == 4
+    assert TokenBlocklist.query.count() == 3
+
+    removed = delete_in_batches(TokenBlocklist, TokenBlocklist.expires < datetime.now(timezone.utc), batch_size=2, max_batches=10)
+    assert removed == 3
+    assert TokenBlocklist.query.count() == 0
+
+def test_month_helpers():
+    start = month_start(datetime(2025, 12, 17, 13, 5, tzinfo=timezone.utc))
+    assert start == datetime(2025, 12, 1, tzinfo=timezone.utc)
+    assert add_months(start, 1) == datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert add_months(start, -12) == datetime(2024, 12, 1, tzinfo=timezone.utc)
+    assert partition_name("Token_blocklist", start) == "Token_blocklist_p2025_12"
+
+def test_partition_tokens_command_keeps_tokens_and_indexes(app, runner, registered_user, partitioned_tokens):
+    user, _ = registered_user
+    table_name = TokenBlocklist.__tablename__
+    now = datetime.now(timezone.utc)
+    old_month = add_months(month_start(now), -2)
+    add_tokens(user, 4, old_month + timedelta(days=1))
+    add_tokens(user, 3, now + timedelta(days=1))
+    index_names = table_index_names(table_name)
+    foreign_keys = table_foreign_keys(table_name)
+
+    result = runner.invoke(args=["partition-tokens"])
+
+    assert result.exit_code == 0
+    assert is_partitioned(table_name)
+    assert TokenBlocklist.query.count() == 7
+    assert partition_name(table_name, old_month) in [name for name, _, _ in list_monthly_partitions(table_name)]
+    assert table_index_names(table_name) >= {"ix_Token_blocklist_user_id", "ix_Token_blocklist_expires", "Token_blocklist_jti_key"}
+    assert table_index_names(table_name) >= index_names - {"Token_blocklist_token_id_key"}
+    assert table_foreign_keys(table_name) == foreign_keys
+
+    access_token = create_access_token(identity=user.user_id)
+    add_token_to_db(access_token)
+    payload = decode_token(access_token)
+    redis_client.delete(get_token_cache_key(payload["jti"]))
+    assert is_token_revoked(payload) is False
+    assert revoke_token(payload["jti"], user.user_id) is True
+    redis_client.delete(get_token_cache_key(payload["jti"]))
+    assert is_token_revoked(payload) is True
+
+    purge_expired_tokens_task()
+
+    partitions = [name for name, _, _ in list_monthly_partitions(table_name)]
+    assert partition_name(table_name, old_month) not in partitions
+    assert partition_name(table_name, add_months(month_start(now), Constants.PARTITION_MONTHS_AHEAD)) in partitions
+    assert TokenBlocklist.query.count() == 4
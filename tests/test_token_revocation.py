@@ -0,0 +1,208 @@
+import pytest
+import json
+from unittest.mock import patch
+from flask_jwt_extended import decode_token
+from backend.models import TokenBlocklist
+from backend.extensions import db, redis_client
+from backend.helpers import (
+    is_token_revoked,
+    revoke_token,
+    revoke_all_user_tokens,
+    get_token_cache_key,
+    cache_token_state,
+    get_token_epoch,
+    get_token_epoch_cache_key,
+    cache_token_epoch
+)
+
+# =============================================================================
+# Tests for the Redis revocation store
+# =============================================================================
+
+def login(client, user, password):
+    response = client.post("/api/auth/login", json={"username": user.username, "password": password})
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_login_writes_tokens_to_cache(client, registered_user):
+    user, password = registered_user
+    data = login(client, user, password)
+
+    for token in (data["access_token"], data["refresh_token"]):
+        cached = redis_client.get(get_token_cache_key(decode_token(token)["jti"]))
+        assert cached is not None
+        assert json.loads(cached) == {"user_id": str(user.user_id), "revoked": False}
+
+def test_is_token_revoked_uses_cache(client, registered_user):
+    user, password = registered_user
+    payload = decode_token(login(client, user, password)["access_token"])
+
+    with patch("backend.helpers.TokenBlocklist") as mock_model:
+        assert is_token_revoked(payload) is False
+        mock_model.query.filter_by.assert_not_called()
+
+def test_is_token_revoked_cache_miss_falls_back_to_db(client, registered_user):
+    user, password = registered_user
+    payload = decode_token(login(client, user, password)["access_token"])
+    redis_client.delete(get_token_cache_key(payload["jti"]))
+
+    assert is_token_revoked(payload) is False
+    assert redis_client.get(get_token_cache_key(payload["jti"])) is not None
+
+def test_revoke_token_updates_cache(client, registered_user):
+    user, password = registered_user
+    payload = decode_token(login(client, user, password)["access_token"])
+
+    assert revoke_token(payload["jti"], user.user_id) is True
+    assert json.loads(redis_client.get(get_token_cache_key(payload["jti"])))["revoked"] is True
+    assert is_token_revoked(payload) is True
+
+def test_revoke_all_user_tokens_updates_cache(client, registered_user):
+    user, password = registered_user
+    first = login(client, user, password)
+    second = login(client, user, password)
+
+    revoke_all_user_tokens(user.user_id)
+
+    for data in (first, second):
+        for token in (data["access_token"], data["refresh_token"]):
+            assert is_token_revoked(decode_token(token)) is True
+    assert TokenBlocklist.query.filter_by(user_id=user.user_id, revoked_at=None).count() == 0
+
+def test_revoked_access_token_rejected_by_endpoint(client, registered_user):
+    user, password = registered_user
+    access_token = login(client, user, password)["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    response = client.delete("/api/auth/revoke_access", headers=headers)
+    assert response.status_code == 200
+
+    response = client.get("/api/events/feed", headers=headers)
+    assert response.status_code == 401
+
+def test_cache_disabled_reads_db(app, client, registered_user):
+    user, password = registered_user
+    payload = decode_token(login(client, user, password)["access_token"])
+
+    app.config["REVOCATION_STORE_ENABLED"] = False
+    try:
+        TokenBlocklist.query.filter_by(jti=payload["jti"]).delete()
+        db.session.commit()
+        # the cached "active" state is ignored, the missing row means revoked
+        assert is_token_revoked(payload) is True
+    finally:
+        app.config["REVOCATION_STORE_ENABLED"] = True
+
+def test_cache_fill_does_not_overwrite_concurrent_revoke(client, registered_user):
+    user, password = registered_user
+    payload = decode_token(login(client, user, password)["access_token"])
+    redis_client.delete(get_token_cache_key(payload["jti"]))
+    revoked_before_fill = []
+
+    # another request revokes the token after is_token_revoked read the row but before it fills the cache
+    def revoke_then_fill(jti, user_id, expires, revoked):
+        if not revoked_before_fill:
+            revoked_before_fill.append(jti)
+            assert revoke_token(payload["jti"], user.user_id) is True
+        cache_token_state(jti, user_id, expires, revoked)
+
+    with patch("backend.helpers.cache_token_state", side_effect=revoke_then_fill):
+        assert is_token_revoked(payload) is False
+
+    assert revoked_before_fill == [payload["jti"]]
+    assert json.loads(redis_client.get(get_token_cache_key(payload["jti"])))["revoked"] is True
+    assert is_token_revoked(payload) is True
+
+# =============================================================================
+# Tests for token epoch mode
+# =============================================================================
+
+@pytest.fixture
+def epoch_mode(app):
+    app.config["TOKEN_EPOCH_MODE"] = True
+    yield
+    app.config["TOKEN_EPOCH_MODE"] = False
+
+def test_epoch_login_does_not_store_access_token(client, registered_user, epoch_mode):
+    user, password = registered_user
+    data = login(client, user, password)
+
+    access_payload = decode_token(data["access_token"])
+    assert access_payload["epoch"] == 0
+    assert TokenBlocklist.query.filter_by(jti=access_payload["jti"]).first() is None
+    assert TokenBlocklist.query.filter_by(jti=decode_token(data["refresh_token"])["jti"]).first() is not None
+    assert is_token_revoked(access_payload) is False
+
+def test_epoch_token_accepted_by_endpoint(client, registered_user, epoch_mode):
+    user, password = registered_user
+    access_token = login(client, user, password)["access_token"]
+
+    response = client.get("/api/events/feed", headers={"Authorization": f"Bearer {access_token}"})
+    assert response.status_code == 200
+
+def test_revoke_all_bumps_epoch(client, registered_user, epoch_mode):
+    user, password = registered_user
+    access_payload = decode_token(login(client, user, password)["access_token"])
+
+    revoke_all_user_tokens(user.user_id)
+
+    assert is_token_revoked(access_payload) is True
+    new_payload = decode_token(login(client, user, password)["access_token"])
+    assert new_payload["epoch"] == access_payload["epoch"] + 1
+    assert is_token_revoked(new_payload) is False
+
+def test_revoke_single_epoch_token(client, registered_user, epoch_mode):
+    user, password = registered_user
+    data = login(client, user, password)
+    other_payload = decode_token(login(client, user, password)["access_token"])
+
+    response = client.delete("/api/auth/revoke_access", headers={"Authorization": f"Bearer {data['access_token']}"})
+    assert response.status_code == 200
+
+    assert is_token_revoked(decode_token(data["access_token"])) is True
+    assert is_token_revoked(other_payload) is False
+
+def test_refresh_revokes_used_refresh_token(client, registered_user, epoch_mode):
+    user, password = registered_user
+    refresh_token = login(client, user, password)["refresh_token"]
+
+    response = client.post("/api/auth/refresh", headers={"Authorization": f"Bearer {refresh_token}"})
+    assert response.status_code == 200
+    assert "epoch" in decode_token(response.get_json()["access_token"])
+    assert is_token_revoked(decode_token(refresh_token)) is True
+
+def test_epoch_cache_fill_does_not_overwrite_concurrent_bump(client, registered_user, epoch_mode):
+    user, password = registered_user
+    access_payload = decode_token(login(client, user, password)["access_token"])
+    redis_client.delete(get_token_epoch_cache_key(user.user_id))
+    bumped_before_fill = []
+
+    # logout-all commits a new epoch after get_token_epoch read the old one but before it fills the cache
+    def bump_then_fill(user_id, epoch, fill=False):
+        if fill and not bumped_before_fill:
+            bumped_before_fill.append(epoch)
+            revoke_all_user_tokens(user.user_id)
+        cache_token_epoch(user_id, epoch, fill=fill)
+
+    with patch("backend.helpers.cache_token_epoch", side_effect=bump_then_fill):
+        assert get_token_epoch(user.user_id) == access_payload["epoch"]
+
+    assert bumped_before_fill == [access_payload["epoch"]]
+    assert int(redis_client.get(get_token_epoch_cache_key(user.user_id))) == access_payload["epoch"] + 1
+    assert is_token_revoked(access_payload) is True
+
+def test_revoke_epoch_token_fails_when_redis_is_down(client, registered_user, epoch_mode):
+    user, password = registered_user
+    data = login(client, user, password)
+    headers = {"Authorization": f"Bearer {data['access_token']}"}
+
+    with patch("backend.helpers.redis_client.setex", side_effect=Exception("redis down")):
+        response = client.delete("/api/auth/revoke_access", headers=headers)
+        assert response.status_code == 500
+        assert response.get_json()["message"] == "Could not revoke access token"
+
+        response = client.delete("/api/auth/logout", json={"access_token": data["access_token"]}, headers={"Authorization": f"Bearer {data['refresh_token']}"})
+        assert response.status_code == 500
+
+    assert is_token_revoked(decode_token(data["access_token"])) is False
+    assert is_token_revoked(decode_token(data["refresh_token"])) is True
@@ -0,0 +1,111 @@
+import pytest
+import json
+import uuid
+from unittest.mock import patch
+from backend import helpers
+from backend.extensions import db, redis_client
+from backend.helpers import get_user_snapshot, get_user_cache_key, cache_user_snapshot, invalidate_user_cache
+from backend.routes.tokens import CurrentUserProxy
+
+# =============================================================================
+# Tests for the cached current user snapshot
+# =============================================================================
+
+def get_auth_header(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def test_snapshot_is_cached_in_redis(app, registered_user):
+    user, _ = registered_user
+
+    snapshot = get_user_snapshot(user.user_id)
+
+    assert snapshot["user_id"] == user.user_id
+    assert snapshot["username"] == user.username
+    assert "password_hash" not in snapshot
+    cached = json.loads(redis_client.get(get_user_cache_key(user.user_id)))
+    assert cached["email"] == user.email
+
+def test_snapshot_hit_does_not_query_db(app, registered_user):
+    user, _ = registered_user
+    get_user_snapshot(user.user_id)
+
+    with patch("backend.helpers.db.session.get") as mock_get:
+        assert get_user_snapshot(user.user_id)["username"] == user.username
+        mock_get.assert_not_called()
+
+def test_snapshot_missing_user(app):
+    assert get_user_snapshot(uuid.uuid4()) is None
+
+def test_fill_after_concurrent_invalidation_is_not_cached(app, registered_user):
+    user, _ = registered_user
+    generations = []
+
+    # the profile is updated (and invalidated) after the snapshot was loaded from the database but before it is cached
+    def invalidate_then_fill(loaded_user, generation):
+        generations.append(generation)
+        invalidate_user_cache(loaded_user.user_id)
+        return cache_user_snapshot(loaded_user, generation)
+
+    with patch("backend.helpers.cache_user_snapshot", side_effect=invalidate_then_fill):
+        assert get_user_snapshot(user.user_id)["username"] == user.username
+
+    assert len(generations) == 1
+    assert redis_client.get(get_user_cache_key(user.user_id)) is None
+    with patch("backend.helpers.db.session.get", wraps=db.session.get) as mock_get:
+        get_user_snapshot(user.user_id)
+        mock_get.assert_called_once()
+
+def test_local_snapshots_are_bounded(app, registered_user, registered_friend):
+    user, _ = registered_user
+    friend, _ = registered_friend
+
+    with patch("backend.helpers.Constants.USER_SNAPSHOT_LOCAL_MAX_SIZE", 1):
+        get_user_snapshot(user.user_id)
+        get_user_snapshot(friend.user_id)
+
+        assert list(helpers._local_user_snapshots) == [str(friend.user_id)]
+
+def test_proxy_user_id_without_lookup(app, registered_user):
+    user, _ = registered_user
+    proxy = CurrentUserProxy(user.user_id, {}, {"sub": str(user.user_id)})
+
+    with patch("backend.routes.tokens.get_user_snapshot") as mock_snapshot, \
+         patch("backend.routes.tokens.db.session.get") as mock_get:
+        assert proxy.user_id == user.user_id
+        mock_snapshot.assert_not_called()
+        mock_get.assert_not_called()
+
+def test_proxy_resolves_orm_row_for_methods(app, registered_user):
+    user, password = registered_user
+    proxy = CurrentUserProxy(user.user_id, {}, {"sub": str(user.user_id)})
+
+    assert proxy.username == user.username
+    assert proxy.validate_password(password) is True
+    assert proxy.display_name == user.username
+
+def test_update_profile_invalidates_snapshot(client, logged_in_user):
+    user, token = logged_in_user
+    get_user_snapshot(user.user_id)
+    assert redis_client.get(get_user_cache_key(user.user_id)) is not None
+
+    response = client.put("/api/users/update_profile", json={"description": "New bio"}, headers=get_auth_header(token))
+    assert response.status_code == 200
+
+    assert redis_client.get(get_user_cache_key(user.user_id)) is None
+    assert get_user_snapshot(user.user_id)["description"] == "New bio"
+
+def test_update_profile_reads_picture_from_the_row(client, logged_in_user):
+    user, token = logged_in_user
+    headers = get_auth_header(token)
+    response = client.put("/api/users/update_profile", json={"profile_picture": {"cloud_id": "current_pic"}}, headers=headers)
+    assert response.status_code == 200
+
+    # a local copy from before the picture was changed, as another process may still serve it
+    stale = dict(get_user_snapshot(user.user_id), profile_picture="stale_pic")
+    helpers._store_local_user_snapshot(str(user.user_id), stale)
+
+    with patch("backend.routes.user_routes.delete_from_r2_task.delay") as mock_delete:
+        response = client.put("/api/users/update_profile", json={"profile_picture": {"cloud_id": "new_pic"}}, headers=headers)
+
+    assert response.status_code == 200
+    mock_delete.assert_called_once_with("current_pic", image_type="profile")